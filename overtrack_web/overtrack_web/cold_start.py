@@ -0,0 +1,289 @@
+"""
+Cold start instrumentation for flask_app, enabled by setting COLD_START_PROFILE=1.
+
+When enabled, this records how long each module import and blueprint registration takes, and times every external call
+(HTTP requests, AWS API calls and DynamoDB requests) made while the app is starting up and serving its first request.
+The report is logged as JSON once the first request has been handled, and written to COLD_START_REPORT if set.
+
+This module is deliberately kept free of imports from the rest of the app, so that it can be started before anything
+else is imported.
+"""
+import builtins
+import functools
+import importlib.util
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+COLD_START_PROFILE = os.environ.get('COLD_START_PROFILE', '').lower() in ('1', 'true', 'yes')
+COLD_START_REPORT = os.environ.get('COLD_START_REPORT')
+
+# imports faster than this are left out of the report
+MIN_IMPORT_SECONDS = 0.001
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    seconds: float
+    self_seconds: float
+    imported_by: Optional[str]
+
+
+@dataclass
+class BlueprintTiming:
+    name: str
+    url_prefix: Optional[str]
+    module: str
+    register_seconds: float
+
+
+@dataclass
+class ExternalCall:
+    kind: str
+    target: str
+    seconds: float
+    during: str
+    error: Optional[str] = None
+
+
+class ColdStartProfiler:
+
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.first_request_started: Optional[float] = None
+        self.first_request_finished: Optional[float] = None
+        self.first_request: Optional[str] = None
+
+        self.imports: List[ImportTiming] = []
+        self.blueprints: List[BlueprintTiming] = []
+        self.calls: List[ExternalCall] = []
+
+        self._active = False
+        self._thread: Optional[int] = None
+        self._stack: List[List[Any]] = []
+        self._original_import = None
+        self._patched: Dict[str, Callable[[], None]] = {}
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def start(self) -> None:
+        if self._active:
+            return
+        self.started = time.perf_counter()
+        self._thread = threading.get_ident()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        self._active = True
+        self._patch_external_calls()
+
+    def stop(self) -> None:
+        if not self._active:
+            return
+        self._active = False
+        if builtins.__import__ == self._import:
+            builtins.__import__ = self._original_import
+        for unpatch in self._patched.values():
+            unpatch()
+
+    def instrument_app(self, app) -> None:
+        """
+        Time blueprint registrations on `app`, and produce the report once its first request has been handled.
+        """
+        if not self._active:
+            return
+
+        register_blueprint = app.register_blueprint
+
+        @functools.wraps(register_blueprint)
+        def timed_register_blueprint(blueprint, **options):
+            t0 = time.perf_counter()
+            try:
+                return register_blueprint(blueprint, **options)
+            finally:
+                self.blueprints.append(BlueprintTiming(
+                    blueprint.name,
+                    options.get('url_prefix', blueprint.url_prefix),
+                    blueprint.import_name,
+                    time.perf_counter() - t0,
+                ))
+
+        app.register_blueprint = timed_register_blueprint
+
+        @app.before_request
+        def cold_start_before_request():
+            if self.first_request_started is None:
+                from flask import request
+                self.first_request_started = time.perf_counter()
+                self.first_request = request.path
+
+        @app.after_request
+        def cold_start_after_request(response):
+            if self._active and self.first_request_started is not None:
+                self.first_request_finished = time.perf_counter()
+                self.stop()
+                self.write_report()
+            return response
+
+    def report(self) -> Dict[str, Any]:
+        startup_end = self.first_request_started or time.perf_counter()
+        import_seconds = {t.module: t.seconds for t in self.imports}
+
+        reference_data = sys.modules.get('overtrack_web.lib.reference_data')
+
+        return {
+            'startup_seconds': startup_end - self.started,
+            'first_request': self.first_request,
+            'first_request_seconds': (
+                self.first_request_finished - self.first_request_started if self.first_request_finished else None
+            ),
+            'import_seconds': sum(t.seconds for t in self.imports if not t.imported_by),
+            'imports': [
+                asdict(t) for t in sorted(self.imports, key=lambda t: t.seconds, reverse=True)
+                if t.seconds >= MIN_IMPORT_SECONDS
+            ],
+            'blueprints': [
+                dict(asdict(b), import_seconds=import_seconds.get(b.module)) for b in self.blueprints
+            ],
+            'external_calls': [asdict(c) for c in self.calls],
+            'external_call_seconds': sum(c.seconds for c in self.calls),
+            'reference_data': reference_data.registry.timings() if reference_data else [],
+        }
+
+    def write_report(self) -> Dict[str, Any]:
+        report = self.report()
+        logger.info(f'Cold start report: {json.dumps(report)}')
+        if COLD_START_REPORT:
+            try:
+                with open(COLD_START_REPORT, 'w') as f:
+                    json.dump(report, f, indent=2)
+            except:
+                logger.exception(f'Failed to write cold start report to {COLD_START_REPORT}')
+        return report
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if not self._active or threading.get_ident() != self._thread:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        module = name
+        if level:
+            try:
+                module = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+            except:
+                pass
+        if module in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        # [module, time spent importing submodules]
+        entry = [module, 0.]
+        self._stack.append(entry)
+        t0 = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            seconds = time.perf_counter() - t0
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] += seconds
+            self.imports.append(ImportTiming(
+                module,
+                seconds,
+                seconds - entry[1],
+                self._stack[-1][0] if self._stack else None,
+            ))
+            self._patch_external_calls()
+
+    def _during(self) -> str:
+        if threading.get_ident() == self._thread:
+            if self._stack:
+                return f'import {self._stack[-1][0]}'
+            elif self.first_request_started is not None:
+                return f'request {self.first_request}'
+            else:
+                return 'startup'
+        return f'thread {threading.current_thread().name}'
+
+    def _patch_external_calls(self) -> None:
+        # requests, botocore and pynamodb aren't imported yet when the profiler starts, so patch each once it is
+        sessions = sys.modules.get('requests.sessions')
+        if sessions and 'requests' not in self._patched:
+            self._wrap(
+                'requests',
+                sessions.Session,
+                'request',
+                'http',
+                lambda args, kwargs: f'{_arg(args, kwargs, 1, "method")} {_arg(args, kwargs, 2, "url")}',
+            )
+
+        botocore_client = sys.modules.get('botocore.client')
+        if botocore_client and 'botocore' not in self._patched:
+            self._wrap(
+                'botocore',
+                botocore_client.BaseClient,
+                '_make_api_call',
+                'aws',
+                lambda args, kwargs: f'{args[0].meta.service_model.service_name}.{_arg(args, kwargs, 1, "operation_name")}',
+            )
+
+        pynamodb_connection = sys.modules.get('pynamodb.connection.base')
+        if pynamodb_connection and 'pynamodb' not in self._patched:
+            self._wrap(
+                'pynamodb',
+                pynamodb_connection.Connection,
+                '_make_api_call',
+                'dynamodb',
+                lambda args, kwargs: (
+                    f'{_arg(args, kwargs, 1, "operation_name")} '
+                    f'{_arg(args, kwargs, 2, "operation_kwargs").get("TableName", "")}'
+                ).strip(),
+            )
+
+    def _wrap(self, name: str, cls: type, attr: str, kind: str, describe: Callable[[tuple, dict], str]) -> None:
+        original = getattr(cls, attr)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            if not self._active:
+                return original(*args, **kwargs)
+            t0 = time.perf_counter()
+            error = None
+            try:
+                return original(*args, **kwargs)
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                try:
+                    target = describe(args, kwargs)
+                except:
+                    target = '?'
+                self.calls.append(ExternalCall(kind, target, time.perf_counter() - t0, self._during(), error))
+
+        setattr(cls, attr, timed)
+        self._patched[name] = lambda: setattr(cls, attr, original)
+
+
+profiler = ColdStartProfiler()
+
+
+def _arg(args: tuple, kwargs: dict, index: int, name: str) -> Any:
+    # an argument of a wrapped method, which may have been passed positionally (counting self) or by name
+    return args[index] if len(args) > index else kwargs[name]
+
+
+def start() -> None:
+    if COLD_START_PROFILE:
+        profiler.start()
+
+
+def instrument_app(app) -> None:
+    profiler.instrument_app(app)
@@ -1,11 +1,13 @@
 import datetime
 import logging
 from pprint import pformat, pprint
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, Mapping, Optional
 
 import requests
 from dataclasses import dataclass
 from overtrack_models.dataclasses import typedload
+from overtrack_web.lib import reference_data
+from overtrack_web.lib.reference_data import LazyMapping, REFERENCE_DATA_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -48,28 +50,34 @@ class ApexSeason:
         return self.season_name or f'Season {self.index}'
 
 
-seasons: Dict[int, ApexSeason] = {
-    0: ApexSeason(index=0, start=0.0, end=1553014800.0, has_ranked=False),
-    1: ApexSeason(index=1, start=1553014800.0, end=1562086800.0, has_ranked=False),
-    2: ApexSeason(index=2, start=1562086800.0, end=1569956446.0),
-    3: ApexSeason(index=3, start=1569956446.0, end=1580839200.0),
-    4: ApexSeason(index=4, start=1580839200.0, end=1589302800.0),
-    5: ApexSeason(index=5, start=1589302800.0, end=1597726800.0),
-    6: ApexSeason(index=6, start=1597726800.0, end=1604548800.0),
-    7: ApexSeason(index=7, start=1604548800.0, end=1612303200.0),
-    8: ApexSeason(index=8, start=1612303200.0, end=1620165600.0),
-
-    1005: ApexSeason(1005, start=1589302800.0, end=1597726800.0, season_name='Season 5 Duos', has_ranked=False),
-    1006: ApexSeason(1006, start=1597726800.0, end=1604548800.0, season_name='Season 6 Duos', has_ranked=False),
-    1007: ApexSeason(1007, start=1604548800.0, end=1612303200.0, season_name='Season 7 Duos', has_ranked=False),
-    1008: ApexSeason(1008, start=1612303200.0, end=1620165600.0, season_name='Season 8 Duos', has_ranked=False),
-}
-current_season = seasons[sorted(seasons.keys())[-1]]
-try:
+def _fallback_seasons() -> Tuple[Dict[int, ApexSeason], ApexSeason]:
+    seasons = {
+        0: ApexSeason(index=0, start=0.0, end=1553014800.0, has_ranked=False),
+        1: ApexSeason(index=1, start=1553014800.0, end=1562086800.0, has_ranked=False),
+        2: ApexSeason(index=2, start=1562086800.0, end=1569956446.0),
+        3: ApexSeason(index=3, start=1569956446.0, end=1580839200.0),
+        4: ApexSeason(index=4, start=1580839200.0, end=1589302800.0),
+        5: ApexSeason(index=5, start=1589302800.0, end=1597726800.0),
+        6: ApexSeason(index=6, start=1597726800.0, end=1604548800.0),
+        7: ApexSeason(index=7, start=1604548800.0, end=1612303200.0),
+        8: ApexSeason(index=8, start=1612303200.0, end=1620165600.0),
+
+        1005: ApexSeason(1005, start=1589302800.0, end=1597726800.0, season_name='Season 5 Duos', has_ranked=False),
+        1006: ApexSeason(1006, start=1597726800.0, end=1604548800.0, season_name='Season 6 Duos', has_ranked=False),
+        1007: ApexSeason(1007, start=1604548800.0, end=1612303200.0, season_name='Season 7 Duos', has_ranked=False),
+        1008: ApexSeason(1008, start=1612303200.0, end=1620165600.0, season_name='Season 8 Duos', has_ranked=False),
+    }
+    return seasons, seasons[sorted(seasons.keys())[-1]]
+
+
+def _fetch_seasons() -> Dict:
     logger.info('Fetching season IDs from API')
-    response = requests.get('https://api2.overtrack.gg/data/apex/season_ids')
+    response = requests.get('https://api2.overtrack.gg/data/apex/season_ids', timeout=REFERENCE_DATA_TIMEOUT)
     response.raise_for_status()
-    data = response.json()
+    return response.json()
+
+
+def _parse_seasons(data: Dict) -> Tuple[Dict[int, ApexSeason], ApexSeason]:
     seasons = typedload.load(data['seasons'], Dict[int, ApexSeason])
     current_season = typedload.load(data['current_season'], ApexSeason)
     current_season = [s for s in seasons.values() if s == current_season][0]
@@ -77,8 +85,16 @@ try:
         if s.end == float('inf'):
             s.end = s.start + 10 * 365 * 24 * 60 * 60
     logger.info(f'Got seasons:\n{pformat(seasons)}')
-except:
-    logger.exception(f'Failed to fetch season IDs - using fallback')
+    return seasons, current_season
+
+
+_seasons = reference_data.register('apex_seasons', _fetch_seasons, _fallback_seasons, _parse_seasons)
+seasons: Mapping[int, ApexSeason] = LazyMapping(_seasons, select=lambda data: data[0])
+
+
+def get_current_season() -> ApexSeason:
+    return _seasons.get()[1]
+
 
 rank_rp = {
     'bronze': (0, 1200),
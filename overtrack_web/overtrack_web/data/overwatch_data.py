@@ -1,5 +1,5 @@
 import logging
-from typing import List, Optional, Tuple, Dict
+from typing import List, Mapping, Optional, Tuple, Dict
 
 import requests
 from dataclasses import dataclass
@@ -7,6 +7,8 @@ from overtrack_models.dataclasses.overwatch.basic_types import Hero
 
 from overtrack_models.dataclasses import Literal
 from overtrack_models.dataclasses.typedload import typedload
+from overtrack_web.lib import reference_data
+from overtrack_web.lib.reference_data import LazyMapping, REFERENCE_DATA_TIMEOUT
 
 
 logger = logging.getLogger(__name__)
@@ -27,32 +29,46 @@ class Season:
         return self.start <= timestamp < self.end
 
 
-seasons = {
-    0: Season(name='Unknown Season', start=1, end=2000000000, index=None, is_222=True)
-}
-try:
-    r = requests.get('https://api2.overtrack.gg/data/overwatch/seasons')
+def _fetch_seasons() -> Dict:
+    r = requests.get('https://api2.overtrack.gg/data/overwatch/seasons', timeout=REFERENCE_DATA_TIMEOUT)
     r.raise_for_status()
-    seasons = {s.index: s for s in typedload.load(r.json()['seasons'], List[Season])}
-    logger.info(f'Downloaded overwatch season data: {len(seasons)} seasons')
-except:
-    logger.exception(f'Failed to fetch overwatch season data')
+    logger.info('Downloaded overwatch season data')
+    return r.json()
+
+
+def _parse_seasons(data: Dict) -> Dict[int, Season]:
+    return {s.index: s for s in typedload.load(data['seasons'], List[Season])}
+
+
+def _fallback_seasons() -> Dict[int, Season]:
+    return {
+        0: Season(name='Unknown Season', start=1, end=2000000000, index=None, is_222=True)
+    }
+
 
-current_season = seasons[sorted(seasons.keys())[-1]]
+seasons: Mapping[int, Season] = LazyMapping(reference_data.register('overwatch_seasons', _fetch_seasons, _fallback_seasons, _parse_seasons))
+
+
+def get_current_season() -> Season:
+    return seasons[sorted(seasons.keys())[-1]]
 
 
 StatType = Literal['maximum', 'average', 'best', 'duration']
 Role = Literal['tank', 'damage', 'support']
 
 
-heroes: Dict[str, Hero] = {}
-try:
-    r = requests.get('https://api2.overtrack.gg/data/overwatch/heroes')
+def _fetch_heroes() -> Dict:
+    r = requests.get('https://api2.overtrack.gg/data/overwatch/heroes', timeout=REFERENCE_DATA_TIMEOUT)
     r.raise_for_status()
-    heroes = typedload.load(r.json(), Dict[str, Hero])
-    logger.info(f'Downloaded overwatch hero data: {len(heroes)} heroes')
-except:
-    logger.exception(f'Failed to fetch overwatch hero data')
+    logger.info('Downloaded overwatch hero data')
+    return r.json()
+
+
+def _parse_heroes(data: Dict) -> Dict[str, Hero]:
+    return typedload.load(data, Dict[str, Hero])
+
+
+heroes: Mapping[str, Hero] = LazyMapping(reference_data.register('overwatch_heroes', _fetch_heroes, dict, _parse_heroes))
 
 hero_colors = {
     "ana": "#718ab3",
@@ -2,6 +2,10 @@ import functools
 import logging
 import os
 
+# start timing imports before anything else is imported (only if COLD_START_PROFILE is set)
+from overtrack_web import cold_start
+cold_start.start()
+
 import flask
 import sentry_sdk
 from flask import Flask, Request, render_template, request, url_for, render_template_string, jsonify
@@ -10,6 +14,8 @@ from werkzeug.utils import redirect
 
 from overtrack_web.data import CDN_URL, WELCOME_META
 from overtrack_web.lib.authentication import check_authentication, require_login
+from overtrack_web.lib.last_played import last_played_game_type
+from overtrack_web.lib.lazy_blueprint import LazyBlueprint, LazyRule
 
 # port of https://bugs.python.org/issue34363 to the dataclasses backport
 # see https://github.com/ericvsmith/dataclasses/issues/151
@@ -32,6 +38,7 @@ app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.url_map.strict_slashes = False
 app.jinja_env.trim_blocks = True
 app.jinja_env.lstrip_blocks = True
+cold_start.instrument_app(app)
 
 @app.after_request
 def add_default_no_cache_header(response):
@@ -114,6 +121,21 @@ from overtrack_web.lib.template_filters import filters
 app.jinja_env.filters.update(filters)
 
 
+# ------ LAZY BLUEPRINTS ------
+# rarely used pages are only imported the first time they are requested, to keep them out of cold starts
+def notification_bot_rules(twitch_enabled: bool = False):
+    # see make_notification_bot.create_notification_pages
+    return [
+        LazyRule('/', 'root'),
+        LazyRule('/authorize_bot', 'authorize_bot'),
+        LazyRule('/bot_authorized', 'bot_authorized'),
+        LazyRule('/add_to_channel', 'add_to_channel', methods=['POST']),
+        LazyRule('/delete_integration', 'delete_integration', methods=['POST']),
+        LazyRule('/authorize_list_servers', 'authorize_list_servers'),
+        LazyRule('/add_to_existing', 'add_to_existing'),
+    ] + ([LazyRule('/create_twitch_bot', 'create_twitch_bot')] if twitch_enabled else [])
+
+
 # ------ LOGIN/LOGOUT ------
 from overtrack_web.views.login import login_blueprint
 app.register_blueprint(login_blueprint)
@@ -129,13 +151,13 @@ app.register_blueprint(game_blueprint, url_prefix='/apex/games')
 from overtrack_web.views.apex.stats import results_blueprint
 app.register_blueprint(results_blueprint, url_prefix='/apex/stats')
 
-try:
-    # support running even if the discord bot fails (e.g. missing env vars, fails to fetch cache of enabled bots)
-    from overtrack_web.views.apex.discord_bot import apex_discord_blueprint
-except:
-    logging.exception('Failed to import apex_discord_bot - running without /apex/discord_bot')
-else:
-    app.register_blueprint(apex_discord_blueprint, url_prefix='/apex/discord_bot')
+# if the discord bot fails to load (e.g. missing env vars) its pages 404 and the rest of the site still works
+LazyBlueprint(
+    'overtrack_web.views.apex.discord_bot',
+    'apex_discord_blueprint',
+    'apex.discord_bot',
+    notification_bot_rules(),
+).register(app, url_prefix='/apex/discord_bot')
 
 
 # ------ VALORANT ------
@@ -145,19 +167,22 @@ app.register_blueprint(valorant_games_list_blueprint, url_prefix='/valorant/game
 from overtrack_web.views.valorant.game import game_blueprint as valorant_game_blueprint
 app.register_blueprint(valorant_game_blueprint, url_prefix='/valorant/games')
 
-try:
-    from overtrack_web.views.valorant.stats import stats_blueprint as valorant_stats_blueprint
-    app.register_blueprint(valorant_stats_blueprint, url_prefix='/valorant/winrates')
-except:
-    logger.error('Failed to import valorant winrates')
-
-try:
-    # support running even if the discord bot fails (e.g. missing env vars, fails to fetch cache of enabled bots)
-    from overtrack_web.views.valorant.notifications import valorant_notifications_blueprint
-except:
-    logging.exception('Failed to import valorant_notifications_blueprint - running without /valorant/notifications')
-else:
-    app.register_blueprint(valorant_notifications_blueprint, url_prefix='/valorant/notifications')
+LazyBlueprint(
+    'overtrack_web.views.valorant.stats',
+    'stats_blueprint',
+    'valorant.stats',
+    [
+        LazyRule('', 'winrates'),
+        LazyRule('/<string:username>', 'public_winrates'),
+    ],
+).register(app, url_prefix='/valorant/winrates')
+
+LazyBlueprint(
+    'overtrack_web.views.valorant.notifications',
+    'valorant_notifications_blueprint',
+    'valorant.discord_bot',
+    notification_bot_rules(twitch_enabled=True),
+).register(app, url_prefix='/valorant/notifications')
 
 
 # ------ OVERWATCH ------
@@ -170,13 +195,15 @@ app.register_blueprint(overwatch_game_blueprint, url_prefix='/overwatch/games')
 from overtrack_web.views.overwatch.hero_stats import hero_stats_blueprint
 app.register_blueprint(hero_stats_blueprint, url_prefix='/overwatch/hero_stats')
 
-try:
-    # support running even if the discord bot fails (e.g. missing env vars, fails to fetch cache of enabled bots)
-    from overtrack_web.views.overwatch.discord_bot import overwatch_discord_blueprint
-except:
-    logging.exception('Failed to import overwatch_discord_bot - running without /overwatch/discord_bot')
-else:
-    app.register_blueprint(overwatch_discord_blueprint, url_prefix='/overwatch/discord_bot')
+LazyBlueprint(
+    'overtrack_web.views.overwatch.discord_bot',
+    'overwatch_discord_blueprint',
+    'overwatch.discord_bot',
+    notification_bot_rules() + [
+        LazyRule('/delete_webhook', 'delete_webhook', methods=['POST']),
+        LazyRule('/data', 'data'),
+    ],
+).register(app, url_prefix='/overwatch/discord_bot')
 
 
 # ------ LEGACY PAGE REDIRECTS ------
@@ -229,12 +256,17 @@ def favicon():
 
 
 # ------ SUBSCRIBE  ------
-try:
-    from overtrack_web.views.subscribe import subscribe_blueprint
-except:
-    logging.exception('Failed to import subscribe_blueprint - running without /subscribe')
-else:
-    app.register_blueprint(subscribe_blueprint, url_prefix='/subscribe')
+LazyBlueprint(
+    'overtrack_web.views.subscribe',
+    'subscribe_blueprint',
+    'subscribe',
+    [
+        LazyRule('/', 'subscribe'),
+        LazyRule('/paypal_approved', 'paypal_approved', methods=['POST']),
+        LazyRule('/paypal_cancel', 'paypal_cancel', methods=['POST']),
+        LazyRule('/stripe_cancel', 'stripe_cancel', methods=['POST']),
+    ],
+).register(app, url_prefix='/subscribe')
 
 
 # ------ ROOT PAGE  ------
@@ -262,38 +294,8 @@ def games():
         logger.info(f'User has no apex games and no overwatch games, redirecting to overwatch games list')
         return redirect(url_for('overwatch.games_list.games_list'), code=302)
     else:
-        try:
-            from overtrack_models.orm.overwatch_game_summary import OverwatchGameSummary
-            overwatch_game = OverwatchGameSummary.user_id_time_index.get(session.user.user_id, scan_index_forward=False)
-        except:
-            overwatch_game = None
-        try:
-            from overtrack_models.orm.apex_game_summary import ApexGameSummary
-            apex_game = ApexGameSummary.user_id_time_index.get(session.user.user_id, scan_index_forward=False)
-        except:
-            apex_game = None
-        try:
-            from overtrack_models.orm.valorant_game_summary import ValorantGameSummary
-            valorant_game = ValorantGameSummary.user_id_timestamp_index.get(session.user.user_id, scan_index_forward=False)
-        except:
-            valorant_game = None
-
-        logger.info(f'Games: {overwatch_game, apex_game, valorant_game}')
-
-        most_recent = 'overwatch', None
-        if overwatch_game:
-            most_recent = 'overwatch', overwatch_game.datetime
-        if apex_game:
-            if not most_recent[1] or apex_game.time > most_recent[1]:
-                most_recent = 'apex', apex_game.time
-        if valorant_game:
-            if not most_recent[1] or valorant_game.datetime > most_recent[1]:
-                most_recent = 'valorant', valorant_game.datetime
-
-        logger.info(
-            f'Most recent game was {most_recent[0]} at {most_recent[1]}'
-        )
-        return redirect(url_for(most_recent[0] + '.games_list.games_list'), code=302)
+        most_recent = last_played_game_type(session.user)
+        return redirect(url_for(most_recent + '.games_list.games_list'), code=302)
 
 
 # ------ SIMPLE INFO PAGES  ------
@@ -354,7 +356,13 @@ def test2():
 @app.route('/data')
 def data():
     from overtrack_web.data.overwatch_data import seasons
-    return jsonify(seasons=seasons)
+    return jsonify(seasons=dict(seasons))
+
+
+@app.route('/data/version')
+def data_version():
+    from overtrack_web.lib.reference_data import registry
+    return jsonify(registry.status())
 
 
 @app.route('/user')
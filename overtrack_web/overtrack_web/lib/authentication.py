@@ -1,21 +1,28 @@
 import base64
+import hashlib
 import json
 import logging
 import os
+import threading
 import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Tuple, Union
 
 import jwt
 import sentry_sdk
 from flask import Blueprint, Flask, Response, g, request, url_for
 from werkzeug.utils import redirect
 
-from overtrack_web.lib.session import Session, _user_cache
+from overtrack_web.lib import metrics
+from overtrack_web.lib.session import Session, get_user
 from overtrack_models.orm.user import User
 
 HMAC_KEY = base64.b64decode(os.environ['HMAC_KEY'])
 SESSION_EXPIRE_TIME = 4 * 30 * 24 * 60 * 60
+# verified session tokens are trusted for this long without being decoded again (or until they expire, if sooner)
+VERIFIED_TOKEN_TTL = float(os.environ.get('VERIFIED_TOKEN_TTL', 60 * 60))
+VERIFIED_TOKEN_MAX_ITEMS = 1024
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +30,50 @@ request = request
 """ :type request: flask.Request """
 
 
+class VerifiedTokenCache:
+    """
+    The payloads of session tokens that have already been verified, by a hash of the token and the audience it was
+    verified for, so that each token only has to be decoded once per process. Entries are dropped once the token expires.
+    """
+
+    def __init__(self, ttl: float = VERIFIED_TOKEN_TTL, max_items: int = VERIFIED_TOKEN_MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        # hash -> (expires, payload)
+        self._tokens: 'OrderedDict[bytes, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str, audience: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token, audience)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry and time.time() >= entry[0]:
+                del self._tokens[key]
+                entry = None
+            if entry:
+                self._tokens.move_to_end(key)
+        metrics.record('authentication.token_cache.hit' if entry else 'authentication.token_cache.miss')
+        return entry[1] if entry else None
+
+    def put(self, token: str, audience: str, payload: Dict[str, Any]) -> None:
+        expires = time.time() + self.ttl
+        if 'exp' in payload:
+            expires = min(expires, payload['exp'])
+        key = self._key(token, audience)
+        with self._lock:
+            self._tokens[key] = expires, payload
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_items:
+                self._tokens.popitem(last=False)
+
+    @staticmethod
+    def _key(token: str, audience: str) -> bytes:
+        return hashlib.sha256(f'{audience}\0{token}'.encode()).digest()
+
+
+_verified_tokens = VerifiedTokenCache()
+
+
 class Authentication:
     """
     Mixin for requiring authentication on an entire app/blueprint.
@@ -140,8 +191,11 @@ def check_authentication(allow_audience: str = 'webapp', superuser_required: boo
 
     scope.set_extra('session_cookie', session)
 
+    user_data = _verified_tokens.get(session, allow_audience)
     try:
-        user_data = jwt.decode(session, HMAC_KEY, algorithms=['HS256'], audience=allow_audience)
+        if user_data is None:
+            user_data = jwt.decode(session, HMAC_KEY, algorithms=['HS256'], audience=allow_audience)
+            _verified_tokens.put(session, allow_audience, user_data)
     except jwt.InvalidTokenError as e:
         s = session
         try:
@@ -152,11 +206,10 @@ def check_authentication(allow_audience: str = 'webapp', superuser_required: boo
         sentry_sdk.capture_message('JWT token invalid')
         return make_error(f'{e}')
     else:
-        user = None
         if check_user:
+            # uses the cached User if there is one, so a user deleted elsewhere is still accepted for up to USER_CACHE_TTL
             try:
-                user = User.user_id_index.get(user_data['user-id'])
-                _user_cache[user.key] = user
+                get_user(user_data['user-id'])
             except User.DoesNotExist:
                 logger.error(f'Got valid session token, but user did not exist')
                 return make_error('User invalid')
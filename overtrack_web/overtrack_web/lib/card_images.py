@@ -0,0 +1,365 @@
+import hashlib
+import io
+import logging
+import os
+import string
+from typing import Any, Optional, Sequence, Tuple
+
+from overtrack_web.lib import metrics
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = ImageDraw = ImageFont = None
+
+# rendered card images are stored in S3 under this bucket/prefix if set, otherwise on local disk
+CARD_IMAGE_BUCKET = os.environ.get('CARD_IMAGE_BUCKET', '')
+CARD_IMAGE_PREFIX = os.environ.get('CARD_IMAGE_PREFIX', 'card_images/')
+CARD_IMAGE_DISK_PATH = os.environ.get(
+    'CARD_IMAGE_DISK_PATH',
+    '/tmp/overtrack_card_images' if 'AWS_LAMBDA_FUNCTION_NAME' in os.environ else ''
+)
+# TrueType font used for the card text - falls back to common system fonts, then Pillow's default font
+CARD_FONT = os.environ.get('CARD_FONT', '')
+FONT_CANDIDATES = [
+    'DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf',
+    'Arial Bold.ttf',
+    'arialbd.ttf',
+]
+
+STATIC_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'static')
+
+# cards are rendered once at this scale, then resized for each requested size
+RENDER_SCALE = 2
+
+logger = logging.getLogger(__name__)
+
+
+class CardImageStore:
+    """
+    Rendered card images, keyed by game key, version (the _cachebust hash) and size.
+    Stored in S3 if a bucket is configured, otherwise in a local directory.
+    """
+
+    def __init__(self, s3=None, bucket: str = '', prefix: str = '', path: str = ''):
+        self.s3 = s3 if bucket else None
+        self.bucket = bucket
+        self.prefix = prefix
+        self.path = path
+        if self.path and not self.s3:
+            try:
+                os.makedirs(self.path, exist_ok=True)
+            except OSError:
+                logger.exception(f'Failed to create card image directory {self.path} - not storing card images')
+                self.path = ''
+
+    def _name(self, game: str, key: str, version: str, size: Optional[Tuple[int, int]]) -> str:
+        size_name = f'{size[0]}x{size[1]}' if size else 'render'
+        return f'{game}/{key}/{hashlib.md5(version.encode()).hexdigest()}/{size_name}.png'
+
+    def _filename(self, name: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(name.encode()).hexdigest() + '.png')
+
+    def get(self, game: str, key: str, version: str, size: Optional[Tuple[int, int]] = None) -> Optional[bytes]:
+        name = self._name(game, key, version, size)
+        try:
+            if self.s3:
+                return self.s3.get_object(Bucket=self.bucket, Key=self.prefix + name)['Body'].read()
+            elif self.path:
+                with open(self._filename(name), 'rb') as f:
+                    return f.read()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            if 'NoSuchKey' not in str(e):
+                logger.exception(f'Failed to get card image {name}')
+        return None
+
+    def put(self, game: str, key: str, version: str, png: bytes, size: Optional[Tuple[int, int]] = None) -> None:
+        name = self._name(game, key, version, size)
+        try:
+            if self.s3:
+                self.s3.put_object(
+                    Bucket=self.bucket,
+                    Key=self.prefix + name,
+                    Body=png,
+                    ContentType='image/png',
+                )
+            elif self.path:
+                filename = self._filename(name)
+                with open(filename + '.tmp', 'wb') as f:
+                    f.write(png)
+                os.replace(filename + '.tmp', filename)
+        except Exception:
+            logger.exception(f'Failed to store card image {name}')
+
+
+def get_card_png(
+    store: CardImageStore,
+    game: str,
+    key: str,
+    version: str,
+    size: Tuple[int, int],
+    render: Any,
+) -> Optional[bytes]:
+    """
+    Get the card image for a game at `size`, rendering it with `render()` (returning an RGBA Image, or None if it cannot
+    be rendered) only if no size of this version of the card has been rendered yet.
+    Returns None if the card could not be rendered locally.
+    """
+    png = store.get(game, key, version, size)
+    if png:
+        metrics.record('card_images.hit')
+        return png
+    if not Image:
+        return None
+
+    rendered_png = store.get(game, key, version)
+    if rendered_png:
+        metrics.record('card_images.resize')
+        rendered = Image.open(io.BytesIO(rendered_png))
+    else:
+        try:
+            rendered = render()
+        except Exception:
+            logger.exception(f'Failed to render card for {key}')
+            rendered = None
+        if rendered is None:
+            return None
+        metrics.record('card_images.render')
+        store.put(game, key, version, _png(rendered))
+
+    png = _png(fit(rendered, size))
+    store.put(game, key, version, png, size)
+    return png
+
+
+def fit(card: 'Image.Image', size: Tuple[int, int]) -> 'Image.Image':
+    """
+    Scale `card` to the width of `size` (or its height, if that is smaller), centered on a transparent image of `size`.
+    """
+    scale = min(size[0] / card.width, size[1] / card.height)
+    scaled = card.resize((max(1, round(card.width * scale)), max(1, round(card.height * scale))), Image.LANCZOS)
+    image = Image.new('RGBA', size, (0, 0, 0, 0))
+    image.paste(scaled, ((size[0] - scaled.width) // 2, (size[1] - scaled.height) // 2))
+    return image
+
+
+def _png(image: 'Image.Image') -> bytes:
+    f = io.BytesIO()
+    image.save(f, format='PNG', optimize=True)
+    return f.getvalue()
+
+
+# ----- Drawing -----
+
+_fonts = {}
+
+
+def _font(size: int) -> 'ImageFont.ImageFont':
+    if size not in _fonts:
+        for candidate in ([CARD_FONT] if CARD_FONT else []) + FONT_CANDIDATES:
+            try:
+                _fonts[size] = ImageFont.truetype(candidate, size)
+                break
+            except OSError:
+                pass
+        else:
+            try:
+                _fonts[size] = ImageFont.load_default(size)
+            except TypeError:
+                # Pillow < 10.1 only has a fixed size default font
+                _fonts[size] = ImageFont.load_default()
+    return _fonts[size]
+
+
+def _static_image(path: str) -> Optional['Image.Image']:
+    try:
+        return Image.open(os.path.join(STATIC_PATH, path)).convert('RGBA')
+    except (OSError, ValueError):
+        logger.warning(f'Could not load card image {path}')
+        return None
+
+
+def _cover(image: 'Image.Image', size: Tuple[int, int]) -> 'Image.Image':
+    """
+    Scale and crop `image` to fill `size`, like `background-size: cover`.
+    """
+    scale = max(size[0] / image.width, size[1] / image.height)
+    image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    left = (image.width - size[0]) // 2
+    top = (image.height - size[1]) // 2
+    return image.crop((left, top, left + size[0], top + size[1]))
+
+
+def _contain(image: 'Image.Image', size: Tuple[int, int]) -> 'Image.Image':
+    scale = min(size[0] / image.width, size[1] / image.height)
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+
+def _slug(name: str) -> str:
+    name = name.lower().replace(' ', '-')
+    return ''.join(c for c in name if c in (string.digits + string.ascii_letters + '-'))
+
+
+def _text(draw: 'ImageDraw.ImageDraw', xy: Tuple[float, float], text: str, size: int, fill: str, anchor: str = 'la') -> None:
+    try:
+        draw.text(xy, text, font=_font(size), fill=fill, anchor=anchor)
+    except ValueError:
+        # anchors are only supported by TrueType fonts
+        draw.text(xy, text, font=_font(size), fill=fill)
+
+
+OVERWATCH_CARD_SIZE = (356, 80)
+OVERWATCH_RESULT_COLOURS = {
+    'WIN': '#62c462',
+    'LOSS': '#ee5f5b',
+    'DRAW': '#f89406',
+}
+
+
+def render_overwatch_card(summary: Any, sr_change: str) -> 'Image.Image':
+    """
+    Draw the layout of overwatch/games_list/game_card.html (with show_rank) for an OverwatchGameSummary.
+    """
+    s = RENDER_SCALE
+    w, h = OVERWATCH_CARD_SIZE[0] * s, OVERWATCH_CARD_SIZE[1] * s
+    card = Image.new('RGBA', (w, h), '#2a2e51')
+    draw = ImageDraw.Draw(card)
+
+    thumbnail_width = 128 * s
+    thumbnail = _static_image(f'images/overwatch/map_thumbnails/{_slug(summary.map)}.jpg')
+    if thumbnail:
+        card.paste(_cover(thumbnail, (thumbnail_width, h)), (0, 0))
+    else:
+        draw.rectangle((0, 0, thumbnail_width, h), fill='#222854')
+    # wedge between the thumbnail and the details
+    draw.polygon([(thumbnail_width - 24 * s, h), (thumbnail_width, 0), (thumbnail_width, h)], fill='#2a2e51')
+
+    if summary.heroes_played:
+        hero = _static_image(f'images/overwatch/hero_icons/{summary.heroes_played[0][0]}.png')
+        if hero:
+            icon_size = 52 * s
+            box = (thumbnail_width - icon_size - 20 * s, (h - icon_size) // 2)
+            draw.ellipse((box[0], box[1], box[0] + icon_size, box[1] + icon_size), fill='#1b1e3a')
+            card.alpha_composite(_contain(hero, (icon_size, icon_size)), box)
+
+    x = thumbnail_width + 10 * s
+    result = summary.result if summary.result != 'UNKNOWN' else 'UNK'
+    _text(draw, (x, 8 * s), result, 26 * s, OVERWATCH_RESULT_COLOURS.get(summary.result, '#a0a0a0'))
+
+    if summary.rank:
+        rank = _static_image(f'images/overwatch/rank_icons/{summary.rank}.png')
+        if rank:
+            rank = _contain(rank, (35 * s, 35 * s))
+            card.alpha_composite(rank, (w - rank.width - 10 * s, 8 * s))
+
+    if summary.game_type == 'competitive':
+        if summary.rank == 'placement' and not summary.end_sr:
+            details = 'Placement'
+        else:
+            start_sr = summary.start_sr if summary.start_sr else ('?' if summary.rank != 'placement' else '-')
+            end_sr = summary.end_sr if summary.end_sr else '?'
+            details = f'{start_sr} → {end_sr} ({sr_change})'
+    elif getattr(summary, 'attacking', None) is True:
+        details = 'Attacking'
+    elif getattr(summary, 'attacking', None) is False:
+        details = 'Defending'
+    elif getattr(summary, 'rounds', None):
+        details = f'{summary.rounds} rounds'
+    else:
+        details = ''
+    _text(draw, (x, h - 12 * s), details, 14 * s, '#ffffff', anchor='ls')
+    _text(draw, (w - 10 * s, h - 12 * s), f'{summary.duration // 60} min', 12 * s, '#a0a0a0', anchor='rs')
+
+    return card
+
+
+VALORANT_CARD_SIZE = (1000, 80)
+
+
+def render_valorant_card(summary: Any) -> 'Image.Image':
+    """
+    Draw the layout of valorant/games_list/game_card.html for a ValorantGameSummary.
+    """
+    s = RENDER_SCALE
+    w, h = VALORANT_CARD_SIZE[0] * s, VALORANT_CARD_SIZE[1] * s
+    if summary.scrim:
+        background = '#3a3a3a'
+    elif summary.won:
+        background = '#1f3b2c'
+    else:
+        background = '#3b1f24'
+    card = Image.new('RGBA', (w, h), background)
+    draw = ImageDraw.Draw(card)
+
+    map_image = _static_image(f'images/valorant/maps/{summary.map.lower()}.png')
+    if map_image:
+        map_image = _cover(map_image, (w // 2, h))
+        map_image.putalpha(70)
+        card.alpha_composite(map_image, (w // 2, 0))
+
+    x = 0
+    if summary.agent:
+        agent = _static_image(f'images/valorant/agent_profiles/{summary.agent.lower()}.png')
+        if agent:
+            agent = _cover(agent, (h, h))
+            card.alpha_composite(agent, (0, 0))
+        x += h
+    x += 10 * s
+    _text(draw, (x, 8 * s), (summary.agent or 'Unknown').title(), 26 * s, '#ffffff')
+    _text(draw, (x + 10 * s, h - 10 * s), f'on {summary.map.title()}', 16 * s, '#ffffff', anchor='ls')
+
+    x += 170 * s
+    if summary.rank:
+        rank = _static_image(f'images/valorant/ranks/{summary.rank}.png')
+        if rank:
+            rank = _contain(rank, (22 * s, h - 20 * s))
+            card.alpha_composite(rank, (x, (h - rank.height) // 2))
+    x += 30 * s
+
+    if summary.scrim:
+        result = 'SCRIM'
+    elif summary.won is None:
+        result = '-'
+    else:
+        result = 'VICTORY' if summary.won else 'DEFEAT'
+    score = f'{summary.score[0]} - {summary.score[1]}' if summary.score else '? - ?'
+    center = x + 80 * s
+    _text(draw, (center, 8 * s), result, 14 * s, '#eaeeb2', anchor='ma')
+    _text(draw, (center, h - 10 * s), score, 28 * s, '#ffffff', anchor='ms')
+    x += 180 * s
+
+    if summary.stats:
+        for i, (label, value) in enumerate([
+            ('K', summary.stats.kills),
+            ('D', summary.stats.deaths),
+            ('A', summary.stats.assists or '-'),
+        ]):
+            _text(draw, (x, (6 + 22 * i) * s), f'{label}: {value}', 16 * s, '#ffffff')
+    x += 110 * s
+
+    if summary.rounds:
+        if summary.rounds.attacking_first:
+            rows = [('ATK', summary.rounds.round_results[:12]), ('DEF', summary.rounds.round_results[12:])]
+        else:
+            rows = [('DEF', summary.rounds.round_results[:12]), ('ATK', summary.rounds.round_results[12:])]
+        for row, (name, results) in enumerate(rows):
+            _draw_round_results(draw, (x, (18 + 26 * row) * s), name, results)
+
+    return card
+
+
+def _draw_round_results(draw: 'ImageDraw.ImageDraw', xy: Tuple[int, int], name: str, results: Sequence[bool]) -> None:
+    s = RENDER_SCALE
+    x, y = xy
+    _text(draw, (x, y), name, 12 * s, '#ffffff')
+    x += 45 * s
+    for won in results:
+        if won:
+            draw.rectangle((x, y, x + 10 * s, y + 15 * s), fill='#5bbd6c')
+        else:
+            draw.rectangle((x, y + 5 * s, x + 10 * s, y + 15 * s), fill='#ed4642')
+        x += 14 * s
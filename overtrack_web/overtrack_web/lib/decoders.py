@@ -0,0 +1,358 @@
+import copy
+import enum
+import functools
+import logging
+import threading
+import typing
+from typing import Any, Callable, Dict, List, Optional, Set, Type
+
+import dataclasses
+
+logger = logging.getLogger(__name__)
+
+Decoder = Callable[[Any], Any]
+
+BASIC_TYPES = (int, float, str, bool)
+NONE_TYPE = type(None)
+
+
+class DecoderError(ValueError):
+    pass
+
+
+_decoders: Dict[Any, Decoder] = {}
+_unsupported: Dict[Any, str] = {}
+# types whose compiled decoder has been checked against the fallback
+_verified: Set[Any] = set()
+_verify_lock = threading.Lock()
+
+
+def compile_decoder(t: Any) -> Decoder:
+    """
+    Build (once per type) a function that loads JSON data as `t`, with the same result as typedload.load(data, t).
+
+    Dataclasses get a generated loader function with the decoder for each field bound directly into it, so loading does
+    no reflection. Raises DecoderError if `t` (or any type it contains) is not supported, and the returned decoder raises
+    DecoderError for data it cannot load - callers should fall back to typedload in either case.
+
+    Unlike typedload, dataclasses are loaded strictly: a dict with keys that are not fields of the dataclass is not
+    loaded. That way data holding references (which referenced_typedload loads as shared instances, and the compiled
+    decoders know nothing about) can never be loaded by the compiled decoders - whatever form the references take, they
+    either replace an object with something that isn't one, or add keys to it.
+    """
+    try:
+        return _decoders[t]
+    except KeyError:
+        pass
+    except TypeError:
+        raise DecoderError(f'Unhashable type {t!r}')
+    if t in _unsupported:
+        raise DecoderError(_unsupported[t])
+
+    if dataclasses.is_dataclass(t):
+        # register an indirection first so recursive dataclasses can refer to their own decoder
+        compiled = None
+
+        def decode_recursive(data):
+            return compiled(data)
+        _decoders[t] = decode_recursive
+        try:
+            compiled = _compile_dataclass(t)
+        except DecoderError as e:
+            del _decoders[t]
+            _unsupported[t] = str(e)
+            raise
+        decoder = compiled
+        logger.debug(f'Compiled decoder for {t!r}')
+    else:
+        try:
+            decoder = _compile(t)
+        except DecoderError as e:
+            _unsupported[t] = str(e)
+            raise
+
+    _decoders[t] = decoder
+    return decoder
+
+
+def precompile(*types: Any) -> None:
+    for t in types:
+        try:
+            compile_decoder(t)
+        except DecoderError as e:
+            logger.warning(f'Cannot compile decoder for {t!r} - falling back to typedload: {e}')
+
+
+def load(data: Any, t: Any, fallback: Callable[[Any, Any], Any]) -> Any:
+    """
+    Load `data` as `t` with its compiled decoder, using `fallback(data, t)` if the type is not supported or the decoder
+    fails.
+
+    Data holding references is always loaded with `fallback`, since the compiled decoders don't load it (see
+    compile_decoder). As a further check, the first load of each type in a process is also made with `fallback`, and the
+    compiled decoder is only used from then on if both give the same result with the same objects shared.
+    """
+    try:
+        decoder = compile_decoder(t)
+    except DecoderError:
+        return fallback(data, t)
+    try:
+        actual = decoder(data)
+    except DecoderError:
+        # data the compiled decoder doesn't load, e.g. because it holds references
+        return fallback(data, t)
+    except Exception as e:
+        logger.warning(f'Compiled decoder for {t!r} failed: {e!r} - no longer using it')
+        _disable(t, f'Failed: {e!r}')
+        return fallback(data, t)
+    if t not in _verified:
+        with _verify_lock:
+            if t not in _verified:
+                return _verify(t, actual, data, fallback)
+    return actual
+
+
+def _verify(t: Any, actual: Any, data: Any, fallback: Callable[[Any, Any], Any]) -> Any:
+    # the fallback may modify the data it loads, which `actual` may share parts of
+    expected = fallback(copy.deepcopy(data), t)
+    difference = compare(expected, actual)
+    if difference:
+        logger.warning(f'Compiled decoder for {t!r} does not match the fallback ({difference}) - no longer using it')
+        _disable(t, f'Does not match the fallback: {difference}')
+        return expected
+
+    _verified.add(t)
+    return actual
+
+
+def _disable(t: Any, reason: str) -> None:
+    _unsupported[t] = reason
+    _decoders.pop(t, None)
+
+
+def compare(expected: Any, actual: Any) -> Optional[str]:
+    """
+    Describe the first difference between two loaded values, including objects that are shared in one but not the
+    other, or return None if they are the same.
+    """
+    difference = first_difference(expected, actual)
+    if not difference and sharing(expected) != sharing(actual):
+        difference = 'objects are not shared the same way'
+    return difference
+
+
+def first_difference(a: Any, b: Any, path: str = '') -> Optional[str]:
+    """
+    The path to the first difference between two loaded values, or None if they are equal.
+    """
+    if type(a) != type(b):
+        return f'{path or "."}: {type(a).__name__} != {type(b).__name__}'
+    if dataclasses.is_dataclass(a):
+        for f in dataclasses.fields(a):
+            d = first_difference(getattr(a, f.name), getattr(b, f.name), f'{path}.{f.name}')
+            if d:
+                return d
+        return None
+    if isinstance(a, dict):
+        if a.keys() != b.keys():
+            return f'{path}: keys {sorted(a.keys() ^ b.keys())!r} differ'
+        for k in a:
+            d = first_difference(a[k], b[k], f'{path}[{k!r}]')
+            if d:
+                return d
+        return None
+    if isinstance(a, (list, tuple)):
+        if len(a) != len(b):
+            return f'{path}: length {len(a)} != {len(b)}'
+        for i, (ea, eb) in enumerate(zip(a, b)):
+            d = first_difference(ea, eb, f'{path}[{i}]')
+            if d:
+                return d
+        return None
+    if a != b and not (a != a and b != b):
+        return f'{path}: {a!r} != {b!r}'
+    return None
+
+
+def sharing(value: Any) -> List[int]:
+    """
+    Which objects in a loaded value are the same instance: each dataclass instance, list and dict is numbered the first
+    time it is reached, and the numbers are listed in the order they are reached (without descending into an object
+    twice). Two equal values share the same objects iff their sharing is equal.
+    """
+    numbers: Dict[int, int] = {}
+    order = []
+    stack = [value]
+    while stack:
+        o = stack.pop()
+        if dataclasses.is_dataclass(o) and not isinstance(o, type):
+            children = [getattr(o, f.name) for f in dataclasses.fields(o)]
+        elif isinstance(o, (list, dict)):
+            children = list(o.values()) if isinstance(o, dict) else o
+        elif isinstance(o, tuple):
+            # tuples can't be modified, so whether they are shared doesn't matter - only their contents
+            stack.extend(reversed(o))
+            continue
+        else:
+            continue
+        if id(o) in numbers:
+            order.append(numbers[id(o)])
+            continue
+        numbers[id(o)] = len(numbers)
+        order.append(numbers[id(o)])
+        stack.extend(reversed(children))
+    return order
+
+
+def with_fallback(fallback: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    # a partial (rather than a closure) can be pickled along with the LazyDataclasses that use it
+    return functools.partial(load, fallback=fallback)
+
+
+def _compile(t: Any) -> Decoder:
+    if t is Any:
+        return _identity
+    if t is NONE_TYPE or t is None:
+        return _decode_none
+    if isinstance(t, type) and issubclass(t, enum.Enum):
+        return _make_enum_decoder(t)
+    if t in BASIC_TYPES:
+        return _make_basic_decoder(t)
+    if hasattr(t, '__supertype__'):
+        # NewType
+        return compile_decoder(t.__supertype__)
+
+    origin = getattr(t, '__origin__', None)
+    args = getattr(t, '__args__', None) or ()
+    if origin is typing.Union:
+        return _make_union_decoder(args)
+    if origin in (list, typing.List):
+        return _make_list_decoder(compile_decoder(args[0]) if args else _identity)
+    if origin in (dict, typing.Dict):
+        if args:
+            return _make_dict_decoder(compile_decoder(args[0]), compile_decoder(args[1]))
+        return _make_dict_decoder(_identity, _identity)
+    if origin in (tuple, typing.Tuple):
+        if len(args) == 2 and args[1] is Ellipsis:
+            return _make_list_decoder(compile_decoder(args[0]), tuple)
+        return _make_tuple_decoder(tuple(compile_decoder(a) for a in args))
+    if getattr(typing, 'Literal', None) is not None and origin is typing.Literal:
+        return _make_literal_decoder(args)
+
+    raise DecoderError(f'Unsupported type {t!r}')
+
+
+def _compile_dataclass(cls: Type) -> Decoder:
+    hints = typing.get_type_hints(cls)
+    namespace = {
+        'cls': cls,
+        'dict': dict,
+        'DecoderError': DecoderError,
+    }
+    namespace['field_names'] = frozenset(f.metadata.get('name', f.name) for f in dataclasses.fields(cls))
+    lines = [
+        'def decode(data):',
+        '    if type(data) is not dict:',
+        f'        raise DecoderError("Expected dict for {cls.__name__}, got %r" % type(data))',
+        '    if not data.keys() <= field_names:',
+        f'        raise DecoderError("Unexpected keys for {cls.__name__}: %r" % sorted(data.keys() - field_names))',
+        '    kwargs = {}',
+    ]
+    for i, f in enumerate(dataclasses.fields(cls)):
+        if not f.init:
+            continue
+        namespace[f'decode_{i}'] = compile_decoder(hints[f.name])
+        raw_name = f.metadata.get('name', f.name)
+        if f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING:
+            lines += [
+                f'    if {raw_name!r} not in data:',
+                f'        raise DecoderError("Missing field {cls.__name__}.{raw_name}")',
+                f'    kwargs[{f.name!r}] = decode_{i}(data[{raw_name!r}])',
+            ]
+        else:
+            lines += [
+                f'    if {raw_name!r} in data:',
+                f'        kwargs[{f.name!r}] = decode_{i}(data[{raw_name!r}])',
+            ]
+    lines.append('    return cls(**kwargs)')
+
+    exec(compile('\n'.join(lines), f'<decoder {cls.__module__}.{cls.__qualname__}>', 'exec'), namespace)
+    return namespace['decode']
+
+
+def _identity(data: Any) -> Any:
+    return data
+
+
+def _decode_none(data: Any) -> None:
+    if data is not None:
+        raise DecoderError(f'Expected None, got {type(data)!r}')
+    return None
+
+
+def _make_basic_decoder(t: Type) -> Decoder:
+    def decode_basic(data):
+        if type(data) is t:
+            return data
+        try:
+            return t(data)
+        except (TypeError, ValueError) as e:
+            raise DecoderError(f'Cannot load {data!r} as {t!r}: {e}')
+    return decode_basic
+
+
+def _make_enum_decoder(t: Type[enum.Enum]) -> Decoder:
+    def decode_enum(data):
+        try:
+            return t(data)
+        except ValueError as e:
+            raise DecoderError(str(e))
+    return decode_enum
+
+
+def _make_union_decoder(args: typing.Tuple[Any, ...]) -> Decoder:
+    exact = tuple(a for a in args if a in BASIC_TYPES or a is NONE_TYPE)
+    decoders = [compile_decoder(a) for a in args]
+
+    def decode_union(data):
+        if type(data) in exact:
+            return data
+        for decoder in decoders:
+            try:
+                return decoder(data)
+            except (DecoderError, TypeError, ValueError):
+                pass
+        raise DecoderError(f'Cannot load {type(data)!r} as any of {args!r}')
+    return decode_union
+
+
+def _make_list_decoder(decode_item: Decoder, container: Type = list) -> Decoder:
+    def decode_list(data):
+        if type(data) not in (list, tuple):
+            raise DecoderError(f'Expected list, got {type(data)!r}')
+        return container([decode_item(e) for e in data])
+    return decode_list
+
+
+def _make_tuple_decoder(decode_items: typing.Tuple[Decoder, ...]) -> Decoder:
+    def decode_tuple(data):
+        if type(data) not in (list, tuple) or len(data) != len(decode_items):
+            raise DecoderError(f'Expected list of length {len(decode_items)}, got {data!r}')
+        return tuple(d(e) for d, e in zip(decode_items, data))
+    return decode_tuple
+
+
+def _make_dict_decoder(decode_key: Decoder, decode_value: Decoder) -> Decoder:
+    def decode_dict(data):
+        if type(data) is not dict:
+            raise DecoderError(f'Expected dict, got {type(data)!r}')
+        return {decode_key(k): decode_value(v) for k, v in data.items()}
+    return decode_dict
+
+
+def _make_literal_decoder(values: typing.Tuple[Any, ...]) -> Decoder:
+    def decode_literal(data):
+        if data not in values:
+            raise DecoderError(f'{data!r} is not one of {values!r}')
+        return data
+    return decode_literal
@@ -0,0 +1,202 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from overtrack_web.lib import metrics
+
+# can be pointed at a fake discord server for testing - see scripts/check_discord_client.py
+DISCORD_API_URL = os.environ.get('DISCORD_API_URL', 'https://discord.com/api')
+# how long GETs of channels, guilds and guild members are cached for
+DISCORD_CACHE_TTL = float(os.environ.get('DISCORD_CACHE_TTL', 60))
+DISCORD_CACHE_MAX_ITEMS = 1024
+# give up instead of waiting longer than this for a rate limit to reset
+DISCORD_MAX_RATE_LIMIT_WAIT = float(os.environ.get('DISCORD_MAX_RATE_LIMIT_WAIT', 10))
+DISCORD_MAX_RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+# rate limits are per route, but the route includes the "major parameter" (the channel, guild or webhook)
+MAJOR_PARAMETER = re.compile(r'^/(channels|guilds|webhooks)/(\d+)')
+ID = re.compile(r'/\d+')
+CACHEABLE = [
+    re.compile(r'^/channels/\d+$'),
+    re.compile(r'^/guilds/\d+$'),
+    re.compile(r'^/guilds/\d+/members/\d+$'),
+]
+
+
+class _Bucket:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.
+
+
+class DiscordClient:
+    """
+    Client for the discord REST API, making requests as the bot.
+
+    Requests wait for their rate limit bucket (learnt from the X-RateLimit headers of previous responses) to have
+    requests remaining, and are retried after Retry-After if they are rate limited anyway. Successful and not found GETs
+    of channels, guilds and guild members are cached for `cache_ttl`, and dropped if anything under the same channel or
+    guild is modified.
+    """
+
+    def __init__(self, token: str, base_url: str = DISCORD_API_URL, cache_ttl: float = DISCORD_CACHE_TTL):
+        self.base_url = base_url.rstrip('/')
+        self.cache_ttl = cache_ttl
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bot {token}'
+        })
+
+        self._lock = threading.Lock()
+        self._route_buckets: Dict[str, str] = {}
+        self._buckets: Dict[str, _Bucket] = {}
+        self._global_reset_at = 0.
+        self._cache: 'OrderedDict[str, Tuple[float, requests.Response]]' = OrderedDict()
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> requests.Response:
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', path, **kwargs)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        endpoint = method.lower() + ID.sub('', path).replace('/', '.')
+        cacheable = method == 'GET' and not kwargs and any(p.match(path) for p in CACHEABLE)
+        if cacheable:
+            cached = self._get_cached(path)
+            if cached is not None:
+                metrics.record(f'discord_api.{endpoint}.cache_hit')
+                return cached
+        elif method != 'GET':
+            self._invalidate(path)
+
+        route = self._route(method, path)
+        for attempt in range(DISCORD_MAX_RETRIES + 1):
+            self._wait_for_bucket(route)
+            t0 = time.perf_counter()
+            r = self.session.request(method, self.base_url + path, **kwargs)
+            metrics.record(f'discord_api.{endpoint}.latency', value=time.perf_counter() - t0, unit='seconds')
+            self._update_bucket(route, r)
+
+            if r.status_code != 429:
+                break
+            metrics.record(f'discord_api.{endpoint}.rate_limited')
+            retry_after = self._retry_after(r)
+            if attempt == DISCORD_MAX_RETRIES or retry_after > DISCORD_MAX_RATE_LIMIT_WAIT:
+                logger.warning(f'{method} {path} rate limited - giving up (retry after {retry_after:.2f}s)')
+                break
+            # the next attempt waits for the rate limit to reset
+            logger.warning(f'{method} {path} rate limited - retrying after {retry_after:.2f}s')
+
+        if cacheable and (r.ok or r.status_code in [403, 404]):
+            self._put_cached(path, r)
+        return r
+
+    # ----- Rate Limits -----
+
+    def _route(self, method: str, path: str) -> Tuple[str, str]:
+        major = MAJOR_PARAMETER.match(path)
+        if major:
+            return f'{method} /{major.group(1)}/:id' + ID.sub('/:id', path[major.end():]), major.group(0)
+        return f'{method} ' + ID.sub('/:id', path), ''
+
+    def _bucket(self, route: Tuple[str, str]) -> _Bucket:
+        with self._lock:
+            # discord tells us which routes share a limit (e.g. different message endpoints) with X-RateLimit-Bucket
+            bucket_hash = self._route_buckets.get(route[0], route[0])
+            key = f'{bucket_hash} {route[1]}'
+            if key not in self._buckets:
+                self._buckets[key] = _Bucket()
+            return self._buckets[key]
+
+    def _wait_for_bucket(self, route: Tuple[str, str]) -> None:
+        bucket = self._bucket(route)
+        while True:
+            now = time.time()
+            wait = self._global_reset_at - now
+            if wait <= 0:
+                with bucket.lock:
+                    if bucket.reset_at <= now:
+                        bucket.remaining = None
+                    if bucket.remaining is None or bucket.remaining > 0:
+                        if bucket.remaining:
+                            bucket.remaining -= 1
+                        return
+                    wait = bucket.reset_at - now
+            if wait > DISCORD_MAX_RATE_LIMIT_WAIT:
+                # let the request go through and be rejected, rather than holding up the page
+                return
+            logger.info(f'Waiting {wait:.2f}s for rate limit on {route[0]} ({route[1]})')
+            metrics.record('discord_api.rate_limit_wait', value=wait, unit='seconds')
+            time.sleep(wait)
+
+    def _update_bucket(self, route: Tuple[str, str], r: requests.Response) -> None:
+        bucket_hash = r.headers.get('X-RateLimit-Bucket')
+        if bucket_hash:
+            with self._lock:
+                self._route_buckets[route[0]] = bucket_hash
+        if r.status_code == 429 and (r.headers.get('X-RateLimit-Global') or r.headers.get('X-RateLimit-Scope') == 'global'):
+            self._global_reset_at = time.time() + self._retry_after(r)
+            return
+
+        bucket = self._bucket(route)
+        with bucket.lock:
+            if r.status_code == 429:
+                bucket.remaining = 0
+                bucket.reset_at = time.time() + self._retry_after(r)
+            elif 'X-RateLimit-Remaining' in r.headers and 'X-RateLimit-Reset-After' in r.headers:
+                bucket.remaining = int(r.headers['X-RateLimit-Remaining'])
+                bucket.reset_at = time.time() + float(r.headers['X-RateLimit-Reset-After'])
+
+    def _retry_after(self, r: requests.Response) -> float:
+        try:
+            return float(r.json()['retry_after'])
+        except:
+            return float(r.headers.get('Retry-After', 1))
+
+    # ----- Cache -----
+
+    def _get_cached(self, path: str) -> Optional[requests.Response]:
+        with self._lock:
+            entry = self._cache.get(path)
+            if not entry:
+                return None
+            if time.time() - entry[0] > self.cache_ttl:
+                del self._cache[path]
+                return None
+            return entry[1]
+
+    def _put_cached(self, path: str, r: requests.Response) -> None:
+        with self._lock:
+            self._cache[path] = time.time(), r
+            self._cache.move_to_end(path)
+            while len(self._cache) > DISCORD_CACHE_MAX_ITEMS:
+                self._cache.popitem(last=False)
+
+    def _invalidate(self, path: str) -> None:
+        major = MAJOR_PARAMETER.match(path)
+        if not major:
+            return
+        with self._lock:
+            for cached_path in [p for p in self._cache if p == major.group(0) or p.startswith(major.group(0) + '/')]:
+                del self._cache[cached_path]
@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dataclasses import dataclass
+
+from overtrack_web.lib import metrics
+
+GAME_CACHE_MAX_ITEMS = int(os.environ.get('GAME_CACHE_MAX_ITEMS', 64))
+GAME_CACHE_MAX_BYTES = int(os.environ.get('GAME_CACHE_MAX_BYTES', 96 * 1024 * 1024))
+
+# cached games validated against S3 within this many seconds are used without making any request - by default every
+# load is revalidated (a conditional GET, which is cheap when the game is unchanged), since a game edited through
+# another process would otherwise be shown stale for up to this long
+GAME_CACHE_REVALIDATE_AFTER = float(os.environ.get('GAME_CACHE_REVALIDATE_AFTER', 0))
+
+# /tmp persists between invocations of a warm lambda container, so use it as a second tier when running on lambda
+GAME_CACHE_DISK_PATH = os.environ.get(
+    'GAME_CACHE_DISK_PATH',
+    '/tmp/overtrack_game_cache' if 'AWS_LAMBDA_FUNCTION_NAME' in os.environ else ''
+)
+GAME_CACHE_DISK_MAX_BYTES = int(os.environ.get('GAME_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedGame:
+    key: str
+    etag: str
+    size: int
+    game: Any
+    metadata: Dict[str, str]
+    last_modified: Optional[datetime] = None
+    validated: float = 0
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.validated < GAME_CACHE_REVALIDATE_AFTER
+
+
+class GameCacheStats:
+    """
+    Counts how loads through the cache were served:
+      hit: served from the cache without contacting S3
+      revalidated: served from the cache after S3 confirmed the game had not changed (304 Not Modified)
+      miss: downloaded and decoded
+    """
+
+    def __init__(self):
+        self.hit = 0
+        self.revalidated = 0
+        self.miss = 0
+
+    def record(self, outcome: str) -> None:
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        metrics.record(f'game_cache.{outcome}')
+
+    @property
+    def total(self) -> int:
+        return self.hit + self.revalidated + self.miss
+
+    def ratios(self) -> Dict[str, float]:
+        total = self.total or 1
+        return {
+            'hit': self.hit / total,
+            'revalidated': self.revalidated / total,
+            'miss': self.miss / total,
+        }
+
+    def __str__(self) -> str:
+        return (
+            'GameCacheStats('
+            + ', '.join(f'{k}={getattr(self, k)} ({v:.0%})' for k, v in self.ratios().items())
+            + ')'
+        )
+
+
+class DiskGameCache:
+    """
+    Pickled games stored in a local directory, evicting the least recently written files once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest() + '.pickle')
+
+    def get(self, key: str, etag: Optional[str] = None) -> Optional[CachedGame]:
+        try:
+            with open(self._filename(key), 'rb') as f:
+                entry: CachedGame = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.exception(f'Failed to read {key!r} from disk cache - ignoring')
+            self.invalidate(key)
+            return None
+        if entry.key != key or (etag and entry.etag != etag):
+            return None
+        return entry
+
+    def put(self, entry: CachedGame) -> None:
+        filename = self._filename(entry.key)
+        try:
+            with open(filename + '.tmp', 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(filename + '.tmp', filename)
+        except Exception:
+            logger.exception(f'Failed to write {entry.key!r} to disk cache - ignoring')
+            return
+        self._evict()
+
+    def invalidate(self, key: str) -> None:
+        try:
+            os.remove(self._filename(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        files = []
+        total = 0
+        for e in os.scandir(self.path):
+            if e.name.endswith('.pickle'):
+                stat = e.stat()
+                files.append((stat.st_mtime, stat.st_size, e.path))
+                total += stat.st_size
+        files.sort()
+        while total > self.max_bytes and files:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class GameCache:
+    """
+    In-memory LRU cache of decoded games, keyed by game key and validated against the ETag of the stored game.
+    If `etag` is not provided to `get`, the entry is returned regardless of its ETag so that it can be revalidated.
+    Cached games are shared by every request that loads them, so must not be modified.
+
+    Entries are bounded both by count and by `size` - the size of the JSON the game was decoded from (after
+    decompression), which is a cheap proxy for the memory used by the decoded object. Entries evicted from memory are
+    still available from the disk tier (if configured).
+    """
+
+    def __init__(self, max_items: int, max_bytes: int, disk: Optional[DiskGameCache] = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk = disk
+
+        self.stats = GameCacheStats()
+        self.total_bytes = 0
+        self._entries: 'OrderedDict[str, CachedGame]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, etag: Optional[str] = None) -> Optional[CachedGame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (not etag or entry.etag == etag):
+                self._entries.move_to_end(key)
+                return entry
+
+        if self.disk:
+            entry = self.disk.get(key, etag)
+            if entry:
+                metrics.record('game_cache.disk_load')
+                self._put_memory(entry)
+                return entry
+
+        return None
+
+    def put(self, entry: CachedGame) -> None:
+        self._put_memory(entry)
+        if self.disk:
+            self.disk.put(entry)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self.total_bytes -= entry.size
+        if self.disk:
+            self.disk.invalidate(key)
+
+    def _put_memory(self, entry: CachedGame) -> None:
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            existing = self._entries.pop(entry.key, None)
+            if existing:
+                self.total_bytes -= existing.size
+            self._entries[entry.key] = entry
+            self.total_bytes += entry.size
+            while len(self._entries) > self.max_items or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _make_disk_cache() -> Optional[DiskGameCache]:
+    if not GAME_CACHE_DISK_PATH:
+        return None
+    try:
+        return DiskGameCache(GAME_CACHE_DISK_PATH, GAME_CACHE_DISK_MAX_BYTES)
+    except OSError:
+        logger.exception(f'Failed to create disk cache at {GAME_CACHE_DISK_PATH} - running with memory cache only')
+        return None
+
+
+game_cache = GameCache(GAME_CACHE_MAX_ITEMS, GAME_CACHE_MAX_BYTES, disk=_make_disk_cache())
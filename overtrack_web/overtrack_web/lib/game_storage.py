@@ -0,0 +1,268 @@
+import gzip
+import json
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple, TypeVar
+
+import boto3
+import requests
+from botocore.exceptions import ClientError
+
+from overtrack_web.lib.game_cache import CachedGame, GameCache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+T = TypeVar('T')
+
+# encoding used when writing games back to S3 - one of '' (uncompressed JSON), 'gzip', or 'zstd'
+GAME_BLOB_ENCODING = os.environ.get('GAME_BLOB_ENCODING', '')
+if GAME_BLOB_ENCODING not in ('', 'gzip', 'zstd'):
+    raise ValueError(f'Unknown GAME_BLOB_ENCODING {GAME_BLOB_ENCODING!r}')
+if GAME_BLOB_ENCODING == 'zstd' and not zstandard:
+    raise ValueError('GAME_BLOB_ENCODING is zstd, but zstandard is not installed - install with the zstd extra')
+
+logger = logging.getLogger(__name__)
+
+
+class NotModified(Exception):
+    pass
+
+
+class CountingReader:
+    """
+    Wraps a stream to count the bytes read from it - for games, the size of the (decompressed) JSON.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def make_s3_client():
+    """
+    Create an S3 client for fetching games, or return None (so games are fetched over HTTP) if no AWS credentials are
+    configured. Credentials are checked locally instead of by making a request to S3.
+    """
+    try:
+        if boto3.session.Session().get_credentials() is None:
+            raise ValueError('No AWS credentials found')
+        return boto3.client('s3')
+    except:
+        logger.exception('Failed to create AWS S3 client - using HTTP for downloading games')
+        return None
+
+
+def load_game_data(
+    s3,
+    bucket: str,
+    key: str,
+    decode: Callable[[Dict[str, Any]], T],
+    cache: Optional[GameCache] = None,
+    http_url: Optional[str] = None,
+    stream_decode: Optional[Callable[[BinaryIO], T]] = None,
+) -> Tuple[T, Dict[str, str]]:
+    """
+    Fetch and decode a game from S3, falling back to fetching over HTTP if S3 is not available.
+
+    If `cache` holds a copy of the game it is used without any request if it was validated recently, otherwise the game
+    is fetched with a conditional GET against the cached ETag/Last-Modified so that an unchanged game is not downloaded
+    or decoded again.
+    If `stream_decode` is provided it is used to decode the game directly from the (decompressed) body as it is read,
+    falling back to refetching the game and decoding it with `decode` if it fails.
+    Returns the decoded game and a copy of its S3 metadata (empty if fetched over HTTP). A game decoded with `cache` is
+    shared with every other load of it through the cache, so callers must not modify it.
+    """
+    cache_key = f'{bucket}/{key}'
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached and cached.fresh:
+        cache.stats.record('hit')
+        return cached.game, dict(cached.metadata)
+
+    try:
+        body, encoding, etag, last_modified, size, metadata = _get_object(s3, bucket, key, http_url, cached)
+    except NotModified:
+        logger.info(f'Game {cache_key} not modified since {cached.last_modified} (ETag={cached.etag}) - using cached game')
+        cached.validated = time.time()
+        cache.stats.record('revalidated')
+        return cached.game, dict(cached.metadata)
+
+    game = None
+    if stream_decode:
+        decoded = CountingReader(decode_stream(body, encoding))
+        try:
+            game = stream_decode(decoded)
+        except Exception:
+            logger.exception(f'Failed to stream decode {cache_key} - refetching and decoding in full')
+            body.close()
+            body, encoding, etag, last_modified, size, metadata = _get_object(s3, bucket, key, http_url, None)
+    if game is None:
+        decoded = CountingReader(decode_stream(body, encoding))
+        try:
+            game_data = json.load(decoded)
+        finally:
+            body.close()
+        game = decode(game_data)
+        del game_data
+    else:
+        body.close()
+
+    if cache is not None:
+        cache.stats.record('miss')
+        logger.info(f'Game cache: {cache.stats}')
+        if etag:
+            cache.put(CachedGame(
+                key=cache_key,
+                etag=etag,
+                # the decompressed size, since that (not the stored size) is what the decoded game's memory scales with
+                size=decoded.bytes_read,
+                game=game,
+                metadata=metadata,
+                last_modified=last_modified,
+                validated=time.time(),
+            ))
+
+    return game, dict(metadata)
+
+
+def get_game_etag(s3, bucket: str, key: str, cache: Optional[GameCache] = None) -> Optional[str]:
+    """
+    Get the ETag of a stored game without downloading it - from `cache` if the game was validated recently, otherwise
+    with a HEAD request. Returns None if the ETag could not be found.
+    """
+    if cache is not None:
+        cached = cache.get(f'{bucket}/{key}')
+        if cached and cached.fresh:
+            return cached.etag
+    if not s3:
+        return None
+    try:
+        return s3.head_object(Bucket=bucket, Key=key).get('ETag')
+    except:
+        logger.exception(f'Failed to get ETag of {bucket}/{key}')
+        return None
+
+
+def _get_object(s3, bucket: str, key: str, http_url: Optional[str], cached: Optional[CachedGame]):
+    try:
+        conditions = {}
+        if cached:
+            conditions['IfNoneMatch'] = cached.etag
+            if cached.last_modified:
+                conditions['IfModifiedSince'] = cached.last_modified
+        game_object = s3.get_object(
+            Bucket=bucket,
+            Key=key,
+            **conditions
+        )
+        return (
+            game_object['Body'],
+            game_object.get('ContentEncoding') or game_object['Metadata'].get('encoding'),
+            game_object.get('ETag'),
+            game_object.get('LastModified'),
+            game_object.get('ContentLength', 0),
+            game_object['Metadata'],
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == '304':
+            raise NotModified()
+        logger.exception('Failed to fetch game data from S3 - trying HTTP')
+    except:
+        if s3:
+            logger.exception('Failed to fetch game data from S3 - trying HTTP')
+
+    headers = {}
+    if cached:
+        headers['If-None-Match'] = cached.etag
+    r = requests.get(http_url or f'https://{bucket}.s3.amazonaws.com/{key}', headers=headers, stream=True)
+    if r.status_code == 304:
+        r.close()
+        raise NotModified()
+    r.raise_for_status()
+    # decode ourselves so compressed games are treated the same as when fetched from S3
+    r.raw.decode_content = False
+    last_modified = r.headers.get('Last-Modified')
+    return (
+        r.raw,
+        r.headers.get('Content-Encoding') or r.headers.get('x-amz-meta-encoding'),
+        r.headers.get('ETag'),
+        parsedate_to_datetime(last_modified) if last_modified else None,
+        int(r.headers.get('Content-Length', 0)),
+        {},
+    )
+
+
+def decode_stream(body: BinaryIO, encoding: Optional[str]) -> BinaryIO:
+    """
+    Wrap a (possibly compressed) game body so that reading from it returns the game JSON, decompressing as it is read.
+    """
+    if not encoding or encoding == 'identity':
+        return body
+    elif encoding == 'gzip':
+        return gzip.GzipFile(fileobj=body, mode='rb')
+    elif encoding == 'zstd':
+        if not zstandard:
+            raise ValueError('Game is zstd encoded, but zstandard is not installed')
+        return zstandard.ZstdDecompressor().stream_reader(body)
+    else:
+        raise ValueError(f'Unknown game encoding {encoding!r}')
+
+
+def encode_game_data(game_data: Any, encoding: str = GAME_BLOB_ENCODING) -> bytes:
+    if not encoding:
+        return json.dumps(game_data, indent=1).encode()
+
+    data = json.dumps(game_data, separators=(',', ':')).encode()
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    elif encoding == 'zstd':
+        if not zstandard:
+            raise ValueError('Cannot zstd encode game - zstandard is not installed')
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        raise ValueError(f'Unknown game encoding {encoding!r}')
+
+
+def store_game_data(
+    s3,
+    bucket: str,
+    key: str,
+    game_data: Any,
+    metadata: Dict[str, str],
+    encoding: str = GAME_BLOB_ENCODING,
+) -> None:
+    """
+    Write a game to S3, compressed with `encoding` if set.
+
+    The encoding is recorded both as the object's ContentEncoding (so HTTP clients decompress it transparently) and in its
+    metadata.
+    """
+    extra_args = {}
+    metadata = dict(metadata)
+    if encoding:
+        extra_args['ContentEncoding'] = encoding
+        metadata['encoding'] = encoding
+    else:
+        metadata.pop('encoding', None)
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=encode_game_data(game_data, encoding),
+        ACL='public-read',
+        ContentType='application/json',
+        Metadata=metadata,
+        **extra_args
+    )
+
+
+def invalidate_game(cache: GameCache, bucket: str, key: str) -> None:
+    cache.invalidate(f'{bucket}/{key}')
@@ -0,0 +1,56 @@
+import hashlib
+from typing import Any, Optional
+
+from flask import Response, make_response, request
+
+from overtrack_web.lib import metrics
+
+
+def cache_control(
+    *,
+    public: bool = False,
+    max_age: int = 0,
+    stale_while_revalidate: int = 0,
+    no_cache: bool = False,
+    immutable: bool = False,
+) -> str:
+    """
+    Build a Cache-Control header value. Responses that don't set one get `no-store` (see flask_app).
+    """
+    parts = ['public' if public else 'private']
+    if no_cache:
+        parts.append('no-cache')
+    parts.append(f'max-age={max_age}')
+    if stale_while_revalidate:
+        parts.append(f'stale-while-revalidate={stale_while_revalidate}')
+    if immutable:
+        parts.append('immutable')
+    return ', '.join(parts)
+
+
+def make_etag(*parts: Any) -> str:
+    return hashlib.md5(str(parts).encode()).hexdigest()
+
+
+def not_modified(etag: Optional[str], cache_control: str) -> Optional[Response]:
+    """
+    Returns a 304 Not Modified response if the request's If-None-Match matches `etag`, otherwise None.
+    """
+    if not etag or not request.if_none_match.contains(etag):
+        return None
+    metrics.record('http_cache.not_modified')
+    rsp = Response(status=304)
+    rsp.set_etag(etag)
+    rsp.headers['Cache-Control'] = cache_control
+    return rsp
+
+
+def cached_response(rv: Any, etag: str, cache_control: str) -> Response:
+    """
+    Make a response from a view's return value with the ETag and Cache-Control set, if it was successful.
+    """
+    rsp = make_response(rv)
+    if rsp.status_code == 200:
+        rsp.set_etag(etag)
+        rsp.headers['Cache-Control'] = cache_control
+    return rsp
@@ -0,0 +1,118 @@
+import codecs
+import json
+import typing
+from typing import Any, BinaryIO, Callable, Iterator, Tuple, Type, TypeVar
+
+import dataclasses
+
+T = TypeVar('T')
+
+WHITESPACE = ' \t\n\r'
+
+
+def iter_object_members(stream: BinaryIO, chunk_size: int = 64 * 1024, raw: bool = False) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally parse a JSON object from `stream`, yielding its top level (key, value) pairs as each value is complete.
+
+    Only the unparsed remainder of the current member is kept in memory, so the raw text of the whole document is never
+    held at once and each value can be released by the consumer before the next is parsed.
+    If `raw` is set each value is yielded as its JSON text instead, which is much smaller than the parsed value.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def read_more(minimum: int) -> bool:
+        nonlocal buffer, pos, eof
+        buffer = buffer[pos:]
+        pos = 0
+        target = len(buffer) + minimum
+        while not eof and len(buffer) < target:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                eof = True
+                buffer += utf8.decode(b'', final=True)
+            else:
+                buffer += utf8.decode(chunk)
+        return len(buffer) > 0
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof or not read_more(chunk_size):
+                raise ValueError('Unexpected end of JSON stream')
+
+    def decode_value(terminators: str, raw: bool = False) -> Any:
+        nonlocal pos
+        while True:
+            remaining = len(buffer) - pos
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # the value may have been cut short by the end of the buffer (e.g. a partially read number), so only
+                # accept it once the character that terminates it has been read
+                after = end
+                while after < len(buffer) and buffer[after] in WHITESPACE:
+                    after += 1
+                if eof or (after < len(buffer) and buffer[after] in terminators):
+                    if raw:
+                        value = buffer[pos:end]
+                    pos = end
+                    return value
+            # grow the buffer geometrically so large values are not reparsed too many times
+            read_more(max(remaining, chunk_size))
+
+    if next_char() != '{':
+        raise ValueError('JSON stream does not contain an object')
+    pos += 1
+
+    if next_char() == '}':
+        return
+    while True:
+        key = decode_value(':')
+        if not isinstance(key, str):
+            raise ValueError(f'Expected a string key, got {key!r}')
+        if next_char() != ':':
+            raise ValueError(f'Expected ":" after key {key!r}')
+        pos += 1
+        next_char()
+        value = decode_value(',}', raw)
+        yield key, value
+        value = None
+
+        c = next_char()
+        pos += 1
+        if c == '}':
+            return
+        elif c != ',':
+            raise ValueError(f'Expected "," or "}}" after value for {key!r}, got {c!r}')
+        next_char()
+
+
+def load_dataclass_streaming(stream: BinaryIO, cls: Type[T], load: Callable[[Any, Any], Any]) -> T:
+    """
+    Load the dataclass `cls` from a JSON object in `stream`, converting each top level field with `load(value, type)`
+    as soon as it has been parsed so that only one field's raw data is held at a time.
+    """
+    hints = typing.get_type_hints(cls)
+    fields_by_name = {
+        f.metadata.get('name', f.name): f
+        for f in dataclasses.fields(cls)
+        if f.init
+    }
+    kwargs = {}
+    for name, value in iter_object_members(stream):
+        f = fields_by_name.get(name)
+        if f is not None:
+            kwargs[f.name] = load(value, hints[f.name])
+        value = None
+    return cls(**kwargs)
@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from overtrack_models.orm.user import User
+from overtrack_web.lib import metrics
+
+LAST_PLAYED_MAX_ITEMS = 4096
+
+logger = logging.getLogger(__name__)
+
+# the most recent game of each type is looked up concurrently on this pool
+last_played_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='last_played')
+
+# user_id -> ((overwatch_games, apex_games, valorant_games), game type)
+_last_played: 'OrderedDict[int, Tuple[Tuple[Any, Any, Any], str]]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def _overwatch_game_time(user_id: int) -> Any:
+    from overtrack_models.orm.overwatch_game_summary import OverwatchGameSummary
+    return OverwatchGameSummary.user_id_time_index.get(user_id, scan_index_forward=False).datetime
+
+
+def _apex_game_time(user_id: int) -> Any:
+    from overtrack_models.orm.apex_game_summary import ApexGameSummary
+    return ApexGameSummary.user_id_time_index.get(user_id, scan_index_forward=False).time
+
+
+def _valorant_game_time(user_id: int) -> Any:
+    from overtrack_models.orm.valorant_game_summary import ValorantGameSummary
+    return ValorantGameSummary.user_id_timestamp_index.get(user_id, scan_index_forward=False).datetime
+
+
+GAME_TIMES: Dict[str, Callable[[int], Any]] = {
+    'overwatch': _overwatch_game_time,
+    'apex': _apex_game_time,
+    'valorant': _valorant_game_time,
+}
+
+
+def _try(f: Callable[[int], Any], user_id: int) -> Optional[Any]:
+    try:
+        return f(user_id)
+    except:
+        return None
+
+
+def find_most_recent_game_type(user_id: int) -> str:
+    t0 = time.perf_counter()
+    futures = {game_type: last_played_pool.submit(_try, f, user_id) for game_type, f in GAME_TIMES.items()}
+    times = {game_type: future.result() for game_type, future in futures.items()}
+    logger.info(f'Most recent games: {times} - took {(time.perf_counter() - t0) * 1000:.2f}ms')
+    metrics.record('last_played.lookup_time', value=time.perf_counter() - t0, unit='seconds')
+
+    most_recent = 'overwatch', None
+    for game_type, t in times.items():
+        if t and (not most_recent[1] or t > most_recent[1]):
+            most_recent = game_type, t
+    logger.info(f'Most recent game was {most_recent[0]} at {most_recent[1]}')
+    return most_recent[0]
+
+
+def last_played_game_type(user: User) -> str:
+    """
+    The type of game `user` played most recently.
+
+    This is remembered for each user along with their game counts, so it only has to be looked up again once the user
+    record shows they have played more games.
+    """
+    signature = user.overwatch_games, user.apex_games, user.valorant_games
+    with _lock:
+        cached = _last_played.get(user.user_id)
+        if cached and cached[0] == signature:
+            _last_played.move_to_end(user.user_id)
+            metrics.record('last_played.cache_hit')
+            return cached[1]
+
+    game_type = find_most_recent_game_type(user.user_id)
+    with _lock:
+        _last_played[user.user_id] = signature, game_type
+        _last_played.move_to_end(user.user_id)
+        while len(_last_played) > LAST_PLAYED_MAX_ITEMS:
+            _last_played.popitem(last=False)
+    return game_type
@@ -0,0 +1,155 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from dataclasses import dataclass
+from flask import Flask, abort
+from werkzeug.routing import Rule
+
+from overtrack_web.lib import metrics
+
+logger = logging.getLogger(__name__)
+
+# held while a lazy blueprint registers its views, since they all modify the same app's view functions
+_register_lock = threading.Lock()
+
+
+@dataclass
+class LazyRule:
+    rule: str
+    endpoint: str
+    methods: Optional[Sequence[str]] = None
+
+
+class LazyBlueprint:
+    """
+    A blueprint that is only imported and registered the first time one of its routes is requested.
+
+    The blueprint's URL rules are registered up front (so url_for works for them without loading anything) with
+    placeholder views that load the blueprint and then hand the request to its real view. `rules` must match the routes
+    the blueprint defines - any differences are logged when it is loaded, and raise in debug mode (where blueprints are
+    loaded when they are registered) or from `check_lazy_blueprints`.
+    If the blueprint fails to load its routes return 404, like they would if it had never been registered.
+    """
+
+    def __init__(self, module: str, attr: str, name: str, rules: List[LazyRule]):
+        self.module = module
+        self.attr = attr
+        self.name = name
+        self.rules = rules
+
+        self.app: Optional[Flask] = None
+        self.url_prefix: Optional[str] = None
+        self.loaded = False
+        self.failed = False
+        # differences between `rules` and the blueprint's routes, once it is loaded
+        self.mismatches: List[str] = []
+        self._placeholders: Dict[str, Callable] = {}
+        self._lock = threading.Lock()
+
+    def register(self, app: Flask, url_prefix: Optional[str] = None) -> None:
+        self.app = app
+        self.url_prefix = url_prefix
+        app.extensions.setdefault('lazy_blueprints', []).append(self)
+        if app.debug:
+            # flask doesn't allow registering blueprints after the first request in debug mode
+            if self.load() and self.mismatches:
+                raise RuntimeError(f'Lazy blueprint {self.name} rules do not match its routes: {self.mismatches}')
+            return
+        for rule in self.rules:
+            endpoint = f'{self.name}.{rule.endpoint}'
+            self._placeholders[endpoint] = self._placeholder_view(endpoint)
+            app.add_url_rule(self._full_rule(rule.rule), endpoint, self._placeholders[endpoint], methods=rule.methods)
+
+    def load(self) -> bool:
+        with self._lock:
+            if self.loaded or self.failed:
+                return self.loaded
+
+            t0 = time.perf_counter()
+            try:
+                blueprint = getattr(importlib.import_module(self.module), self.attr)
+            except:
+                logger.exception(f'Failed to import {self.module}.{self.attr} - running without {self.url_prefix}')
+                self.failed = True
+                return False
+
+            existing_rules = {id(r) for r in self.app.url_map.iter_rules()}
+            with _register_lock:
+                # flask won't accept the real views for the placeholders' endpoints if it can see the placeholders, but
+                # removing them first would leave requests being dispatched meanwhile without a view - so they are
+                # hidden from flask while each is replaced
+                self.app.view_functions = _ReplaceableViews(self.app.view_functions, self._placeholders)
+                try:
+                    self.app.register_blueprint(blueprint, url_prefix=self.url_prefix)
+                finally:
+                    self.app.view_functions = dict(self.app.view_functions)
+            self.loaded = True
+
+            load_time = time.perf_counter() - t0
+            logger.info(f'Loaded lazy blueprint {self.name} in {load_time:.3f}s')
+            metrics.record(f'lazy_blueprint.{self.name}.load_time', value=load_time, unit='seconds')
+            self._check_rules([r for r in self.app.url_map.iter_rules() if id(r) not in existing_rules])
+            return True
+
+    def _placeholder_view(self, endpoint: str) -> Callable:
+        def view(**kwargs):
+            if not self.load():
+                abort(404)
+            return self.app.view_functions[endpoint](**kwargs)
+        view.__name__ = endpoint.rsplit('.', 1)[-1]
+        return view
+
+    def _full_rule(self, rule: str) -> str:
+        # same as flask's BlueprintSetupState.add_url_rule
+        if self.url_prefix is None:
+            return rule
+        elif rule:
+            return '/'.join((self.url_prefix.rstrip('/'), rule.lstrip('/')))
+        else:
+            return self.url_prefix
+
+    def _check_rules(self, blueprint_rules: List[Rule]) -> None:
+        declared = {
+            (self._full_rule(r.rule), f'{self.name}.{r.endpoint}', frozenset(r.methods or ['GET']))
+            for r in self.rules
+        }
+        actual = {(r.rule, r.endpoint, frozenset(r.methods - {'HEAD', 'OPTIONS'})) for r in blueprint_rules}
+        for rule in sorted(actual - declared):
+            self.mismatches.append(f'does not declare {rule}')
+            logger.error(f'Lazy blueprint {self.name} does not declare {rule} - it will 404 until the blueprint is loaded')
+        for rule in sorted(declared - actual):
+            self.mismatches.append(f'declares {rule}, which the blueprint does not define')
+            logger.error(f'Lazy blueprint {self.name} declares {rule}, which the blueprint does not define')
+
+
+class _ReplaceableViews(dict):
+    """
+    View functions with the given placeholders hidden from `get` (which flask uses to check that it isn't replacing a
+    different view for an endpoint), but still returned by indexing until they are replaced.
+    """
+
+    def __init__(self, views: Dict[str, Callable], placeholders: Dict[str, Callable]):
+        super().__init__(views)
+        self.placeholders = placeholders
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        if key in self.placeholders and value is self.placeholders[key]:
+            return default
+        return value
+
+
+def check_lazy_blueprints(app: Flask) -> List[str]:
+    """
+    Load every lazy blueprint registered on `app`, and return how any of their rules differ from their routes (or fail
+    to load).
+    """
+    problems = []
+    for lazy_blueprint in app.extensions.get('lazy_blueprints', []):
+        if not lazy_blueprint.load():
+            problems.append(f'{lazy_blueprint.name}: failed to load')
+        problems += [f'{lazy_blueprint.name}: {m}' for m in lazy_blueprint.mismatches]
+    return problems
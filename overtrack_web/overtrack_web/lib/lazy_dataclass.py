@@ -0,0 +1,215 @@
+import enum
+import functools
+import json
+import logging
+import threading
+import typing
+from typing import Any, BinaryIO, Callable, Dict, Generic, Optional, Type, TypeVar
+
+import dataclasses
+
+from overtrack_web.lib.json_stream import iter_object_members
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+
+class LazyDataclass(Generic[T]):
+    """
+    Proxy for a dataclass that keeps the raw (JSON) data of each field and only loads a field the first time it is
+    accessed, so that requests which only use part of a large object don't pay for loading all of it.
+
+    Only fields holding immutable values (strings, numbers, enums and tuples of them) are loaded on their own. Any other
+    field may hold objects that `load` shares with other fields (referenced_typedload loads every reference to an
+    object as the same instance), so using one of them loads the whole object in a single pass - as does anything that
+    needs the real object (properties/methods of the class), or a field that cannot be loaded on its own.
+
+    Loaded (and assigned) fields are stored on the proxy, so attribute access is identical to the real dataclass.
+    Loading is done under a lock, since a proxy may be shared between threads (e.g. through the GameCache).
+    If `parse` is set, each value in `data` is the serialised (e.g. JSON text) form of its field, and is parsed before
+    it is loaded. Pickling keeps the raw data of fields that haven't been loaded, so `load` and `parse` must be picklable.
+    """
+
+    def __init__(
+        self,
+        cls: Type[T],
+        data: Dict[str, Any],
+        load: Callable[[Any, Any], Any],
+        parse: Optional[Callable[[Any], Any]] = None,
+    ):
+        d = self.__dict__
+        d['_lazy_cls'] = cls
+        d['_lazy_data'] = data
+        d['_lazy_load'] = load
+        d['_lazy_parse'] = parse
+        d['_lazy_fields'] = {f.name: f for f in dataclasses.fields(cls)}
+        d['_lazy_hints'] = typing.get_type_hints(cls)
+        d['_lazy_instance'] = None
+        d['_lazy_lock'] = threading.RLock()
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for attributes not already set on the proxy
+        if name.startswith('_lazy') or name.startswith('__'):
+            raise AttributeError(name)
+        f = self._lazy_fields.get(name)
+        if f is None or not _is_immutable(self._lazy_hints[f.name]):
+            return getattr(self._lazy_materialise(), name)
+        return self._lazy_load_field(f)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        with self._lazy_lock:
+            f = self._lazy_fields.get(name)
+            if f is not None and not _is_immutable(self._lazy_hints[f.name]):
+                # the value may share objects with other fields, so it can only be dumped along with them
+                self._lazy_materialise()
+            self.__dict__[name] = value
+            if self._lazy_instance is not None:
+                setattr(self._lazy_instance, name, value)
+
+    def __getitem__(self, name: str) -> Any:
+        return getattr(self, name)
+
+    def __repr__(self) -> str:
+        loaded = [n for n in self._lazy_fields if n in self.__dict__]
+        return f'{self.__class__.__name__}({self._lazy_cls.__name__}, loaded={loaded})'
+
+    def __reduce__(self):
+        # pickle the raw data of the fields that haven't been loaded rather than loading them, along with the fields that
+        # have been loaded or assigned
+        with self._lazy_lock:
+            state = {k: v for k, v in self.__dict__.items() if not k.startswith('_lazy')}
+            return _unpickle, (self._lazy_cls, self._lazy_data, self._lazy_load, self._lazy_parse, state)
+
+    @property
+    def lazy_loaded_fields(self) -> typing.List[str]:
+        return [n for n in self._lazy_fields if n in self.__dict__]
+
+    def _lazy_raw_name(self, f: dataclasses.Field) -> str:
+        return f.metadata.get('name', f.name)
+
+    def _lazy_load_field(self, f: dataclasses.Field) -> Any:
+        with self._lazy_lock:
+            if f.name in self.__dict__:
+                # loaded by another thread while waiting for the lock
+                return self.__dict__[f.name]
+            return self._lazy_load_field_locked(f)
+
+    def _lazy_load_field_locked(self, f: dataclasses.Field) -> Any:
+        raw_name = self._lazy_raw_name(f)
+        if raw_name in self._lazy_data:
+            try:
+                raw = self._lazy_data[raw_name]
+                if self._lazy_parse:
+                    raw = self._lazy_parse(raw)
+                value = self._lazy_load(raw, self._lazy_hints[f.name])
+            except Exception as e:
+                logger.warning(f'Failed to load {self._lazy_cls.__name__}.{f.name} on its own ({e}) - loading in full')
+                return getattr(self._lazy_materialise(), f.name)
+        elif f.default is not dataclasses.MISSING:
+            value = f.default
+        elif f.default_factory is not dataclasses.MISSING:
+            value = f.default_factory()
+        else:
+            return getattr(self._lazy_materialise(), f.name)
+
+        self.__dict__[f.name] = value
+        if all(n in self.__dict__ for n in self._lazy_fields):
+            # every field is loaded - the raw data is no longer needed
+            self.__dict__['_lazy_data'] = {}
+        return value
+
+    def _lazy_materialise(self) -> T:
+        if self._lazy_instance is not None:
+            return self._lazy_instance
+        with self._lazy_lock:
+            if self._lazy_instance is None:
+                self._lazy_materialise_locked()
+        return self._lazy_instance
+
+    def _lazy_materialise_locked(self) -> None:
+        if all(n in self.__dict__ for n in self._lazy_fields):
+            instance = self._lazy_cls(**{
+                n: self.__dict__[n] for n, f in self._lazy_fields.items() if f.init
+            })
+        else:
+            instance = self._lazy_load(self._lazy_parsed_data(), self._lazy_cls)
+        # fields already loaded or assigned on the proxy take precedence
+        for n in self._lazy_fields:
+            if n in self.__dict__:
+                setattr(instance, n, self.__dict__[n])
+            else:
+                self.__dict__[n] = getattr(instance, n)
+        self.__dict__['_lazy_data'] = {}
+        self.__dict__['_lazy_instance'] = instance
+
+    def _lazy_parsed_data(self) -> Dict[str, Any]:
+        if not self._lazy_parse:
+            return self._lazy_data
+        return {k: self._lazy_parse(v) for k, v in self._lazy_data.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def _is_immutable(t: Any) -> bool:
+    """
+    Whether values of type `t` are immutable, so that loading one on its own can't lose objects shared with the rest of
+    the dataclass.
+    """
+    if t in (int, float, str, bool, type(None)) or t is None:
+        return True
+    if isinstance(t, type) and issubclass(t, enum.Enum):
+        return True
+    if hasattr(t, '__supertype__'):
+        # NewType
+        return _is_immutable(t.__supertype__)
+    origin = getattr(t, '__origin__', None)
+    args = getattr(t, '__args__', None) or ()
+    if origin is typing.Union or origin in (tuple, typing.Tuple):
+        return bool(args) and all(a is Ellipsis or _is_immutable(a) for a in args)
+    if getattr(typing, 'Literal', None) is not None and origin is typing.Literal:
+        return True
+    return False
+
+
+def _unpickle(
+    cls: Type[T],
+    data: Dict[str, Any],
+    load: Callable[[Any, Any], Any],
+    parse: Optional[Callable[[Any], Any]],
+    state: Dict[str, Any],
+) -> LazyDataclass[T]:
+    obj = LazyDataclass(cls, data, load, parse)
+    obj.__dict__.update(state)
+    return obj
+
+
+def load_lazy_streaming(stream: BinaryIO, cls: Type[T], load: Callable[[Any, Any], Any]) -> T:
+    """
+    Load the dataclass `cls` from a JSON object in `stream` as a LazyDataclass, keeping each top level field as its
+    JSON text until it is used - like load_dataclass_streaming, the dict tree of the whole object is never built.
+    """
+    return LazyDataclass(cls, dict(iter_object_members(stream, raw=True)), load, parse=json.loads)
+
+
+def materialise(obj: Any) -> Any:
+    if isinstance(obj, LazyDataclass):
+        return obj._lazy_materialise()
+    return obj
+
+
+def dump_dataclass(obj: Any, dump: Callable[[Any], Any]) -> Any:
+    """
+    Dump a dataclass (or LazyDataclass) with `dump`. For a LazyDataclass fields that have not been loaded are dumped as
+    their original raw data, without loading them - only immutable fields are loaded without materialising the object,
+    so the fields dumped on their own can't hold references to objects in the raw data (or each other).
+    """
+    if not isinstance(obj, LazyDataclass):
+        return dump(obj)
+    with obj._lazy_lock:
+        if obj._lazy_instance is not None:
+            return dump(obj._lazy_instance)
+        data = dict(obj._lazy_parsed_data())
+        for n, f in obj._lazy_fields.items():
+            if n in obj.__dict__:
+                data[obj._lazy_raw_name(f)] = dump(obj.__dict__[n])
+        return data
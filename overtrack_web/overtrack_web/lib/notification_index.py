@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from overtrack_web.lib import metrics
+
+# S3 location of the persisted index - without a bucket every process has to scan the table itself each time it
+# rebuilds the index
+NOTIFICATION_INDEX_BUCKET = os.environ.get('NOTIFICATION_INDEX_BUCKET', '')
+NOTIFICATION_INDEX_KEY = os.environ.get('NOTIFICATION_INDEX_KEY', 'discord_bot/notification_index.json')
+# how old the index can get before it is rebuilt (from the snapshot), so that integrations added by other processes are
+# picked up
+NOTIFICATION_INDEX_TTL = float(os.environ.get('NOTIFICATION_INDEX_TTL', 15 * 60))
+# how long to wait before trying again if building the index fails
+NOTIFICATION_INDEX_RETRY = 60
+
+logger = logging.getLogger(__name__)
+
+# guild_id -> {notification key: game}
+Guilds = Dict[str, Dict[str, str]]
+
+
+class GuildNotificationIndex:
+    """
+    The keys of the discord bot notifications in each guild, so that the integrations in a user's guilds can be found
+    without reading every notification.
+
+    The index is built the first time it is used - from the snapshot persisted in S3 if that is recent enough, otherwise
+    by scanning the table (and persisting the result for other processes). Once it is older than `ttl` it is rebuilt in
+    a background thread, and the old index is used until the new one is ready. Without a bucket there is no snapshot to
+    share the scan between processes, so each process scans the table for every rebuild.
+    Notifications added or removed by this process are applied immediately, and kept across rebuilds from an older
+    snapshot.
+    """
+
+    def __init__(self, model, s3=None, bucket: str = '', key: str = '', ttl: float = NOTIFICATION_INDEX_TTL):
+        self.model = model
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.ttl = ttl
+
+        self._guilds: Guilds = {}
+        self._built = 0.
+        self._next_build = 0.
+        # (time, guild_id, key, game or None if removed)
+        self._changes: List[Tuple[float, str, str, Optional[str]]] = []
+        self._lock = threading.Lock()
+        # held while building the index, which is done without holding _lock so that it doesn't block add/remove
+        self._build_lock = threading.Lock()
+
+    def get(self, guild_id: str, game: Optional[str] = None) -> List[str]:
+        self._ensure_fresh()
+        return [k for k, g in self._guilds.get(guild_id, {}).items() if game is None or g == game]
+
+    def add(self, notification) -> None:
+        self._apply(time.time(), notification.guild_id, notification.key, notification.game)
+
+    def remove(self, guild_id: str, key: str) -> None:
+        self._apply(time.time(), guild_id, key, None)
+
+    def _apply(self, t: float, guild_id: str, key: str, game: Optional[str]) -> None:
+        with self._lock:
+            self._changes.append((t, guild_id, key, game))
+            self._apply_change(self._guilds, guild_id, key, game)
+
+    @staticmethod
+    def _apply_change(guilds: Guilds, guild_id: str, key: str, game: Optional[str]) -> None:
+        if game is not None:
+            guilds.setdefault(guild_id, {})[key] = game
+        elif key in guilds.get(guild_id, {}):
+            del guilds[guild_id][key]
+            if not guilds[guild_id]:
+                del guilds[guild_id]
+
+    def _ensure_fresh(self) -> None:
+        if not self._built:
+            # there is nothing to use until the first build, so this request has to wait for it
+            with self._build_lock:
+                if not self._built and time.time() >= self._next_build:
+                    self._build()
+        elif time.time() - self._built >= self.ttl and time.time() >= self._next_build:
+            self._rebuild_in_background()
+
+    def _rebuild_in_background(self) -> None:
+        if not self._build_lock.acquire(blocking=False):
+            return
+
+        def rebuild():
+            try:
+                if time.time() - self._built >= self.ttl:
+                    self._build()
+            finally:
+                self._build_lock.release()
+
+        try:
+            threading.Thread(target=rebuild, name='notification-index-rebuild', daemon=True).start()
+        except:
+            self._build_lock.release()
+            raise
+
+    def _build(self) -> None:
+        try:
+            snapshot = self._load_snapshot()
+            if snapshot:
+                guilds, built = snapshot
+            else:
+                if not self.bucket:
+                    logger.warning('NOTIFICATION_INDEX_BUCKET is not set - scanning for the notification index')
+                guilds, built = self._scan()
+                self._save_snapshot(guilds, built)
+        except:
+            logger.exception(f'Failed to build notification index - retrying in {NOTIFICATION_INDEX_RETRY}s')
+            metrics.record('notification_index.build_failed')
+            self._next_build = time.time() + NOTIFICATION_INDEX_RETRY
+            return
+
+        with self._lock:
+            # the snapshot (or scan) may be older than changes this process has made itself
+            self._changes = [c for c in self._changes if c[0] >= built]
+            for _, guild_id, key, game in self._changes:
+                self._apply_change(guilds, guild_id, key, game)
+            self._guilds = guilds
+            self._built = built
+
+    def _scan(self) -> Tuple[Guilds, float]:
+        t0 = time.perf_counter()
+        built = time.time()
+        guilds: Guilds = {}
+        q = self.model.scan()
+        for n in q:
+            guilds.setdefault(n.guild_id, {})[n.key] = n.game
+        scan_time = time.perf_counter() - t0
+
+        logger.info(f'Scanned {q.total_count} notifications in {len(guilds)} guilds in {scan_time * 1000:.2f}ms')
+        metrics.record('notification_index.scan_time', value=scan_time, unit='seconds')
+        metrics.record('notification_index.items', value=q.total_count)
+        metrics.record('notification_index.guilds', value=len(guilds))
+        return guilds, built
+
+    def _load_snapshot(self) -> Optional[Tuple[Guilds, float]]:
+        if not self.s3 or not self.bucket:
+            return None
+        t0 = time.perf_counter()
+        try:
+            data = json.load(self.s3.get_object(Bucket=self.bucket, Key=self.key)['Body'])
+        except self.s3.exceptions.NoSuchKey:
+            logger.info(f'No notification index snapshot at s3://{self.bucket}/{self.key}')
+            return None
+        except:
+            logger.exception(f'Failed to load notification index snapshot from s3://{self.bucket}/{self.key}')
+            return None
+
+        age = time.time() - data['built']
+        if age > self.ttl:
+            logger.info(f'Notification index snapshot is {age:.0f}s old - rebuilding')
+            return None
+        logger.info(
+            f'Loaded notification index snapshot ({age:.0f}s old, {len(data["guilds"])} guilds) in '
+            f'{(time.perf_counter() - t0) * 1000:.2f}ms'
+        )
+        metrics.record('notification_index.snapshot_load_time', value=time.perf_counter() - t0, unit='seconds')
+        return data['guilds'], data['built']
+
+    def _save_snapshot(self, guilds: Guilds, built: float) -> None:
+        if not self.s3 or not self.bucket:
+            return
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=json.dumps({'built': built, 'guilds': guilds}).encode(),
+                ContentType='application/json',
+            )
+        except:
+            logger.exception(f'Failed to save notification index snapshot to s3://{self.bucket}/{self.key}')
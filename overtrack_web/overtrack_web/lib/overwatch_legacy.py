@@ -6,7 +6,7 @@ import requests
 logger = logging.getLogger(__name__)
 
 
-def get_legacy_paths(legacy_base: str) -> Tuple[Dict[str, str], Optional[str]]:
+def get_legacy_paths(legacy_base: str, timeout: Optional[float] = None) -> Tuple[Dict[str, str], Optional[str]]:
     legacy_scripts = {}
     legacy_stylesheet = None
 
@@ -35,7 +35,7 @@ def get_legacy_paths(legacy_base: str) -> Tuple[Dict[str, str], Optional[str]]:
                     legacy_stylesheet = href
                     logger.info(f'Got legacy stylesheet path: {legacy_stylesheet!r}')
 
-    r = requests.get(legacy_base)
+    r = requests.get(legacy_base, timeout=timeout)
     r.raise_for_status()
     ExtractScripts().feed(r.text)
 
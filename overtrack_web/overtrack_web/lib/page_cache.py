@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dataclasses import dataclass, field
+
+from overtrack_web.lib import metrics
+
+PAGE_CACHE_MAX_ITEMS = int(os.environ.get('PAGE_CACHE_MAX_ITEMS', 256))
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# identifies the deployed code and templates - if not set by the deploy, they are hashed (see app_version)
+APP_VERSION = os.environ.get('APP_VERSION', '')
+# file the deploy writes the version to (the commit being deployed), for when APP_VERSION isn't set
+APP_VERSION_FILE = os.environ.get(
+    'APP_VERSION_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'app_version')
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedPage:
+    key: str
+    version: str
+    content: str
+    context: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+
+class PageCache:
+    """
+    In-memory LRU cache of rendered page content, keyed by game key and only valid for the `version` it was rendered
+    for (e.g. the ETag of the stored game and the version of the templates).
+
+    `context` holds the (cheap) values the page needs outside of the cached content, such as the title, so that a hit can
+    be served without loading the game. Neither may depend on the request - e.g. absolute URLs, which use its host.
+    """
+
+    def __init__(self, name: str, max_items: int, max_bytes: int):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+
+        self.total_bytes = 0
+        self._entries: 'OrderedDict[str, CachedPage]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: str) -> Optional[CachedPage]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.version == version:
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+        metrics.record(f'{self.name}.{"hit" if entry else "miss"}')
+        return entry
+
+    def put(self, entry: CachedPage) -> None:
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            existing = self._entries.pop(entry.key, None)
+            if existing:
+                self.total_bytes -= existing.size
+            self._entries[entry.key] = entry
+            self.total_bytes += entry.size
+            while len(self._entries) > self.max_items or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.size
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self.total_bytes -= entry.size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@functools.lru_cache()
+def app_version() -> str:
+    """
+    Version of the app's code and templates, so that pages rendered (or ETags built) by a previous deploy are not
+    reused: $APP_VERSION if set, or the version in APP_VERSION_FILE, otherwise a hash of the Python source and the
+    templates (which is slow enough to matter on a cold start - deploys should set one of the others).
+    """
+    if APP_VERSION:
+        return APP_VERSION
+    try:
+        with open(APP_VERSION_FILE) as f:
+            version = f.read().strip()
+        if version:
+            return version
+    except FileNotFoundError:
+        pass
+    except:
+        logger.exception(f'Failed to read {APP_VERSION_FILE}')
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    h = hashlib.md5()
+    for path, suffix in [(package, '.py'), (os.path.join(package, '..', 'templates'), '')]:
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for name in sorted(files):
+                if not name.endswith(suffix):
+                    continue
+                filename = os.path.join(root, name)
+                h.update(os.path.relpath(filename, path).encode())
+                try:
+                    with open(filename, 'rb') as f:
+                        h.update(f.read())
+                except OSError:
+                    logger.exception(f'Failed to read {filename}')
+    return h.hexdigest()[:12]
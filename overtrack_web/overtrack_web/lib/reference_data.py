@@ -0,0 +1,321 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, TypeVar
+
+from dataclasses import asdict, dataclass, field
+
+from overtrack_web.lib import metrics
+
+# timeout for each request made when fetching reference data
+REFERENCE_DATA_TIMEOUT = float(os.environ.get('REFERENCE_DATA_TIMEOUT', 5))
+# how old reference data can get before it is refreshed in the background
+REFERENCE_DATA_TTL = float(os.environ.get('REFERENCE_DATA_TTL', 60 * 60))
+# snapshot of the reference data bundled with the deployment package, written at deploy time by
+# scripts/update_reference_data.py - sources missing from it are fetched on first use
+REFERENCE_DATA_SNAPSHOT = os.environ.get(
+    'REFERENCE_DATA_SNAPSHOT',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'reference_data.json')
+)
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SourceTiming:
+    name: str
+    seconds: float
+    source: str
+    error: Optional[str] = None
+
+
+@dataclass
+class Snapshot:
+    version: Optional[str] = None
+    created: float = 0
+    sources: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _State(Generic[T]):
+    value: T
+    source: str
+    updated: float
+
+
+def load_snapshot(path: str = REFERENCE_DATA_SNAPSHOT) -> Snapshot:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return Snapshot(data['version'], data['created'], data['sources'])
+    except FileNotFoundError:
+        logger.warning(f'No reference data snapshot at {path}')
+    except:
+        logger.exception(f'Failed to load reference data snapshot from {path}')
+    return Snapshot()
+
+
+class ReferenceData(Generic[T]):
+    """
+    A piece of reference data (e.g. season or hero data from the API).
+
+    The data is first loaded from the bundled snapshot, or fetched if the snapshot does not have it. Once it was loaded
+    (data from the snapshot counts as loaded when the process loads it) or refreshed longer than the registry's TTL ago
+    it is refreshed in a background thread, and the new data swapped in once it has been parsed.
+    `fetch` returns the raw (JSON) data as stored in the snapshot and `parse` converts it. If the data can't be loaded
+    at all, the `fallback` data is used instead.
+    """
+
+    def __init__(
+        self,
+        registry: 'ReferenceDataRegistry',
+        name: str,
+        fetch: Callable[[], Any],
+        fallback: Callable[[], T],
+        parse: Optional[Callable[[Any], T]] = None,
+    ):
+        self.registry = registry
+        self.name = name
+        self.fetch = fetch
+        self.fallback = fallback
+        self.parse = parse or (lambda data: data)
+
+        self.timing: Optional[SourceTiming] = None
+        self._state: Optional[_State[T]] = None
+        self._checked = 0.
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self._checked > self.registry.ttl
+
+    def get(self) -> T:
+        state = self._state
+        if state is None:
+            # anything that needs one source will likely need the others soon, so load all of them together
+            self.registry.load_all()
+            state = self._state
+        if self.stale:
+            self.registry.refresh_stale()
+        return state.value
+
+    def load(self, snapshot: Snapshot) -> None:
+        with self._lock:
+            if self._state is not None:
+                return
+            t0 = time.perf_counter()
+            error = None
+            if self.name in snapshot.sources:
+                try:
+                    # the snapshot was taken by the deploy this process is running, so it is treated as fresh when
+                    # loaded rather than being refreshed straight away on every cold start
+                    self._set(self.parse(snapshot.sources[self.name]), 'snapshot', snapshot.created, checked=time.time())
+                except Exception as e:
+                    logger.exception(f'Failed to load {self.name} from snapshot {snapshot.version} - fetching')
+                    error = repr(e)
+            if self._state is None:
+                try:
+                    self._set(self.parse(self.fetch()), 'fetched', time.time())
+                except Exception as e:
+                    logger.exception(f'Failed to fetch {self.name} - using fallback')
+                    self._set(self.fallback(), 'fallback', 0)
+                    error = repr(e)
+            self.timing = SourceTiming(self.name, time.perf_counter() - t0, self._state.source, error)
+
+        logger.info(f'Loaded {self.name} from {self.timing.source} in {self.timing.seconds:.3f}s')
+        metrics.record(f'reference_data.{self.name}.load_time', value=self.timing.seconds, unit='seconds')
+        metrics.record(f'reference_data.{self.name}.{self.timing.source}')
+
+    def refresh(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            value = self.parse(self.fetch())
+        except:
+            logger.exception(f'Failed to refresh {self.name} - keeping data from {self._state.source}')
+            metrics.record(f'reference_data.{self.name}.refresh_failed')
+            # don't retry until the TTL has passed again
+            self._checked = time.time()
+            return
+        self._set(value, 'fetched', time.time())
+        logger.info(f'Refreshed {self.name} in {time.perf_counter() - t0:.3f}s')
+        metrics.record(f'reference_data.{self.name}.refresh_time', value=time.perf_counter() - t0, unit='seconds')
+
+    def status(self) -> Dict[str, Any]:
+        state = self._state
+        if state is None:
+            return {'name': self.name, 'loaded': False}
+        return {
+            'name': self.name,
+            'loaded': True,
+            'source': state.source,
+            'updated': state.updated,
+            'age': time.time() - state.updated if state.updated else None,
+        }
+
+    def _set(self, value: T, source: str, updated: float, checked: Optional[float] = None) -> None:
+        # a single assignment, so readers see either the old or the new data but never a mix
+        self._state = _State(value, source, updated)
+        self._checked = updated if checked is None else checked
+
+
+class ReferenceDataRegistry:
+
+    def __init__(self, snapshot_path: str = REFERENCE_DATA_SNAPSHOT, ttl: float = REFERENCE_DATA_TTL):
+        self.snapshot_path = snapshot_path
+        self.ttl = ttl
+        self.sources: Dict[str, ReferenceData] = {}
+
+        self._snapshot: Optional[Snapshot] = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Snapshot:
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = load_snapshot(self.snapshot_path)
+        return self._snapshot
+
+    def register(
+        self,
+        name: str,
+        fetch: Callable[[], Any],
+        fallback: Callable[[], T],
+        parse: Optional[Callable[[Any], T]] = None,
+    ) -> ReferenceData[T]:
+        source = ReferenceData(self, name, fetch, fallback, parse)
+        self.sources[name] = source
+        return source
+
+    def load_all(self) -> None:
+        snapshot = self.snapshot
+        pending = [s for s in self.sources.values() if not s.loaded]
+        # sources in the snapshot load without any requests, so only use threads for the ones that need fetching
+        for s in [s for s in pending if s.name in snapshot.sources]:
+            s.load(snapshot)
+        to_fetch = [s for s in pending if not s.loaded]
+        if len(to_fetch) == 1:
+            to_fetch[0].load(snapshot)
+        elif to_fetch:
+            with ThreadPoolExecutor(max_workers=len(to_fetch)) as executor:
+                list(executor.map(lambda s: s.load(snapshot), to_fetch))
+        if pending:
+            logger.info(
+                f'Loaded reference data (snapshot {snapshot.version}): ' +
+                ', '.join(f'{s.name}={s.timing.source} ({s.timing.seconds:.3f}s)' for s in pending if s.timing)
+            )
+
+    def refresh_stale(self) -> None:
+        """
+        Start refreshing all stale sources in a background thread, unless a refresh is already running.
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            stale = [s for s in self.sources.values() if s.loaded and s.stale]
+            if not stale:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, args=(stale, ), name='reference-data-refresh', daemon=True).start()
+
+    def _refresh(self, sources: List[ReferenceData]) -> None:
+        try:
+            with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                list(executor.map(lambda s: s.refresh(), sources))
+        except:
+            logger.exception('Failed to refresh reference data')
+        finally:
+            self._refreshing = False
+
+    def fetch_snapshot(self, previous: Optional[Snapshot] = None, strict: bool = False) -> Snapshot:
+        """
+        Fetch the raw data for every source into a new snapshot. Unless `strict` is set, sources that fail to fetch keep
+        their data from `previous`, or are left out of the snapshot (and fetched on first use) if it doesn't have them.
+        """
+        sources = {}
+        for name, source in sorted(self.sources.items()):
+            try:
+                data = source.fetch()
+                source.parse(data)
+            except:
+                if strict:
+                    raise
+                if previous and name in previous.sources:
+                    logger.exception(f'Failed to fetch {name} - keeping data from snapshot {previous.version}')
+                    sources[name] = previous.sources[name]
+                else:
+                    logger.exception(f'Failed to fetch {name} - leaving it out of the snapshot')
+                continue
+            sources[name] = data
+
+        created = time.time()
+        digest = hashlib.md5(json.dumps(sources, sort_keys=True).encode()).hexdigest()[:8]
+        return Snapshot(time.strftime('%Y%m%d%H%M%S', time.gmtime(created)) + '-' + digest, created, sources)
+
+    def timings(self) -> List[Dict[str, Any]]:
+        return [asdict(s.timing) for s in self.sources.values() if s.timing]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'snapshot': {
+                'version': self.snapshot.version,
+                'created': self.snapshot.created,
+            },
+            'sources': [s.status() for s in self.sources.values()],
+        }
+
+
+registry = ReferenceDataRegistry()
+
+
+def register(
+    name: str,
+    fetch: Callable[[], Any],
+    fallback: Callable[[], T],
+    parse: Optional[Callable[[Any], T]] = None,
+) -> ReferenceData[T]:
+    return registry.register(name, fetch, fallback, parse)
+
+
+class LazyMapping(Mapping):
+    """
+    Read-only mapping over reference data, so it can be used in place of a module level dict without loading the data
+    until it is first accessed. `select` picks the mapping out of the data if the data is not a mapping itself.
+    """
+
+    def __init__(self, data: ReferenceData, select: Optional[Callable[[Any], Mapping]] = None):
+        self._data = data
+        self._select = select
+
+    def _mapping(self) -> Mapping:
+        value = self._data.get()
+        return self._select(value) if self._select else value
+
+    def __getitem__(self, key):
+        return self._mapping()[key]
+
+    def __iter__(self) -> Iterator:
+        return iter(self._mapping())
+
+    def __len__(self) -> int:
+        return len(self._mapping())
+
+    def __contains__(self, key) -> bool:
+        return key in self._mapping()
+
+    def __repr__(self) -> str:
+        if not self._data.loaded:
+            return f'{self.__class__.__name__}({self._data.name}, not loaded)'
+        return repr(self._mapping())
@@ -1,14 +1,120 @@
+import copy
 import json
-from typing import NamedTuple
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
 
-from flask import g
+from flask import g, has_app_context
 from sentry_sdk.serializer import add_global_repr_processor
 from werkzeug.local import LocalProxy
 
 from overtrack_models.dataclasses import typedload
 from overtrack_models.orm.user import User
+from overtrack_web.lib import metrics
+
+# how long a User loaded by one request can be reused by later requests
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 30))
+USER_CACHE_MAX_ITEMS = int(os.environ.get('USER_CACHE_MAX_ITEMS', 1024))
+# refresh_user doesn't reload a User that was loaded less than this long ago
+USER_REFRESH_MAX_AGE = float(os.environ.get('USER_REFRESH_MAX_AGE', 5))
+
+
+class UserCache:
+    """
+    Users loaded by recent requests, by user_id.
+
+    Entries expire after `ttl` (so changes made by other processes are picked up) and the least recently used are dropped
+    once there are more than `max_items`. Each `get` returns a copy of the cached User, since views (and User.refresh)
+    modify the User they are given - views that modify a user should save it with `save_user` so that the cached copy is
+    replaced.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_items: int = USER_CACHE_MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        # user_id -> (time loaded, user)
+        self._users: 'OrderedDict[int, Tuple[float, User]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[User]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry and time.time() - entry[0] > self.ttl:
+                del self._users[user_id]
+                entry = None
+            if entry:
+                self._users.move_to_end(user_id)
+        metrics.record('user_cache.hit' if entry else 'user_cache.miss')
+        if not entry:
+            return None
+        loaded, user = entry
+        return _with_loaded(copy.deepcopy(user), loaded)
+
+    def put(self, user: User) -> None:
+        """
+        Cache a copy of `user`, which has just been loaded or saved.
+        """
+        loaded = time.time()
+        _with_loaded(user, loaded)
+        cached = copy.deepcopy(user)
+        with self._lock:
+            self._users[user.user_id] = loaded, cached
+            self._users.move_to_end(user.user_id)
+            while len(self._users) > self.max_items:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def age(self, user: User) -> Optional[float]:
+        """
+        How long ago `user` was loaded, or None if it did not come from the cache.
+        """
+        loaded = vars(user).get('_user_cache_loaded')
+        if loaded is None:
+            return None
+        return time.time() - loaded
+
+
+def _with_loaded(user: User, loaded: float) -> User:
+    # stored on the instance (not as a model attribute), so it is never saved
+    vars(user)['_user_cache_loaded'] = loaded
+    return user
+
+
+_user_cache = UserCache()
+
+
+def get_user(user_id: int) -> User:
+    user = _user_cache.get(user_id)
+    if user is None:
+        user = User.user_id_index.get(user_id)
+        _user_cache.put(user)
+    return user
+
+
+def refresh_user(user: User, max_age: float = USER_REFRESH_MAX_AGE) -> None:
+    """
+    Reload `user`, unless it came from the cache and was loaded less than `max_age` ago (e.g. by check_authentication
+    earlier in the same request). Use max_age=0 before modifying and saving the user, so that changes made since it was
+    loaded aren't overwritten.
+    """
+    age = _user_cache.age(user)
+    if age is not None and age < max_age:
+        metrics.record('user_cache.refresh_skipped')
+        return
+    user.refresh()
+    _user_cache.put(user)
+
+
+def save_user(user: User) -> None:
+    user.save()
+    # the saved object is now the most recent copy, so it replaces whatever was cached
+    _user_cache.put(user)
 
-_user_cache = {}
 
 class Session(NamedTuple):
     user_id: int
@@ -17,12 +123,13 @@ class Session(NamedTuple):
 
     @property
     def user(self) -> User:
-        if self.key in _user_cache:
-            return _user_cache[self.key]
-        else:
-            user = User.user_id_index.get(self.user_id)
-            _user_cache[self.key] = user
-            return user
+        if not has_app_context():
+            return get_user(self.user_id)
+        # keep using the same User for the rest of the request, even if the cached copy expires or is replaced
+        users = g.setdefault('session_users', {})
+        if self.user_id not in users:
+            users[self.user_id] = get_user(self.user_id)
+        return users[self.user_id]
 
     @property
     def username(self) -> str:
@@ -15,12 +15,12 @@ class MockUser(NamedTuple):
     username: str = 'MOCK_USER'
     user_id: int = 0
 
-    apex_last_season: int = apex_data.current_season.index
+    apex_last_season: int = apex_data.get_current_season().index
     apex_last_game_ranked: bool = True
     apex_seasons: List[int] = list(apex_data.seasons.keys())
     apex_games: int = 1
 
-    overwatch_last_season: int = overwatch_data.current_season.index
+    overwatch_last_season: int = overwatch_data.get_current_season().index
     overwatch_seasons: List[int] = list(overwatch_data.seasons.keys())[-5:]
     overwatch_games: int = 1
 
@@ -0,0 +1,90 @@
+"""
+Build (or rebuild) the stored apex stats summaries (see SummaryStore in overtrack_web.views.apex.stats) for existing
+users, so that their first visit to /apex/stats after deploying doesn't have to read all of their games.
+
+With --check the stats and placement histogram of the stored summaries are also compared with those of all of the
+user's games summarised at once, and the script exits non-zero if any differ.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.backfill_apex_stats --username eeveea-11520 --check
+    python -m overtrack_web.scripts.backfill_apex_stats --all --workers 8
+"""
+import argparse
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from overtrack_models.orm.user import User
+from overtrack_web.views.apex.stats import GameColumns, SeasonSummary, get_games, summary_store
+
+logger = logging.getLogger(__name__)
+
+
+def check(user: User, summary: SeasonSummary) -> List[str]:
+    expected = GameColumns.from_games(get_games(user)).summarise()
+    if summary.games != expected.games:
+        return [f'games: summary {summary.games} != games {expected.games}']
+    differences = []
+    if summary.placements != expected.placements:
+        differences.append(f'placements: summary {summary.placements} != games {expected.placements}')
+    for (name, value, share), (_, expected_value, expected_share) in zip(summary.stats(), expected.stats()):
+        if abs(value - expected_value) > 0.01 or abs(share - expected_share) > 1e-6:
+            differences.append(f'{name}: summary {value, share} != games {expected_value, expected_share}')
+    return differences
+
+
+def backfill(user: User, check_summary: bool) -> List[str]:
+    summary = summary_store.rebuild(user.user_id).total()
+    logger.info(f'Built apex stats summaries for {user.username} ({user.user_id}): {summary.games} games')
+    if check_summary:
+        # including the games too recent to be stored, as viewing the page would
+        summary = summary_store.get(user.user_id).total()
+        if summary.games:
+            return [f'{user.username}: {d}' for d in check(user, summary)]
+    return []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    user_arg = parser.add_mutually_exclusive_group(required=True)
+    user_arg.add_argument('--user-id', type=int, action='append')
+    user_arg.add_argument('--username', action='append')
+    user_arg.add_argument('--all', action='store_true', help='every user with apex games')
+    parser.add_argument('--workers', type=int, default=4, help='users to backfill concurrently')
+    parser.add_argument('--check', action='store_true', help='compare the summaries with all games summarised at once')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if not summary_store.enabled:
+        print('APEX_STATS_SUMMARY_BUCKET is not set - nothing to do')
+        sys.exit(1)
+
+    if args.user_id:
+        users = [User.user_id_index.get(user_id) for user_id in args.user_id]
+    elif args.username:
+        users = [User.username_index.get(username) for username in args.username]
+    else:
+        users = User.scan(User.apex_games > 0)
+
+    failed = 0
+    differences = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [(user, executor.submit(backfill, user, args.check)) for user in users]
+        for user, future in futures:
+            try:
+                differences += future.result()
+            except:
+                logger.exception(f'Failed to backfill apex stats for {user.username} ({user.user_id})')
+                failed += 1
+
+    print(f'Backfilled {len(futures) - failed} users, {failed} failed')
+    for difference in differences:
+        print(f'FAIL: {difference}')
+    if failed or differences:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Compare computing the apex stats and placement histogram with GameColumns against the previous STAT_FUNCTIONS, which
+each filtered and walked the full list of games (plus another walk for the histogram).
+
+Games are generated with a mix of seasons, ranked/unranked, missing placements and missing squad kills, and the results
+are checked before timing. "GameColumns" includes building the columns from the games; "GameColumns (built)" and the
+filtered timings are the reductions alone, as when the columns are reused.
+
+"summaries (app)" is what the stats page does: summarising every season and ranked/unranked group of the games with
+summarise_groups (as summarise_games does), and computing the stats of their total - compare it with
+STAT_FUNCTIONS (previous), which is what the page did for all games. "summaries (filter per group)" builds the columns
+of all of the games and filters them for each group instead.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_apex_stats
+    python -m overtrack_web.scripts.benchmark_apex_stats --games 10000 --seasons 16 --repeat 20
+"""
+import argparse
+import base64
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+# importing the view requires the app's config, which the benchmark doesn't use
+os.environ.setdefault('HMAC_KEY', base64.b64encode(os.urandom(32)).decode())
+
+from overtrack_web.views.apex.stats import GameColumns, SeasonSummary, UserSummaries, clip, scoring, summarise_groups
+
+
+def generate_games(n: int, seasons: int, seed: int = 0) -> List[SimpleNamespace]:
+    rng = random.Random(seed)
+    games = []
+    for _ in range(n):
+        games.append(SimpleNamespace(
+            season=rng.randint(1, seasons),
+            rank=rng.choice([None, 'bronze', 'silver', 'gold']),
+            placed=rng.choice([0] * 3 + list(range(1, 25))),
+            kills=rng.randint(0, 12),
+            squad_kills=rng.choice([None, 0] + list(range(1, 25))),
+            duration=rng.uniform(60, 1500),
+        ))
+    return games
+
+
+def previous_stats(games: List[SimpleNamespace]) -> Tuple[List[int], List[Tuple[str, float, float]]]:
+    # the list based STAT_FUNCTIONS and histogram from before GameColumns
+    def mean(seq):
+        return sum(seq) / len(seq)
+
+    def placement_score(games):
+        placed = [clip(g.placed, 1, 20) for g in games]
+        scores = [scoring[p - 1] for p in placed]
+        return round(mean(scores)), 1.
+
+    def kills_10min(games):
+        valid_games = [g for g in games if g.placed]
+        kills = [g.kills for g in valid_games]
+        durations = [g.duration for g in valid_games]
+        return round(float(sum(kills) / (sum(durations) / (10 * 60))), 2), len(valid_games) / len(games)
+
+    def squad_kills_contribution(games):
+        valid_games = [g for g in games if g.squad_kills is not None]
+        contribution_share = [(g.kills / (g.squad_kills / 3)) for g in valid_games if g.squad_kills]
+        if len(contribution_share):
+            return round(float(mean(contribution_share)), 2), len(contribution_share) / len(games)
+        else:
+            return 0., 0.
+
+    def average_kills(games):
+        valid_games = [g for g in games if g.placed]
+        kills = [g.kills for g in valid_games]
+        if len(kills):
+            return round(float(mean(kills)), 2), len(kills) / len(games)
+        else:
+            return 0., 0.
+
+    hist = [0 for _ in range(20)]
+    for g in games:
+        if 1 <= g.placed <= 20:
+            hist[g.placed - 1] += 1
+    return hist, [
+        ('Placement Score', *placement_score(games)),
+        ('Kills / 10min', *kills_10min(games)),
+        ('Squad Kill Contribution', *squad_kills_contribution(games)),
+        ('Average Kills', *average_kills(games)),
+    ]
+
+
+def column_stats(columns: GameColumns, season: int = None, ranked: bool = None) -> Tuple[List[int], List[Tuple[str, float, float]]]:
+    summary = columns.summarise(season, ranked)
+    return summary.placements, summary.stats()
+
+
+def app_stats(games: List[SimpleNamespace]) -> Tuple[List[int], List[Tuple[str, float, float]]]:
+    summary = UserSummaries(until=0, built=0, seasons=summarise_groups(games)).total()
+    return summary.placements, summary.stats()
+
+
+def filter_summaries(games: List[SimpleNamespace]) -> Dict[str, SeasonSummary]:
+    # building the columns of all of the games, and filtering them for each group
+    columns = GameColumns.from_games(games)
+    return {
+        UserSummaries.key(season, bool(ranked)): columns.summarise(season, ranked)
+        for season, ranked in sorted(set(zip(columns.season, columns.ranked)))
+    }
+
+
+def same(a: Tuple[List[int], List[Tuple[str, float, float]]], b: Tuple[List[int], List[Tuple[str, float, float]]]) -> bool:
+    # stats are rounded to 2dp, so summing in a different order can only move them by one in the last place
+    return a[0] == b[0] and all(
+        na == nb and abs(va - vb) <= 0.01 + 1e-9 and abs(sa - sb) <= 1e-9 for (na, va, sa), (nb, vb, sb) in zip(a[1], b[1])
+    )
+
+
+def time_stats(f: Callable[[], object], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=10000, help='number of games to compute the stats over')
+    parser.add_argument('--seasons', type=int, default=16, help='number of seasons the games are spread over')
+    parser.add_argument('--repeat', type=int, default=10, help='number of times to time each implementation')
+    args = parser.parse_args()
+
+    games = generate_games(args.games, args.seasons)
+    columns = GameColumns.from_games(games)
+    summaries = summarise_groups(games)
+    print(f'{args.games} games in {len(summaries)} season and ranked/unranked groups')
+
+    season_games = [g for g in games if g.season == 3 and g.rank is not None]
+    for name, expected, actual in [
+        ('all games', previous_stats(games), column_stats(columns)),
+        ('season 3 ranked', previous_stats(season_games), column_stats(columns, season=3, ranked=True)),
+    ]:
+        if not same(expected, actual):
+            print(f'FAIL: stats for {name} differ\n  previous:    {expected}\n  GameColumns: {actual}')
+            sys.exit(1)
+    if not same(previous_stats(games), app_stats(games)):
+        print('FAIL: stats of the total of the summaries differ from the stats of all games')
+        sys.exit(1)
+    if summaries != filter_summaries(games):
+        print('FAIL: summaries differ from filtering the games for each group')
+        sys.exit(1)
+
+    for name, f in [
+        ('STAT_FUNCTIONS (previous)', lambda: previous_stats(games)),
+        ('GameColumns', lambda: column_stats(GameColumns.from_games(games))),
+        ('GameColumns (built)', lambda: column_stats(columns)),
+        ('  season 3 ranked', lambda: column_stats(columns, season=3, ranked=True)),
+        ('summaries (app)', lambda: app_stats(games)),
+        ('summaries (filter per group)', lambda: filter_summaries(games)),
+    ]:
+        times = time_stats(f, args.repeat)
+        print(
+            f'{name:28s} median={statistics.median(times) * 1000:8.2f}ms min={min(times) * 1000:8.2f}ms '
+            f'({args.games / statistics.median(times):,.0f} games/s)'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Measure the overhead check_authentication adds to each request, with and without the verified token cache.
+
+Each simulated request pushes a new request context with a valid session cookie (so nothing is carried over in `g`) and
+calls check_authentication --calls times, like a page does from its view, the context processor, check_superuser etc.
+"uncached" verifies the token every request, as before the cache; "cached" verifies it once per process.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_authentication
+    python -m overtrack_web.scripts.benchmark_authentication --requests 10000 --calls 4
+"""
+import argparse
+import base64
+import os
+import statistics
+import time
+from types import SimpleNamespace
+from typing import List
+
+# the benchmark doesn't need the real key - only one that tokens are signed and verified with
+os.environ.setdefault('HMAC_KEY', base64.b64encode(os.urandom(32)).decode())
+
+from flask import Flask
+
+from overtrack_web.lib import authentication
+
+
+def run(app: Flask, cookie: str, requests: int, calls: int) -> List[float]:
+    times = []
+    for _ in range(requests):
+        with app.test_request_context('/', headers={'Cookie': f'session={cookie}'}):
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                if authentication.check_authentication() is not None:
+                    raise RuntimeError('check_authentication rejected a valid session')
+            times.append(time.perf_counter() - t0)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000, help='number of requests to simulate')
+    parser.add_argument('--calls', type=int, default=4, help='check_authentication calls per request')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    user = SimpleNamespace(key='benchmark-key', user_id=1, superuser=False)
+    cookie = authentication.make_cookie(user)
+    if isinstance(cookie, bytes):
+        cookie = cookie.decode()
+
+    cache = authentication._verified_tokens
+    for name, tokens in [
+        ('uncached', authentication.VerifiedTokenCache(ttl=0)),
+        ('cached', authentication.VerifiedTokenCache()),
+    ]:
+        authentication._verified_tokens = tokens
+        run(app, cookie, min(100, args.requests), args.calls)
+        times = run(app, cookie, args.requests, args.calls)
+        print(
+            f'{name:9s} median={statistics.median(times) * 1e6:8.1f}us '
+            f'mean={statistics.mean(times) * 1e6:8.1f}us '
+            f'p99={sorted(times)[int(len(times) * 0.99)] * 1e6:8.1f}us per request'
+        )
+    authentication._verified_tokens = cache
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Measure the cold start of flask_app - importing the app and serving its first request in a fresh process - and fail if it
+is over budget, so that regressions can be caught in CI.
+
+Each run starts a new python process with COLD_START_PROFILE=1 and reads back the cold start report it writes (see
+overtrack_web.cold_start). Exits with status 1 if the median startup time is over --budget, or if more than
+--max-external-calls external calls were made while importing the app.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_cold_start --runs 5 --budget 3
+    python -m overtrack_web.scripts.benchmark_cold_start --runs 5 --budget 3 --max-external-calls 0 --report cold_start.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def run_child(path: str) -> None:
+    from overtrack_web.cold_start import profiler
+    from overtrack_web.flask_app import app
+    if not profiler.active:
+        raise RuntimeError('Cold start profiler did not start - is COLD_START_PROFILE set?')
+    app.test_client().get(path)
+
+
+def measure(path: str) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = os.path.join(tmp, 'cold_start.json')
+        env = dict(os.environ, COLD_START_PROFILE='1', COLD_START_REPORT=report_path)
+        subprocess.run(
+            [sys.executable, '-m', 'overtrack_web.scripts.benchmark_cold_start', '--child', '--path', path],
+            env=env,
+            check=True,
+        )
+        with open(report_path) as f:
+            return json.load(f)
+
+
+def import_calls(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [c for c in report['external_calls'] if c['during'].startswith('import ')]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='number of cold starts to measure')
+    parser.add_argument('--path', default='/favicon.png', help='path of the first request')
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=float(os.environ.get('COLD_START_BUDGET', 0)) or None,
+        help='maximum median startup time, in seconds (default $COLD_START_BUDGET)'
+    )
+    parser.add_argument('--max-external-calls', type=int, help='maximum number of external calls made during imports')
+    parser.add_argument('--report', help='write the report of the median run to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.path)
+        return
+
+    logging.basicConfig(level=logging.INFO)
+
+    reports = []
+    for i in range(args.runs):
+        reports.append(measure(args.path))
+        logger.info(f'Run {i + 1}/{args.runs}: startup {reports[-1]["startup_seconds"]:.3f}s')
+    reports.sort(key=lambda r: r['startup_seconds'])
+    median = reports[len(reports) // 2]
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(median, f, indent=2)
+
+    startup = [r['startup_seconds'] for r in reports]
+    first_request = [r['first_request_seconds'] for r in reports if r['first_request_seconds'] is not None]
+    print(f'startup:       median={statistics.median(startup):.3f}s min={min(startup):.3f}s max={max(startup):.3f}s')
+    if first_request:
+        print(f'first request: median={statistics.median(first_request):.3f}s')
+
+    print('\nslowest imports (median run):')
+    for t in sorted(median['imports'], key=lambda t: t['self_seconds'], reverse=True)[:15]:
+        print(f'  {t["self_seconds"]:7.3f}s self {t["seconds"]:7.3f}s total  {t["module"]}')
+    print('\nblueprints (median run):')
+    for b in median['blueprints']:
+        print(f'  {b["import_seconds"] or 0:7.3f}s import {b["register_seconds"]:7.3f}s register  {b["name"]}')
+    print('\nexternal calls (median run):')
+    for c in median['external_calls']:
+        print(f'  {c["seconds"]:7.3f}s {c["kind"]:8s} {c["target"]}  ({c["during"]}){" - " + c["error"] if c["error"] else ""}')
+
+    failures = []
+    if args.budget and statistics.median(startup) > args.budget:
+        failures.append(f'median startup {statistics.median(startup):.3f}s is over the budget of {args.budget:.3f}s')
+    if args.max_external_calls is not None and len(import_calls(median)) > args.max_external_calls:
+        failures.append(
+            f'{len(import_calls(median))} external calls made during imports, more than {args.max_external_calls}'
+        )
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
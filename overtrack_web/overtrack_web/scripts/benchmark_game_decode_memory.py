@@ -0,0 +1,110 @@
+"""
+Compare peak memory and time of decoding the largest Overwatch games in full (read body -> json.loads -> typedload) against
+the streaming decodes: loading each section as it is parsed, and the lazy load used by load_game (each section kept as
+JSON text until it is used). "lazy" is measured both as loaded, and with every section then loaded (as the game page
+does).
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_game_decode_memory --largest 10
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+import boto3
+from dataclasses import fields
+
+from overtrack_models.dataclasses.overwatch.overwatch_game import OverwatchGame
+from overtrack_models.dataclasses.typedload import referenced_typedload
+from overtrack_web.lib.game_storage import decode_stream
+from overtrack_web.lib.json_stream import load_dataclass_streaming
+from overtrack_web.lib.lazy_dataclass import load_lazy_streaming, materialise
+
+logger = logging.getLogger(__name__)
+
+
+def decode_full(blob: bytes, encoding: str) -> OverwatchGame:
+    game_data = json.loads(decode_stream(io.BytesIO(blob), encoding).read())
+    return referenced_typedload.load(game_data, OverwatchGame)
+
+
+def decode_streaming(blob: bytes, encoding: str) -> OverwatchGame:
+    return load_dataclass_streaming(decode_stream(io.BytesIO(blob), encoding), OverwatchGame, referenced_typedload.load)
+
+
+def decode_lazy(blob: bytes, encoding: str) -> OverwatchGame:
+    return load_lazy_streaming(decode_stream(io.BytesIO(blob), encoding), OverwatchGame, referenced_typedload.load)
+
+
+def decode_lazy_all(blob: bytes, encoding: str) -> OverwatchGame:
+    game = decode_lazy(blob, encoding)
+    # load the sections one at a time, as using them does
+    for f in fields(OverwatchGame):
+        getattr(game, f.name)
+    return materialise(game)
+
+
+def measure(f: Callable[[bytes, str], Any], blob: bytes, encoding: str) -> Tuple[Any, int, float]:
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = f(blob, encoding)
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, t1 - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bucket', default='overtrack-overwatch-games')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--largest', type=int, default=10, help='number of the largest games to benchmark')
+    parser.add_argument('--scan', type=int, default=20000, help='number of keys to list when looking for the largest games')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    s3 = boto3.client('s3')
+
+    objects = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=args.bucket, Prefix=args.prefix):
+        objects += [o for o in page.get('Contents', []) if o['Key'].endswith('.json')]
+        if len(objects) >= args.scan:
+            break
+    objects.sort(key=lambda o: o['Size'], reverse=True)
+    logger.info(f'Scanned {len(objects)} games from s3://{args.bucket}/{args.prefix}')
+
+    print(
+        f'{"size":>9} | {"full peak":>10} | {"stream peak":>11} | {"lazy peak":>10} | {"lazy+all peak":>13} | '
+        f'{"full":>9} | {"stream":>9} | {"lazy":>9} | {"lazy+all":>9} | equal'
+    )
+    for o in objects[:args.largest]:
+        game_object = s3.get_object(Bucket=args.bucket, Key=o['Key'])
+        encoding = game_object.get('ContentEncoding') or game_object['Metadata'].get('encoding')
+        blob = game_object['Body'].read()
+
+        full_game, full_peak, full_time = measure(decode_full, blob, encoding)
+        stream_game, stream_peak, stream_time = measure(decode_streaming, blob, encoding)
+        _, lazy_peak, lazy_time = measure(decode_lazy, blob, encoding)
+        lazy_game, lazy_all_peak, lazy_all_time = measure(decode_lazy_all, blob, encoding)
+
+        print(
+            f'{o["Size"] / 1024:>6.0f} KB | '
+            f'{full_peak / 1024 / 1024:>7.1f} MB | '
+            f'{stream_peak / 1024 / 1024:>8.1f} MB | '
+            f'{lazy_peak / 1024 / 1024:>7.1f} MB | '
+            f'{lazy_all_peak / 1024 / 1024:>10.1f} MB | '
+            f'{full_time * 1000:>6.0f} ms | '
+            f'{stream_time * 1000:>6.0f} ms | '
+            f'{lazy_time * 1000:>6.0f} ms | '
+            f'{lazy_all_time * 1000:>6.0f} ms | '
+            f'{full_game == stream_game == lazy_game}'
+        )
+
+if __name__ == '__main__':
+    main()
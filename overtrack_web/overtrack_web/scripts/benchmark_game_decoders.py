@@ -0,0 +1,96 @@
+"""
+Microbenchmark of the compiled game decoders against referenced_typedload, for whole games and for each top level
+section of a game.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_game_decoders --game overwatch --sample 10
+"""
+import argparse
+import copy
+import json
+import logging
+import statistics
+import time
+import typing
+from typing import Any, Callable, Dict, List
+
+import boto3
+from dataclasses import fields
+
+from overtrack_models.dataclasses.typedload import referenced_typedload
+from overtrack_web.lib import decoders
+from overtrack_web.lib.game_storage import decode_stream
+from overtrack_web.scripts.check_game_decoders import GAMES
+from overtrack_web.scripts.compress_game_blobs import sample_keys
+
+logger = logging.getLogger(__name__)
+
+
+def best_time(f: Callable[[], Any], repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--game', choices=list(GAMES), default='overwatch')
+    parser.add_argument('--bucket', help='bucket to sample games from (defaults to the game\'s bucket)')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--sample', type=int, default=10, help='number of games to sample')
+    parser.add_argument('--scan', type=int, default=5000, help='number of keys to list when choosing the sample')
+    parser.add_argument('--repeats', type=int, default=5, help='number of times to time each decode (best is reported)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    s3 = boto3.client('s3')
+    bucket, game_type, compat = GAMES[args.game]
+    bucket = args.bucket or bucket
+
+    t0 = time.perf_counter()
+    decoders.precompile(game_type)
+    print(f'Compiled decoders in {(time.perf_counter() - t0) * 1000:.1f} ms')
+
+    hints = typing.get_type_hints(game_type)
+    sections = {f.metadata.get('name', f.name): hints[f.name] for f in fields(game_type) if f.init}
+    typedload_times: Dict[str, List[float]] = {'(game)': []}
+    compiled_times: Dict[str, List[float]] = {'(game)': []}
+
+    for key in sample_keys(s3, bucket, args.prefix, args.sample, args.scan):
+        game_object = s3.get_object(Bucket=bucket, Key=key)
+        encoding = game_object.get('ContentEncoding') or game_object['Metadata'].get('encoding')
+        game_data = compat(json.load(decode_stream(game_object['Body'], encoding)))
+
+        items = [('(game)', game_data, game_type)] + [
+            (name, game_data[name], t)
+            for name, t in sections.items()
+            if name in game_data
+        ]
+        for name, data, t in items:
+            copy_time = best_time(lambda: copy.deepcopy(data), args.repeats)
+            typedload_times.setdefault(name, []).append(
+                best_time(lambda: referenced_typedload.load(copy.deepcopy(data), t), args.repeats) - copy_time
+            )
+            compiled_times.setdefault(name, []).append(
+                best_time(lambda: decoders.load(copy.deepcopy(data), t, referenced_typedload.load), args.repeats) - copy_time
+            )
+
+    print(f'{"section":>20} | {"typedload":>12} | {"compiled":>12} | {"speedup":>7}')
+    for name in typedload_times:
+        if not typedload_times[name]:
+            continue
+        typedload_time = statistics.mean(typedload_times[name])
+        compiled_time = statistics.mean(compiled_times[name])
+        print(
+            f'{name:>20} | '
+            f'{typedload_time * 1000:>9.3f} ms | '
+            f'{compiled_time * 1000:>9.3f} ms | '
+            f'{typedload_time / compiled_time if compiled_time > 0 else 0:>6.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
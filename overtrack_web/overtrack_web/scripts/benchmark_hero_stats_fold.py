@@ -0,0 +1,121 @@
+"""
+Compare folding hero stats rows with HeroStatsAccumulator against the previous fold into a defaultdict of
+OverwatchCollectedHeroStats (one new dataclass and hero specific stats dict per row).
+
+Rows are generated with the same hero specific stats for every row of a hero, so that both folds should agree - the
+results are checked before timing.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_hero_stats_fold
+    python -m overtrack_web.scripts.benchmark_hero_stats_fold --rows 10000 --repeat 20
+"""
+import argparse
+import base64
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from dataclasses import asdict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+# importing the view requires the app's config, which the benchmark doesn't use
+os.environ.setdefault('HMAC_KEY', base64.b64encode(os.urandom(32)).decode())
+
+from overtrack_web.views.overwatch.hero_stats import HeroStatsAccumulator, OverwatchCollectedHeroStats
+
+HEROES = {
+    'ana': ['scoped_accuracy', 'sleep_dart_hits', 'nano_boosts_applied', 'enemies_slept'],
+    'genji': ['dragonblade_kills', 'damage_reflected', 'best_kill_streak'],
+    'reinhardt': ['damage_blocked', 'charge_kills', 'fire_strike_kills', 'earthshatter_stuns'],
+    'mercy': ['players_resurrected', 'damage_amplified', 'blaster_kills'],
+    'widowmaker': ['scoped_accuracy', 'scoped_critical_hits', 'venom_mine_kills'],
+    'lucio': ['sound_barriers_provided', 'average_energy'],
+    'soldier': ['helix_rocket_kills', 'tactical_visor_kills', 'weapon_accuracy'],
+    'dva': ['self_destruct_kills', 'mechs_called', 'damage_blocked'],
+}
+
+
+def generate_rows(n: int, seed: int = 0) -> List[SimpleNamespace]:
+    rng = random.Random(seed)
+    heroes = list(HEROES)
+    rows = []
+    for _ in range(n):
+        hero = rng.choice(heroes)
+        rows.append(SimpleNamespace(
+            hero=hero,
+            from_endgame=True,
+            time_played=rng.uniform(60, 1200),
+            game_result=rng.choice(['WIN', 'LOSS', 'DRAW']),
+            eliminations=rng.randint(0, 40),
+            objective_kills=rng.randint(0, 20),
+            objective_time=rng.randint(0, 200),
+            hero_damage_done=rng.randint(0, 20000),
+            healing_done=rng.randint(0, 15000),
+            deaths=rng.randint(0, 15),
+            final_blows=rng.randint(0, 20),
+            hero_specific_stats={k: rng.randint(0, 100) for k in HEROES[hero]},
+        ))
+    return rows
+
+
+def previous_fold(rows: List[SimpleNamespace]) -> Dict[str, OverwatchCollectedHeroStats]:
+    hero_stats = defaultdict(lambda: OverwatchCollectedHeroStats(include_hero_stats=True, endgame_only=True))
+    for row in rows:
+        # what `hero_stats[stat.hero] += stat` does for an OverwatchHeroStats
+        hero_stats[row.hero] += OverwatchCollectedHeroStats.from_db_stat(row, True, True)
+    for name, stat in hero_stats.items():
+        stat.name = name
+    return dict(hero_stats)
+
+
+def accumulator_fold(rows: List[SimpleNamespace]) -> Dict[str, OverwatchCollectedHeroStats]:
+    hero_stats = HeroStatsAccumulator(include_hero_stats=True, endgame_only=True)
+    for row in rows:
+        hero_stats.add_stat(row)
+    return hero_stats.results()
+
+
+def same(a: Any, b: Any) -> bool:
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) <= 1e-6 * max(1, abs(a), abs(b))
+    return a == b
+
+
+def time_fold(fold: Callable[[List[SimpleNamespace]], Dict], rows: List[SimpleNamespace], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fold(rows)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='number of hero stats rows to fold')
+    parser.add_argument('--repeat', type=int, default=10, help='number of times to time each fold')
+    args = parser.parse_args()
+
+    rows = generate_rows(args.rows)
+
+    expected = {name: asdict(stat) for name, stat in previous_fold(rows).items()}
+    actual = {name: asdict(stat) for name, stat in accumulator_fold(rows).items()}
+    if not same(expected, actual):
+        print(f'FAIL: folds differ\n  previous:    {expected}\n  accumulator: {actual}')
+        sys.exit(1)
+
+    for name, fold in [('defaultdict of dataclasses', previous_fold), ('HeroStatsAccumulator', accumulator_fold)]:
+        times = time_fold(fold, rows, args.repeat)
+        print(
+            f'{name:28s} median={statistics.median(times) * 1000:8.2f}ms min={min(times) * 1000:8.2f}ms '
+            f'({args.rows / statistics.median(times):,.0f} rows/s)'
+        )
+
+
+if __name__ == '__main__':
+    main()
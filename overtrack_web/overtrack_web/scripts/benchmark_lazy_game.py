@@ -0,0 +1,117 @@
+"""
+Compare the CPU time spent loading Overwatch games in full against loading them as a LazyDataclass, for the parts of the
+game each route actually uses.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_lazy_game --sample 20
+"""
+import argparse
+import copy
+import json
+import logging
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+import boto3
+from dataclasses import fields
+
+from overtrack_models.dataclasses.overwatch.basic_types import Mode
+from overtrack_models.dataclasses.overwatch.overwatch_game import OverwatchGame
+from overtrack_models.dataclasses.typedload import referenced_typedload
+from overtrack_web.lib.game_storage import decode_stream
+from overtrack_web.lib.lazy_dataclass import LazyDataclass, dump_dataclass
+from overtrack_web.scripts.compress_game_blobs import sample_keys
+
+logger = logging.getLogger(__name__)
+
+
+def opengraph(game: OverwatchGame) -> Any:
+    return game.teams.owner, game.result, game.map.name, game.start_sr, game.end_sr
+
+
+def edit(game: OverwatchGame) -> Any:
+    game.start_sr = game.end_sr = None
+    game.result = 'UNKNOWN'
+    game.placement = False
+    game.mode = Mode('Quick Play')
+    game.competitive = False
+    return dump_dataclass(game, referenced_typedload.dump)
+
+
+def game_page(game: OverwatchGame) -> Any:
+    # the sections used by overwatch/game/game.html
+    return [
+        getattr(game, name)
+        for name in ['competitive', 'end_sr', 'key', 'map', 'mode', 'placement', 'result', 'stages', 'start_sr',
+                     'stats', 'teamfights', 'teams']
+        if any(f.name == name for f in fields(OverwatchGame))
+    ]
+
+
+def dev_info(game: OverwatchGame) -> Any:
+    return [getattr(game, f.name) for f in fields(OverwatchGame)]
+
+
+ROUTES: Dict[str, Callable[[OverwatchGame], Any]] = {
+    'opengraph': opengraph,
+    'edit_game': edit,
+    'game': game_page,
+    'dev_info': dev_info,
+}
+
+
+def cpu_time(f: Callable[[], Any], repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        t0 = time.process_time()
+        f()
+        times.append(time.process_time() - t0)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bucket', default='overtrack-overwatch-games')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--sample', type=int, default=20, help='number of games to sample')
+    parser.add_argument('--scan', type=int, default=5000, help='number of keys to list when choosing the sample')
+    parser.add_argument('--repeats', type=int, default=3, help='number of times to time each route (best is reported)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    s3 = boto3.client('s3')
+
+    full_times: Dict[str, List[float]] = {r: [] for r in ROUTES}
+    lazy_times: Dict[str, List[float]] = {r: [] for r in ROUTES}
+    for key in sample_keys(s3, args.bucket, args.prefix, args.sample, args.scan):
+        game_object = s3.get_object(Bucket=args.bucket, Key=key)
+        encoding = game_object.get('ContentEncoding') or game_object['Metadata'].get('encoding')
+        game_data = json.load(decode_stream(game_object['Body'], encoding))
+
+        for route, use in ROUTES.items():
+            full_times[route].append(cpu_time(
+                lambda: use(referenced_typedload.load(copy.deepcopy(game_data), OverwatchGame)),
+                args.repeats
+            ) - cpu_time(lambda: copy.deepcopy(game_data), args.repeats))
+            lazy_times[route].append(cpu_time(
+                lambda: use(LazyDataclass(OverwatchGame, copy.deepcopy(game_data), referenced_typedload.load)),
+                args.repeats
+            ) - cpu_time(lambda: copy.deepcopy(game_data), args.repeats))
+
+    print(f'{"route":>10} | {"full":>9} | {"lazy":>9} | {"saving":>7}')
+    for route in ROUTES:
+        if not full_times[route]:
+            continue
+        full = statistics.mean(full_times[route])
+        lazy = statistics.mean(lazy_times[route])
+        print(
+            f'{route:>10} | '
+            f'{full * 1000:>6.1f} ms | '
+            f'{lazy * 1000:>6.1f} ms | '
+            f'{1 - lazy / full if full else 0:>7.1%}'
+        )
+
+
+if __name__ == '__main__':
+    main()
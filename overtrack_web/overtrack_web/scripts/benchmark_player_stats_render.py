@@ -0,0 +1,97 @@
+"""
+Benchmark rendering the Overwatch player stats table with the per-game StatRanges table against recomputing each stat's
+range for every process_stat call (the previous behaviour).
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.benchmark_player_stats_render --sample 10
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+from typing import Any, Callable, List, Optional
+
+import boto3
+from flask import render_template
+
+from overtrack_models.dataclasses.overwatch.overwatch_game import OverwatchGame
+from overtrack_web.flask_app import app
+from overtrack_web.lib.game_storage import decode_stream
+from overtrack_web.lib.lazy_dataclass import materialise
+from overtrack_web.scripts.compress_game_blobs import sample_keys
+from overtrack_web.views.overwatch import game as game_view
+
+logger = logging.getLogger(__name__)
+
+
+class UncachedStatRanges(game_view.StatRanges):
+    def get(self, field: str, category: str) -> Optional[game_view.StatRange]:
+        self._ranges.clear()
+        return super().get(field, category)
+
+
+def best_time(f: Callable[[], Any], repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def render_player_stats(game: OverwatchGame, stat_ranges: game_view.StatRanges) -> str:
+    return render_template(
+        'overwatch/game/player_stats/player_stats.html',
+        game=game,
+        stat_totals={},
+        stat_ranges=stat_ranges,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bucket', default='overtrack-overwatch-games')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--sample', type=int, default=10, help='number of games to sample')
+    parser.add_argument('--scan', type=int, default=5000, help='number of keys to list when choosing the sample')
+    parser.add_argument('--repeats', type=int, default=5, help='number of times to time each render (best is reported)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    s3 = boto3.client('s3')
+
+    uncached_times: List[float] = []
+    cached_times: List[float] = []
+    for key in sample_keys(s3, args.bucket, args.prefix, args.sample, args.scan):
+        game_object = s3.get_object(Bucket=args.bucket, Key=key)
+        encoding = game_object.get('ContentEncoding') or game_object['Metadata'].get('encoding')
+        game_data = json.load(decode_stream(game_object['Body'], encoding))
+        game = materialise(game_view.load_section(game_data, OverwatchGame))
+
+        # render inside the game blueprint so its context processor (process_stat etc.) is used
+        with app.test_request_context(f'/overwatch/games/{key[:-len(".json")]}'):
+            uncached_html = render_player_stats(game, UncachedStatRanges(game))
+            cached_html = render_player_stats(game, game_view.StatRanges(game, game_view.PLAYER_STAT_FIELDS))
+            if uncached_html != cached_html:
+                logger.error(f'{key}: player stats render differently with StatRanges')
+
+            uncached_times.append(best_time(
+                lambda: render_player_stats(game, UncachedStatRanges(game)),
+                args.repeats
+            ))
+            cached_times.append(best_time(
+                lambda: render_player_stats(game, game_view.StatRanges(game, game_view.PLAYER_STAT_FIELDS)),
+                args.repeats
+            ))
+
+    if not cached_times:
+        return
+    uncached = statistics.mean(uncached_times)
+    cached = statistics.mean(cached_times)
+    print(f'{"per-call ranges":>16} | {"StatRanges":>10} | {"saving":>7}')
+    print(f'{uncached * 1000:>13.1f} ms | {cached * 1000:>7.1f} ms | {1 - cached / uncached:>7.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Check the discord client (overtrack_web.lib.discord_client) against a local fake discord server.
+
+The fake server serves channels, guilds and guild members, sends X-RateLimit headers with a small per-channel limit for
+messages, and rate limits (429 with retry_after) the first request to each channel's permissions. This checks that the
+client waits for rate limit buckets instead of being rejected, retries after being rate limited, caches GETs and drops
+them when the channel is modified. Exits non-zero if any check fails.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.check_discord_client
+    python -m overtrack_web.scripts.check_discord_client --limit 2 --reset-after 0.5
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List, Tuple
+
+from overtrack_web.lib.discord_client import DiscordClient
+
+logger = logging.getLogger(__name__)
+
+
+class FakeDiscord(HTTPServer):
+
+    def __init__(self, limit: int, reset_after: float):
+        super().__init__(('127.0.0.1', 0), FakeDiscordHandler)
+        self.limit = limit
+        self.reset_after = reset_after
+
+        self.lock = threading.Lock()
+        # (method, path, time) of every request received
+        self.received: List[Tuple[str, str, float]] = []
+        # channel_id -> (remaining, reset at)
+        self.message_buckets: Dict[str, Tuple[int, float]] = {}
+        self.permissions_rate_limited: Dict[str, bool] = defaultdict(bool)
+        self.rejected = 0
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, method: str, path: str) -> int:
+        with self.lock:
+            return len([r for r in self.received if r[0] == method and r[1] == path])
+
+
+class FakeDiscordHandler(BaseHTTPRequestHandler):
+    server: FakeDiscord
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _handle(self, method: str) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        with self.server.lock:
+            self.server.received.append((method, self.path, time.time()))
+
+        m = re.match(r'^/channels/(\d+)/messages$', self.path)
+        if m and method == 'POST':
+            return self._message(m.group(1))
+        m = re.match(r'^/channels/(\d+)/permissions/\d+$', self.path)
+        if m and method == 'PUT':
+            with self.server.lock:
+                rate_limited = not self.server.permissions_rate_limited[m.group(1)]
+                self.server.permissions_rate_limited[m.group(1)] = True
+            if rate_limited:
+                return self._send(429, {'message': 'You are being rate limited.', 'retry_after': 0.2, 'global': False})
+            return self._send(204, None)
+        m = re.match(r'^/channels/(\d+)$', self.path)
+        if m:
+            return self._send(200, {'id': m.group(1), 'name': 'general', 'type': 0})
+        m = re.match(r'^/guilds/(\d+)$', self.path)
+        if m:
+            return self._send(200, {'id': m.group(1), 'name': 'guild'})
+        m = re.match(r'^/guilds/(\d+)/members/(\d+)$', self.path)
+        if m:
+            if m.group(2) == '404':
+                return self._send(404, {'message': 'Unknown Member', 'code': 10007})
+            return self._send(200, {'user': {'id': m.group(2)}, 'roles': []})
+        self._send(404, {'message': '404: Not Found', 'code': 0})
+
+    def _message(self, channel_id: str) -> None:
+        now = time.time()
+        with self.server.lock:
+            remaining, reset_at = self.server.message_buckets.get(channel_id, (self.server.limit, 0.))
+            if reset_at <= now:
+                remaining, reset_at = self.server.limit, now + self.server.reset_after
+            if remaining == 0:
+                self.server.rejected += 1
+                rate_limited = True
+            else:
+                remaining -= 1
+                rate_limited = False
+            self.server.message_buckets[channel_id] = remaining, reset_at
+
+        headers = {
+            'X-RateLimit-Bucket': 'messages',
+            'X-RateLimit-Limit': str(self.server.limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset-After': f'{reset_at - now:.3f}',
+        }
+        if rate_limited:
+            self._send(429, {'message': 'You are being rate limited.', 'retry_after': reset_at - now}, headers)
+        else:
+            self._send(200, {'id': '1', 'channel_id': channel_id}, headers)
+
+    def _send(self, status: int, body, headers: Dict[str, str] = None) -> None:
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=3, help='messages allowed per channel per rate limit window')
+    parser.add_argument('--reset-after', type=float, default=1., help='length of the message rate limit window')
+    parser.add_argument('--messages', type=int, default=8, help='messages to send to each channel')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    server = FakeDiscord(args.limit, args.reset_after)
+    threading.Thread(target=server.serve_forever, name='fake-discord', daemon=True).start()
+    client = DiscordClient('fake-token', base_url=server.url, cache_ttl=60)
+
+    failures = []
+
+    def check(ok: bool, description: str) -> None:
+        print(f'{"ok  " if ok else "FAIL"} {description}')
+        if not ok:
+            failures.append(description)
+
+    # caching
+    for _ in range(3):
+        r = client.get('/channels/100')
+    check(r.ok and r.json()['id'] == '100', 'channel info is returned')
+    check(server.count('GET', '/channels/100') == 1, 'repeated channel GETs are served from the cache')
+    client.get('/guilds/200')
+    client.get('/guilds/200')
+    check(server.count('GET', '/guilds/200') == 1, 'repeated guild GETs are served from the cache')
+    client.get('/guilds/200/members/404')
+    r = client.get('/guilds/200/members/404')
+    check(r.status_code == 404 and server.count('GET', '/guilds/200/members/404') == 1, 'not found members are cached')
+    client.get('/channels/100/messages/1')
+    client.get('/channels/100/messages/1')
+    check(server.count('GET', '/channels/100/messages/1') == 2, 'message GETs are not cached')
+
+    # retry after being rate limited
+    t0 = time.time()
+    r = client.put('/channels/100/permissions/1', json={'allow': 0, 'type': 'member'})
+    check(r.status_code == 204, 'rate limited request is retried')
+    check(time.time() - t0 >= 0.2, 'retry waits for retry_after')
+    client.get('/channels/100')
+    check(server.count('GET', '/channels/100') == 2, 'modifying a channel drops it from the cache')
+    client.get('/guilds/200')
+    check(server.count('GET', '/guilds/200') == 1, 'modifying a channel keeps other guilds cached')
+
+    # waiting for buckets, with concurrent requests on two channels
+    results: List[int] = []
+
+    def send(channel_id: str) -> None:
+        for i in range(args.messages):
+            results.append(client.post(f'/channels/{channel_id}/messages', json={'content': str(i)}).status_code)
+
+    threads = [threading.Thread(target=send, args=(channel_id,)) for channel_id in ['100', '101']]
+    t0 = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - t0
+    windows = (args.messages - 1) // args.limit
+    check(all(s == 200 for s in results), f'all {len(results)} messages are sent')
+    check(server.rejected <= 2, f'messages wait for their bucket ({server.rejected} rejected by the server)')
+    check(
+        elapsed >= windows * args.reset_after * 0.9,
+        f'messages are spread over the rate limit windows ({elapsed:.2f}s for {windows} resets)'
+    )
+    check(
+        elapsed < (windows + 1) * args.reset_after + 1,
+        f'channels are rate limited separately ({elapsed:.2f}s)'
+    )
+
+    server.shutdown()
+    if failures:
+        print(f'{len(failures)} checks failed')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Differential check of the compiled game decoders against referenced_typedload over stored games, or over local game
+JSON files (--file) without needing S3.
+
+Each game is loaded with both, and the first difference (if any) is reported - including objects that
+referenced_typedload loads as one shared instance but the compiled decoder does not. Exits non-zero if any game is
+loaded differently, or if the compiled decoder crashed. Games the compiled decoder declines to load (e.g. because they
+hold references) are counted separately, since those are loaded with typedload.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.check_game_decoders --game overwatch --sample 100
+    python -m overtrack_web.scripts.check_game_decoders --game apex --sample 100
+    python -m overtrack_web.scripts.check_game_decoders --game overwatch --file game1.json --file game2.json
+"""
+import argparse
+import copy
+import json
+import logging
+import sys
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+import boto3
+
+from overtrack_models.dataclasses.apex.apex_game import ApexGame
+from overtrack_models.dataclasses.overwatch.overwatch_game import OverwatchGame
+from overtrack_models.dataclasses.typedload import referenced_typedload
+from overtrack_web.lib import decoders
+from overtrack_web.lib.game_storage import decode_stream
+from overtrack_web.scripts.compress_game_blobs import sample_keys
+
+logger = logging.getLogger(__name__)
+
+
+def _apex_compat(game_data: Dict[str, Any]) -> Dict[str, Any]:
+    from overtrack_web.views.apex.game import compat_game_data
+    return compat_game_data(game_data)
+
+
+GAMES: Dict[str, Tuple[str, Any, Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    'overwatch': ('overtrack-overwatch-games', OverwatchGame, lambda game_data: game_data),
+    'apex': ('overtrack-apex-games', ApexGame, _apex_compat),
+}
+
+
+def games(args: argparse.Namespace, bucket: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if args.file:
+        for path in args.file:
+            with open(path, 'rb') as f:
+                yield path, json.load(decode_stream(f, 'gzip' if path.endswith('.gz') else None))
+        return
+
+    s3 = boto3.client('s3')
+    for key in sample_keys(s3, bucket, args.prefix, args.sample, args.scan):
+        game_object = s3.get_object(Bucket=bucket, Key=key)
+        encoding = game_object.get('ContentEncoding') or game_object['Metadata'].get('encoding')
+        yield key, json.load(decode_stream(game_object['Body'], encoding))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--game', choices=list(GAMES), default='overwatch')
+    parser.add_argument('--bucket', help='bucket to sample games from (defaults to the game\'s bucket)')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--sample', type=int, default=100, help='number of games to sample')
+    parser.add_argument('--scan', type=int, default=5000, help='number of keys to list when choosing the sample')
+    parser.add_argument('--file', action='append', help='check local game JSON files (.json or .json.gz) instead of S3')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    bucket, game_type, compat = GAMES[args.game]
+    bucket = args.bucket or bucket
+
+    decoder = decoders.compile_decoder(game_type)
+
+    failures = 0
+    declined = 0
+    checked = 0
+    for key, game_data in games(args, bucket):
+        checked += 1
+        game_data = compat(game_data)
+
+        expected = referenced_typedload.load(copy.deepcopy(game_data), game_type)
+        try:
+            actual = decoder(copy.deepcopy(game_data))
+        except decoders.DecoderError as e:
+            declined += 1
+            print(f'{key}: not loaded by the compiled decoder ({e}) - falls back to typedload')
+            continue
+        except Exception as e:
+            failures += 1
+            print(f'{key}: compiled decoder failed ({e!r}) - would stop using it')
+            continue
+
+        difference = decoders.compare(expected, actual)
+        if difference:
+            failures += 1
+            print(f'{key}: {difference}')
+
+    print(f'{checked - failures - declined}/{checked} games loaded identically, {declined} loaded with typedload')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Report the size and decode time savings of storing games compressed, and optionally migrate games to a compressed encoding.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.compress_game_blobs --bucket overtrack-overwatch-games --sample 50
+    python -m overtrack_web.scripts.compress_game_blobs --bucket overtrack-overwatch-games --sample 50 --migrate gzip
+"""
+import argparse
+import io
+import json
+import logging
+import random
+import statistics
+import time
+from typing import Dict, List
+
+import boto3
+
+from overtrack_web.lib.game_storage import decode_stream, encode_game_data, store_game_data, zstandard
+
+logger = logging.getLogger(__name__)
+
+
+def sample_keys(s3, bucket: str, prefix: str, sample: int, scan: int) -> List[str]:
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys += [o['Key'] for o in page.get('Contents', []) if o['Key'].endswith('.json')]
+        if len(keys) >= scan:
+            break
+    return random.sample(keys, min(sample, len(keys)))
+
+
+def time_decode(blob: bytes, encoding: str, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        json.load(decode_stream(io.BytesIO(blob), encoding))
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bucket', default='overtrack-overwatch-games')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--sample', type=int, default=50, help='number of games to sample')
+    parser.add_argument('--scan', type=int, default=5000, help='number of keys to list when choosing the sample')
+    parser.add_argument('--repeats', type=int, default=3, help='number of times to time each decode (best is reported)')
+    parser.add_argument('--migrate', choices=['gzip', 'zstd'], help='rewrite the sampled games with this encoding')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    s3 = boto3.client('s3')
+
+    encodings = ['', 'gzip'] + (['zstd'] if zstandard else [])
+    sizes: Dict[str, List[int]] = {e: [] for e in encodings}
+    decode_times: Dict[str, List[float]] = {e: [] for e in encodings}
+
+    keys = sample_keys(s3, args.bucket, args.prefix, args.sample, args.scan)
+    logger.info(f'Sampled {len(keys)} games from s3://{args.bucket}/{args.prefix}')
+    for key in keys:
+        game_object = s3.get_object(Bucket=args.bucket, Key=key)
+        encoding = game_object.get('ContentEncoding') or game_object['Metadata'].get('encoding')
+        game_data = json.load(decode_stream(game_object['Body'], encoding))
+
+        for e in encodings:
+            blob = encode_game_data(game_data, e)
+            sizes[e].append(len(blob))
+            decode_times[e].append(time_decode(blob, e, args.repeats))
+
+        if args.migrate and encoding != args.migrate:
+            logger.info(f'Rewriting {key} with encoding={args.migrate}')
+            s3.copy_object(
+                Bucket=args.bucket,
+                Key=key + '.bak',
+                CopySource={'Bucket': args.bucket, 'Key': key},
+            )
+            store_game_data(s3, args.bucket, key, game_data, game_object['Metadata'], encoding=args.migrate)
+
+    if not keys:
+        return
+
+    print(f'{"encoding":>10} | {"mean size":>12} | {"total size":>12} | {"saving":>7} | {"mean decode":>12} | {"p95 decode":>11}')
+    base_total = sum(sizes[''])
+    for e in encodings:
+        total = sum(sizes[e])
+        p95 = sorted(decode_times[e])[int(len(decode_times[e]) * 0.95) - 1] if len(decode_times[e]) > 1 else decode_times[e][0]
+        print(
+            f'{e or "json":>10} | '
+            f'{statistics.mean(sizes[e]) / 1024:>9.1f} KB | '
+            f'{total / 1024 / 1024:>9.2f} MB | '
+            f'{1 - total / base_total:>7.1%} | '
+            f'{statistics.mean(decode_times[e]) * 1000:>9.2f} ms | '
+            f'{p95 * 1000:>8.2f} ms'
+        )
+
+
+if __name__ == '__main__':
+    main()
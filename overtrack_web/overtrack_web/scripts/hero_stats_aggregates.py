@@ -0,0 +1,110 @@
+"""
+Rebuild or check the materialised overwatch hero stats (see HeroStatsAggregates in overtrack_web.views.overwatch.hero_stats).
+
+"rebuild" folds the user's games again and replaces the stored aggregates for every mode, complete_only and account in
+the season(s) - e.g. after games have been deleted or reprocessed.
+"check" brings each stored aggregate up to date (as viewing the page would) and compares it with a full fold of the
+season, reporting any differences. Exits non-zero if any aggregate differs.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.hero_stats_aggregates rebuild --username eeveea-11520 --season 21
+    python -m overtrack_web.scripts.hero_stats_aggregates check --user-id 347
+"""
+import argparse
+import logging
+import sys
+from dataclasses import asdict
+from typing import Any, Iterable, List, Optional, Tuple
+
+from overtrack_models.orm.user import User
+from overtrack_web.views.overwatch.games_list import get_all_account_names
+from overtrack_web.views.overwatch.hero_stats import MODES, CollectedStats, aggregates, collect_stats
+
+logger = logging.getLogger(__name__)
+
+# sums are folded in a different order, so allow for floating point error
+TOLERANCE = 1e-6
+
+
+def differences(a: Any, b: Any, path: str = '') -> List[str]:
+    if isinstance(a, dict) and isinstance(b, dict):
+        diffs = [f'{path}[{k!r}]: missing from {"aggregate" if k in b else "full fold"}' for k in a.keys() ^ b.keys()]
+        for k in a.keys() & b.keys():
+            diffs += differences(a[k], b[k], f'{path}[{k!r}]')
+        return diffs
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        if abs(a - b) > TOLERANCE * max(1, abs(a), abs(b)):
+            return [f'{path}: {a!r} != {b!r}']
+        return []
+    if a != b:
+        return [f'{path}: {a!r} != {b!r}']
+    return []
+
+
+def compare(aggregate: CollectedStats, full: CollectedStats) -> List[str]:
+    def stats(s: CollectedStats):
+        return {
+            'hero_stats': {name: asdict(stat) for name, stat in s.hero_stats.items()},
+            'role_stats': {name: asdict(stat) for name, stat in s.role_stats.items()},
+        }
+    return differences(stats(aggregate), stats(full))
+
+
+def combinations(user: User) -> Iterable[Tuple[str, Optional[str], bool]]:
+    # every account the stats page lists
+    accounts = get_all_account_names(user, minimum_games=1)
+    for mode in MODES:
+        for complete_only in [True, False]:
+            for account in [None, *accounts]:
+                yield mode, account, complete_only
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    user_arg = parser.add_mutually_exclusive_group(required=True)
+    user_arg.add_argument('--user-id', type=int)
+    user_arg.add_argument('--username')
+    parser.add_argument('--season', type=int, action='append', help='season(s) to rebuild/check (default all the user has played)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if not aggregates.enabled:
+        print('HERO_STATS_AGGREGATE_BUCKET is not set - nothing to do')
+        sys.exit(1)
+
+    if args.user_id is not None:
+        user = User.user_id_index.get(args.user_id)
+    else:
+        user = User.username_index.get(args.username)
+    seasons = args.season or sorted(user.overwatch_seasons or [])
+
+    mismatched = 0
+    for season_id in seasons:
+        for mode, account, complete_only in combinations(user):
+            description = f'season={season_id} mode={mode} account={account or "All Accounts"} complete_only={complete_only}'
+            if args.command == 'rebuild':
+                aggregates.rebuild(user.user_id, season_id, mode, account, complete_only)
+                print(f'rebuilt {description}')
+                continue
+
+            if aggregates.load(user.user_id, season_id, mode, account, complete_only) is None:
+                print(f'--   {description}: not materialised')
+                continue
+            diffs = compare(
+                aggregates.get(user.user_id, season_id, mode, account, complete_only),
+                collect_stats(user.user_id, season_id, mode, account, complete_only),
+            )
+            print(f'{"FAIL" if diffs else "ok  "} {description}')
+            for diff in diffs:
+                print(f'       {diff}')
+            mismatched += bool(diffs)
+
+    if mismatched:
+        print(f'{mismatched} aggregates differ from the full fold - fix with "rebuild"')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
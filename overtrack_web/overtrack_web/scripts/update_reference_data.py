@@ -0,0 +1,60 @@
+"""
+Fetch the current reference data (seasons, heroes, legacy script paths) and write it to the snapshot that is bundled with
+the deployment package, so that new processes start with recent data without making any requests.
+
+The snapshot is not checked in - CI runs this before each deploy. Without a snapshot the data is fetched on first use.
+
+Usage (from overtrack_web/):
+    python -m overtrack_web.scripts.update_reference_data
+    python -m overtrack_web.scripts.update_reference_data --strict
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+from dataclasses import asdict
+
+from overtrack_web.lib.reference_data import REFERENCE_DATA_SNAPSHOT, load_snapshot, registry
+
+REFERENCE_DATA_MODULES = [
+    'overtrack_web.data.apex_data',
+    'overtrack_web.data.overwatch_data',
+    'overtrack_web.views.overwatch.game',
+]
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=REFERENCE_DATA_SNAPSHOT, help='snapshot file to update')
+    parser.add_argument(
+        '--strict',
+        action='store_true',
+        help='fail if any source can not be fetched, instead of keeping its data from the existing snapshot'
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    # importing these registers their reference data
+    for module in REFERENCE_DATA_MODULES:
+        importlib.import_module(module)
+
+    previous = load_snapshot(args.path)
+    snapshot = registry.fetch_snapshot(previous, strict=args.strict)
+    if previous.sources == snapshot.sources:
+        logger.info(f'Reference data unchanged since snapshot {previous.version}')
+        return
+
+    tmp_path = args.path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(asdict(snapshot), f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, args.path)
+    logger.info(f'Wrote reference data snapshot {snapshot.version} ({", ".join(snapshot.sources)}) to {args.path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,10 @@
 import datetime
-import json
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 from urllib.parse import urlparse
 
 import boto3
 import dataclasses
-import requests
 import time
 from dataclasses import dataclass
 from flask import Blueprint, Request, render_template, request
@@ -15,21 +13,19 @@ from overtrack_models.dataclasses.typedload import referenced_typedload
 from overtrack_models.dataclasses import typedload
 from overtrack_models.dataclasses.apex.apex_game import ApexGame
 from overtrack_models.orm.apex_game_summary import ApexGameSummary
+from overtrack_web.lib import decoders
 from overtrack_web.lib.authentication import check_authentication
 from overtrack_web.lib.context_processors import image_url
+from overtrack_web.lib.game_cache import game_cache
+from overtrack_web.lib.game_storage import load_game_data, make_s3_client
 from overtrack_web.lib.opengraph import Meta
 from overtrack_web.lib.session import session
 
 
 request: Request = request
 logger = logging.getLogger(__name__)
-try:
-    s3 = boto3.client('s3')
-    """ :type s3: mypy_boto3.s3.Client """
-    s3.list_objects_v2(Bucket='overtrack-apex-games')
-except:
-    logger.exception('Failed to create AWS S3 client - fetching games over HTTP')
-    s3 = None
+s3 = make_s3_client()
+""" :type s3: mypy_boto3.s3.Client """
 try:
     logs = boto3.client('logs')
     """ :type s3: mypy_boto3.logs.Client """
@@ -37,6 +33,9 @@ except:
     logger.exception('Failed to create AWS logs client - running without admin logs')
     logs = None
 
+# compile the game decoder once per process - games the decoder can't load fall back to referenced_typedload
+decoders.precompile(ApexGame)
+
 game_blueprint = Blueprint('apex.game', __name__)
 
 
@@ -62,22 +61,7 @@ def game(key: str):
         return 'Game does not exist', 404
     logger.info(f'Fetching {summary.url}')
 
-    try:
-        url = urlparse(summary.url)
-        game_object = s3.get_object(
-            Bucket=url.netloc.split('.')[0],
-            Key=url.path[1:]
-        )
-        game_data = json.loads(game_object['Body'].read())
-    except:
-        game_object = None
-        logger.exception('Failed to fetch game data from S3 - trying HTTP')
-        r = requests.get(summary.url)
-        r.raise_for_status()
-        game_data = r.json()
-
-    game_data = compat_game_data(game_data)
-    game = referenced_typedload.load(game_data, ApexGame)
+    game, metadata = load_game(summary)
 
     # used for link previews
     og_description = make_game_description(summary, divider='\n')
@@ -120,9 +104,9 @@ def game(key: str):
         )
     logger.info(f'Scrim details: {scrim_details}')
 
-    if logs and check_authentication() is None and session.superuser and game_object:
+    if logs and check_authentication() is None and session.superuser and metadata:
         try:
-            admin_data = get_admin_data(summary, game_object)
+            admin_data = get_admin_data(summary, metadata)
         except:
             logger.exception('Failed to get admin data for game')
             admin_data = None
@@ -154,9 +138,21 @@ def make_game_description(summary: ApexGameSummary, divider: str = '\n', include
     return og_description
 
 
-def get_admin_data(summary: ApexGameSummary, game_object: Dict[str, Any]) -> Dict[str, Any]:
-    if 'log' in game_object['Metadata'] and 'start' in game_object['Metadata']['log']:
-        log_url = urlparse(game_object['Metadata']['log'])
+def load_game(summary: ApexGameSummary) -> Tuple[ApexGame, Dict]:
+    url = urlparse(summary.url)
+    return load_game_data(
+        s3,
+        url.netloc.split('.')[0],
+        url.path[1:],
+        lambda game_data: decoders.load(compat_game_data(game_data), ApexGame, referenced_typedload.load),
+        cache=game_cache,
+        http_url=summary.url,
+    )
+
+
+def get_admin_data(summary: ApexGameSummary, game_metadata: Dict[str, str]) -> Dict[str, Any]:
+    if 'log' in game_metadata and 'start' in game_metadata['log']:
+        log_url = urlparse(game_metadata['log'])
         log_params = dict(e.split('=') for e in log_url.fragment.split(':', 1)[1].split(';'))
 
         log_time = datetime.datetime.strptime(log_params['start'], "%Y-%m-%dT%H:%M:%SZ")
@@ -174,13 +170,12 @@ def get_admin_data(summary: ApexGameSummary, game_object: Dict[str, Any]) -> Dic
     else:
         log_lines = []
 
-    game_metadata = game_object['Metadata']
     summary_dict = summary.asdict()
 
     summary_dict['url'] = (summary_dict['url'], summary_dict['url'])
 
-    if 'frames' in game_object['Metadata']:
-        frames_url = urlparse(game_object['Metadata']['frames'])
+    if 'frames' in game_metadata:
+        frames_url = urlparse(game_metadata['frames'])
         game_metadata['frames'] = (
             game_metadata['frames'],
             s3.generate_presigned_url(
@@ -192,8 +187,8 @@ def get_admin_data(summary: ApexGameSummary, game_object: Dict[str, Any]) -> Dic
             )
         )
 
-        if 'metadata' in game_object['Metadata']:
-            metadata_url = urlparse(game_object['Metadata']['metadata'])
+        if 'metadata' in game_metadata:
+            metadata_url = urlparse(game_metadata['metadata'])
             game_metadata['metadata'] = (
                 game_metadata['metadata'],
                 s3.generate_presigned_url(
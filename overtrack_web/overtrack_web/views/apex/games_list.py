@@ -19,7 +19,7 @@ from overtrack_web.data import ApexRankSummary, ApexSeason, WELCOME_META, apex_d
 from overtrack_web.lib import b64_decode, b64_encode, FlaskResponse
 from overtrack_web.lib.authentication import check_authentication, require_login
 from overtrack_web.lib.opengraph import Meta
-from overtrack_web.lib.session import session
+from overtrack_web.lib.session import refresh_user, session
 from overtrack_web.views.apex.game import compat_game_data, make_game_description
 
 PAGINATION_SIZE = 30
@@ -87,7 +87,7 @@ def games_pagination() -> FlaskResponse:
 
 
 def render_games_list(user: User, public=False, meta_title: Optional[str] = None) -> FlaskResponse:
-    user.refresh()
+    refresh_user(user)
     games_it, is_ranked, season = get_games(user, limit=PAGINATION_SIZE)
     games, next_from = paginate(games_it, username=user.username if public else None)
 
@@ -215,7 +215,7 @@ def get_games(user: User, limit: Optional[int] = None) -> Tuple[ResultIteratorEx
         is_ranked = user.apex_last_game_ranked
 
     if season_id is None or season_id not in apex_data.seasons:
-        season_id = apex_data.current_season.index
+        season_id = apex_data.get_current_season().index
 
     logger.info(f'Getting games for {user.username} => season_id={season_id}')
 
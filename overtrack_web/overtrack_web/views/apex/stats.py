@@ -1,13 +1,36 @@
+import json
 import logging
-from typing import List, Tuple
-
-from flask import Blueprint, render_template
-
+import os
+import time
+from array import array
+from collections import Counter
+from itertools import compress, repeat
+from operator import eq, truediv
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import boto3
+from dataclasses import asdict, dataclass, field
+from flask import Blueprint, render_template, request
+
+from overtrack_web.lib import metrics
 from overtrack_web.lib.authentication import require_login, require_authentication
 from overtrack_web.lib.session import session
 from overtrack_models.orm.apex_game_summary import ApexGameSummary
 from overtrack_models.orm.user import User
 
+# S3 location of the per-user stats summaries - if no bucket is set every page view reads all of the user's games
+APEX_STATS_SUMMARY_BUCKET = os.environ.get('APEX_STATS_SUMMARY_BUCKET', '')
+APEX_STATS_SUMMARY_PREFIX = os.environ.get('APEX_STATS_SUMMARY_PREFIX', 'apex_stats/')
+# games more recent than this are summarised on every view instead of being stored, since they may still be arriving
+# (games are ingested some time after they are played, and summarised by when they were played)
+APEX_STATS_SETTLE_TIME = float(os.environ.get('APEX_STATS_SETTLE_TIME', 24 * 60 * 60))
+# summaries are rebuilt from all of the user's games once they are this old, to pick up games ingested after they had
+# settled
+APEX_STATS_REBUILD_AGE = float(os.environ.get('APEX_STATS_REBUILD_AGE', 7 * 24 * 60 * 60))
+# summaries stored with a different version are rebuilt
+# 2: when the summaries were built is stored
+APEX_STATS_SUMMARY_VERSION = 2
+
 
 def _get_points(placed: int) -> int:
     return {
@@ -29,46 +52,34 @@ scoring = [_get_points(i) for i in range(1, 21)]
 def clip(v, mn, mx):
     return min(max(v, mn), mx)
 
-def mean(seq):
-    return sum(seq) / len(seq)
-
-def placement_score(games: List[ApexGameSummary]) -> Tuple[int, float]:
-    placed = [clip(g.placed, 1, 20) for g in games]
-    scores = [scoring[p - 1] for p in placed]
-    return round(mean(scores)), 1.
+def placement_score(summary: 'SeasonSummary') -> Tuple[int, float]:
+    return round(sum(n * scoring[i] for i, n in enumerate(summary.clipped_placements)) / summary.games), 1.
 
 
-def kills_10min(games: List[ApexGameSummary]) -> Tuple[float, float]:
-    valid_games = [g for g in games if g.placed]
-    kills = [g.kills for g in valid_games]
-    durations = [g.duration for g in valid_games]
-    return round(float(sum(kills) / (sum(durations) / (10 * 60))), 2), len(valid_games) / len(games)
+def kills_10min(summary: 'SeasonSummary') -> Tuple[float, float]:
+    if not summary.placed_duration:
+        return 0., 0.
+    return round(float(summary.placed_kills / (summary.placed_duration / (10 * 60))), 2), summary.placed_games / summary.games
 
 
-def squad_kills_contribution(games: List[ApexGameSummary]) -> Tuple[float, float]:
+def squad_kills_contribution(summary: 'SeasonSummary') -> Tuple[float, float]:
     # TODO: if using this count % valid data and warn if low
-    valid_games = [g for g in games if g.squad_kills is not None]
-    contribution_share = [(g.kills / (g.squad_kills / 3)) for g in valid_games if g.squad_kills]
-    if len(contribution_share):
-        return round(float(mean(contribution_share)), 2), len(contribution_share) / len(games)
+    if summary.contribution_games:
+        return round(float(summary.contribution_total / summary.contribution_games), 2), summary.contribution_games / summary.games
     else:
         return 0., 0.
 
 
-def average_kills(games: List[ApexGameSummary]) -> Tuple[float, float]:
-    valid_games = [g for g in games if g.placed]
-    kills = [g.kills for g in valid_games]
-    if len(kills):
-        return round(float(mean(kills)), 2), len(kills) / len(games)
+def average_kills(summary: 'SeasonSummary') -> Tuple[float, float]:
+    if summary.placed_games:
+        return round(float(summary.placed_kills / summary.placed_games), 2), summary.placed_games / summary.games
     else:
         return 0., 0.
 
 
-def average_squad_kills(games: List[ApexGameSummary]) -> Tuple[float, float]:
-    valid_games = [g for g in games if g.placed]
-    kills = [g.kills for g in valid_games]
-    if len(kills):
-        return round(float(mean(kills)), 2), len(kills) / len(games)
+def average_squad_kills(summary: 'SeasonSummary') -> Tuple[float, float]:
+    if summary.placed_games:
+        return round(float(summary.placed_kills / summary.placed_games), 2), summary.placed_games / summary.games
     else:
         return 0., 0.
 
@@ -85,30 +96,373 @@ logger = logging.getLogger(__name__)
 
 results_blueprint = Blueprint('apex.stats', __name__)
 
+# the game attributes GameColumns uses
+GAME_ATTRIBUTES = [
+    ApexGameSummary.timestamp,
+    ApexGameSummary.season,
+    ApexGameSummary.rank,
+    ApexGameSummary.placed,
+    ApexGameSummary.kills,
+    ApexGameSummary.squad_kills,
+    ApexGameSummary.duration,
+]
+
 
 def get_games(user: User):
-    return list(ApexGameSummary.user_id_time_index.query(user.user_id))
+    return list(ApexGameSummary.user_id_time_index.query(user.user_id, attributes_to_get=GAME_ATTRIBUTES))
+
+
+@dataclass
+class SeasonSummary:
+    """
+    Everything STAT_FUNCTIONS and the placement histogram use from a set of games, so that the stats can be computed
+    without the games.
+    """
+    games: int = 0
+    # games placed 1st to 20th
+    placements: List[int] = field(default_factory=lambda: [0] * 20)
+    # every game, by placement clipped to 1st to 20th (for placement_score)
+    clipped_placements: List[int] = field(default_factory=lambda: [0] * 20)
+    # games with a placement, and their kills and durations
+    placed_games: int = 0
+    placed_kills: float = 0
+    placed_duration: float = 0
+    # games with squad kills, and the sum of their kills / (squad_kills / 3)
+    contribution_games: int = 0
+    contribution_total: float = 0
+
+    def merge(self, other: 'SeasonSummary') -> 'SeasonSummary':
+        return SeasonSummary(
+            games=self.games + other.games,
+            placements=[a + b for a, b in zip(self.placements, other.placements)],
+            clipped_placements=[a + b for a, b in zip(self.clipped_placements, other.clipped_placements)],
+            placed_games=self.placed_games + other.placed_games,
+            placed_kills=self.placed_kills + other.placed_kills,
+            placed_duration=self.placed_duration + other.placed_duration,
+            contribution_games=self.contribution_games + other.contribution_games,
+            contribution_total=self.contribution_total + other.contribution_total,
+        )
+
+    def stats(self) -> List[Tuple[str, float, float]]:
+        return [(name, *func(self)) for name, func in STAT_FUNCTIONS.items()]
+
+
+class GameColumns:
+    """
+    The attributes of a list of games that the stats use, as one array per attribute.
+
+    These are built once from the query, and the stats and placement histogram are then reductions over whole columns
+    (Counter, sum, compress) instead of walks over the games for each stat.
+    """
+    COLUMNS = ['season', 'ranked', 'placed', 'kills', 'squad_kills', 'duration']
+    NO_SEASON = -1
+
+    def __init__(self):
+        self.season = array('i')
+        self.ranked = array('b')
+        # 0 for games without a placement or squad kills
+        self.placed = array('i')
+        self.kills = array('d')
+        self.squad_kills = array('d')
+        self.duration = array('d')
+
+    @classmethod
+    def from_games(cls, games: Iterable[ApexGameSummary]) -> 'GameColumns':
+        columns = cls()
+        for game in games:
+            columns.append(game)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.placed)
+
+    def append(self, game: ApexGameSummary) -> None:
+        self.season.append(game.season if game.season is not None else self.NO_SEASON)
+        self.ranked.append(game.rank is not None)
+        self.placed.append(game.placed or 0)
+        self.kills.append(game.kills or 0)
+        self.squad_kills.append(game.squad_kills or 0)
+        self.duration.append(game.duration or 0)
+
+    def where(self, mask: Iterable[bool]) -> 'GameColumns':
+        mask = list(mask)
+        columns = GameColumns()
+        for name in self.COLUMNS:
+            getattr(columns, name).extend(compress(getattr(self, name), mask))
+        return columns
+
+    def filter(self, season: Optional[int] = None, ranked: Optional[bool] = None) -> 'GameColumns':
+        columns = self
+        if season is not None:
+            columns = columns.where(map(eq, columns.season, repeat(season)))
+        if ranked is not None:
+            columns = columns.where(map(eq, columns.ranked, repeat(ranked)))
+        return columns
+
+    def summarise(self, season: Optional[int] = None, ranked: Optional[bool] = None) -> SeasonSummary:
+        columns = self.filter(season, ranked)
+        counts = Counter(columns.placed)
+        placements = [counts[p] for p in range(1, 21)]
+        clipped_placements = list(placements)
+        clipped_placements[0] += sum(n for p, n in counts.items() if p < 1)
+        clipped_placements[-1] += sum(n for p, n in counts.items() if p > 20)
+        contribution_kills = compress(columns.kills, columns.squad_kills)
+        contribution_squads = map(truediv, compress(columns.squad_kills, columns.squad_kills), repeat(3))
+        return SeasonSummary(
+            games=len(columns),
+            placements=placements,
+            clipped_placements=clipped_placements,
+            placed_games=len(columns) - counts[0],
+            placed_kills=sum(compress(columns.kills, columns.placed)),
+            placed_duration=sum(compress(columns.duration, columns.placed)),
+            contribution_games=len(columns) - columns.squad_kills.count(0),
+            contribution_total=sum(map(truediv, contribution_kills, contribution_squads)),
+        )
+
+
+@dataclass
+class UserSummaries:
+    """
+    A SeasonSummary for each season and ranked/unranked, of a user's games up to `until`. `built` is when the oldest
+    games they include were summarised.
+    """
+    until: float
+    built: float
+    seasons: Dict[str, SeasonSummary] = field(default_factory=dict)
+
+    @staticmethod
+    def key(season: int, ranked: bool) -> str:
+        return f'{season}-{"ranked" if ranked else "unranked"}'
+
+    def merge(self, other: 'UserSummaries') -> 'UserSummaries':
+        seasons = dict(self.seasons)
+        for key, summary in other.seasons.items():
+            seasons[key] = seasons[key].merge(summary) if key in seasons else summary
+        return UserSummaries(until=max(self.until, other.until), built=min(self.built, other.built), seasons=seasons)
+
+    def total(self, season: Optional[int] = None, ranked: Optional[bool] = None) -> SeasonSummary:
+        total = SeasonSummary()
+        for key, summary in self.seasons.items():
+            key_season, key_ranked = key.rsplit('-', 1)
+            if season is not None and key_season != str(season):
+                continue
+            if ranked is not None and (key_ranked == 'ranked') != ranked:
+                continue
+            total = total.merge(summary)
+        return total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': APEX_STATS_SUMMARY_VERSION,
+            'until': self.until,
+            'built': self.built,
+            'seasons': {key: asdict(summary) for key, summary in self.seasons.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'UserSummaries':
+        return cls(
+            until=data['until'],
+            built=data['built'],
+            seasons={key: SeasonSummary(**summary) for key, summary in data['seasons'].items()},
+        )
+
+
+class _GroupTotals:
+    __slots__ = ['placements', 'placed_kills', 'placed_duration', 'contribution_games', 'contribution_total']
+
+    def __init__(self):
+        # games by placement, including 0 for no placement and placements outside 1st to 20th
+        self.placements = Counter()
+        self.placed_kills = 0.
+        self.placed_duration = 0.
+        self.contribution_games = 0
+        self.contribution_total = 0.
+
+    def summary(self) -> SeasonSummary:
+        counts = self.placements
+        placements = [counts[p] for p in range(1, 21)]
+        clipped_placements = list(placements)
+        clipped_placements[0] += sum(n for p, n in counts.items() if p < 1)
+        clipped_placements[-1] += sum(n for p, n in counts.items() if p > 20)
+        games = sum(counts.values())
+        return SeasonSummary(
+            games=games,
+            placements=placements,
+            clipped_placements=clipped_placements,
+            placed_games=games - counts[0],
+            placed_kills=self.placed_kills,
+            placed_duration=self.placed_duration,
+            contribution_games=self.contribution_games,
+            contribution_total=self.contribution_total,
+        )
+
+
+def summarise_groups(games: Iterable[ApexGameSummary]) -> Dict[str, SeasonSummary]:
+    """
+    A SeasonSummary for each season and ranked/unranked, keyed by UserSummaries.key - the same as
+    GameColumns.summarise() of the games in each group, but totalled in a single pass over the games, without building
+    any columns (and reading each attribute of a game at most once).
+    """
+    groups: Dict[Tuple[Optional[int], bool], _GroupTotals] = {}
+    for game in games:
+        group = game.season, game.rank is not None
+        totals = groups.get(group)
+        if totals is None:
+            totals = groups[group] = _GroupTotals()
+        placed = game.placed or 0
+        kills = game.kills or 0
+        totals.placements[placed] += 1
+        if placed:
+            totals.placed_kills += kills
+            totals.placed_duration += game.duration or 0
+        squad_kills = game.squad_kills
+        if squad_kills:
+            totals.contribution_games += 1
+            totals.contribution_total += kills / (squad_kills / 3)
+    return {
+        UserSummaries.key(season, ranked): totals.summary()
+        for (season, ranked), totals in sorted(groups.items(), key=lambda item: (item[0][0] is not None, item[0]))
+    }
+
+
+def summarise_games(user_id: int, since: Optional[float] = None, until: Optional[float] = None) -> UserSummaries:
+    """
+    Summarise the user's games after `since` and up to `until`.
+    """
+    if since is not None and until is not None:
+        range_key_condition = ApexGameSummary.timestamp.between(since, until)
+    elif since is not None:
+        range_key_condition = ApexGameSummary.timestamp >= since
+    elif until is not None:
+        range_key_condition = ApexGameSummary.timestamp <= until
+    else:
+        range_key_condition = None
+
+    built = time.time()
+    t0 = time.perf_counter()
+    query = ApexGameSummary.user_id_time_index.query(user_id, range_key_condition, attributes_to_get=GAME_ATTRIBUTES)
+    # the range includes `since`, which was already included in the summaries this is being merged into
+    games = query if since is None else (game for game in query if game.timestamp > since)
+    summaries = UserSummaries(
+        until=until if until is not None else built,
+        built=built,
+        seasons=summarise_groups(games),
+    )
+    logger.info(f'Summarised {query.total_count} games in {(time.perf_counter() - t0) * 1000:.2f}ms')
+    metrics.record('apex_stats.summarise_time', value=time.perf_counter() - t0, unit='seconds')
+    return summaries
+
+
+class SummaryStore:
+    """
+    UserSummaries stored in S3 for each user, so that viewing the stats only has to read the games played since they
+    were last updated.
+
+    Summaries are brought up to date when they are read: games older than `settle_time` are added to the stored summaries,
+    and more recent games are summarised on each read without being stored, so that games which are still being
+    processed aren't missed. Games are summarised by when they were played, so one ingested after it had settled is only
+    included once the summaries are rebuilt, which happens when they are older than `rebuild_age`.
+    scripts/backfill_apex_stats builds (or rebuilds) the summaries for existing users.
+    """
+
+    def __init__(
+            self,
+            s3=None,
+            bucket: str = '',
+            prefix: str = '',
+            settle_time: float = APEX_STATS_SETTLE_TIME,
+            rebuild_age: float = APEX_STATS_REBUILD_AGE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.settle_time = settle_time
+        self.rebuild_age = rebuild_age
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.s3 and self.bucket)
+
+    def key(self, user_id: int) -> str:
+        return f'{self.prefix}{user_id}.json'
+
+    def get(self, user_id: int) -> UserSummaries:
+        if not self.enabled:
+            return summarise_games(user_id)
+
+        settled = time.time() - self.settle_time
+        summaries = self.load(user_id)
+        if summaries is None or time.time() - summaries.built > self.rebuild_age:
+            metrics.record('apex_stats.summary.miss' if summaries is None else 'apex_stats.summary.rebuild')
+            summaries = self.rebuild(user_id, settled)
+        elif summaries.until < settled:
+            metrics.record('apex_stats.summary.update')
+            summaries = summaries.merge(summarise_games(user_id, since=summaries.until, until=settled))
+            self.save(user_id, summaries)
+        else:
+            metrics.record('apex_stats.summary.hit')
+        return summaries.merge(summarise_games(user_id, since=summaries.until))
+
+    def rebuild(self, user_id: int, until: Optional[float] = None) -> UserSummaries:
+        summaries = summarise_games(user_id, until=until if until is not None else time.time() - self.settle_time)
+        self.save(user_id, summaries)
+        return summaries
+
+    def load(self, user_id: int) -> Optional[UserSummaries]:
+        key = self.key(user_id)
+        try:
+            data = json.load(self.s3.get_object(Bucket=self.bucket, Key=key)['Body'])
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        except:
+            logger.exception(f'Failed to load apex stats summaries from s3://{self.bucket}/{key}')
+            return None
+        if data.get('version') != APEX_STATS_SUMMARY_VERSION:
+            logger.info(f'Apex stats summaries s3://{self.bucket}/{key} have version {data.get("version")} - rebuilding')
+            return None
+        return UserSummaries.from_dict(data)
+
+    def save(self, user_id: int, summaries: UserSummaries) -> None:
+        key = self.key(user_id)
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=json.dumps(summaries.to_dict()).encode(),
+                ContentType='application/json',
+            )
+        except:
+            logger.exception(f'Failed to save apex stats summaries to s3://{self.bucket}/{key}')
+
+
+try:
+    s3 = boto3.client('s3') if APEX_STATS_SUMMARY_BUCKET else None
+except:
+    logger.exception('Failed to create AWS S3 client - not storing apex stats summaries')
+    s3 = None
+summary_store = SummaryStore(s3, APEX_STATS_SUMMARY_BUCKET, APEX_STATS_SUMMARY_PREFIX)
 
 
 def render_results(user: User):
-    games = get_games(user)
+    try:
+        season = int(request.args['season']) if 'season' in request.args else None
+    except ValueError:
+        return 'Invalid season', 400
+    ranked = request.args['ranked'] == 'true' if 'ranked' in request.args else None
+
+    summary = summary_store.get(user.user_id).total(season, ranked)
 
-    if not len(games):
+    if not summary.games:
         return render_template('client.html', no_games_alert=True)
 
-    hist = [0 for _ in range(20)]
-    total = 0
-    for g in games:
-        if 1 <= g.placed <= 20:
-            hist[g.placed - 1] = hist[g.placed - 1] + 1
-            total += 1
+    hist = summary.placements
+    total = sum(hist)
 
-    freq = [v / total for v in hist]
+    # games without a placement aren't in the histogram, so there may be games but no placements
+    freq = [v / total for v in hist] if total else [0.] * len(hist)
     placements_prob = [sum(freq[:i]) * 100 for i in range(0, 20)] + [100]
 
-    statsrow = []
-    for name, func in STAT_FUNCTIONS.items():
-        statsrow.append((name, *func(games)))
+    statsrow = summary.stats()
 
     return render_template(
         'apex/results/results.html',
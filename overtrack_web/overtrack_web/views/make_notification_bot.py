@@ -2,13 +2,13 @@ import base64
 import json
 import logging
 import os
-from collections import defaultdict
 from typing import Optional, Union, Tuple, Dict, List, Callable
 
+import boto3
 import jwt
-import requests
 import requests_oauthlib
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from flask import Blueprint, Response, redirect, render_template, request, url_for, Request, render_template_string
 from jwt import InvalidTokenError
@@ -19,28 +19,33 @@ from overtrack_models.orm.notifications import DiscordBotNotification, TwitchBot
 from overtrack_web.lib import metrics
 from overtrack_web.lib.authentication import require_authentication, require_login
 from overtrack_web.lib.decorators import restrict_origin
-from overtrack_web.lib.session import session
+from overtrack_web.lib.discord_client import DISCORD_API_URL, DiscordClient
+from overtrack_web.lib.notification_index import GuildNotificationIndex, NOTIFICATION_INDEX_BUCKET, NOTIFICATION_INDEX_KEY
+from overtrack_web.lib.session import refresh_user, session
 
 HMAC_KEY = base64.b64decode(os.environ['HMAC_KEY'])
 
 CLIENT_ID = os.environ['DISCORD_CLIENT_ID']
 CLIENT_SECRET = os.environ['DISCORD_CLIENT_SECRET']
-AUTHORISE_URL = 'https://discord.com/api/oauth2/authorize'
-TOKEN_URL = 'https://discord.com/api/oauth2/token'
+AUTHORISE_URL = DISCORD_API_URL + '/oauth2/authorize'
+TOKEN_URL = DISCORD_API_URL + '/oauth2/token'
 
 DISCORD_BOT_TOKEN = os.environ['DISCORD_BOT_TOKEN']
 DISCORD_BOT_ID = os.environ.get('DISCORD_BOT_ID', '470874176350191637')
 
-USER_INFO = 'https://discord.com/api/users/@me'
-USER_LIST_GUILDS = 'https://discord.com/api/users/%s/guilds'
-GUILD_INFO = 'https://discord.com/api/guilds/%s'
-GUILD_LIST_CHANNELS = 'https://discord.com/api/guilds/%s/channels'
-GUILD_GET_GUILD_MEMBER = 'https://discord.com/api/guilds/%s/members/%s'
-CHANNEL_INFO = 'https://discord.com/api/channels/%s'
-CHANNEL_EDIT_PERMISSIONS = 'https://discord.com/api/channels/%s/permissions/%s'
-CHANNEL_CREATE_MESSAGE = 'https://discord.com/api/channels/%s/messages'
-CHANNEL_GET_MESSAGE = 'https://discord.com/api/channels/%s/messages/%s'
-CHANNEL_EDIT_MESSAGE = 'https://discord.com/api/channels/%s/messages/%s'
+# requested with the user's OAuth token
+USER_INFO = DISCORD_API_URL + '/users/@me'
+USER_LIST_GUILDS = DISCORD_API_URL + '/users/%s/guilds'
+
+# requested as the bot, with discord_bot
+GUILD_INFO = '/guilds/%s'
+GUILD_LIST_CHANNELS = '/guilds/%s/channels'
+GUILD_GET_GUILD_MEMBER = '/guilds/%s/members/%s'
+CHANNEL_INFO = '/channels/%s'
+CHANNEL_EDIT_PERMISSIONS = '/channels/%s/permissions/%s'
+CHANNEL_CREATE_MESSAGE = '/channels/%s/messages'
+CHANNEL_GET_MESSAGE = '/channels/%s/messages/%s'
+CHANNEL_EDIT_MESSAGE = '/channels/%s/messages/%s'
 
 # https://discordapp.com/developers/docs/topics/permissions#permissions-bitwise-permission-flags
 VIEW_CHANNEL = 0x00000400
@@ -55,21 +60,50 @@ TEXT_CHANNEL = 0
 
 base_logger = logging.getLogger(__name__)
 
-discord_bot = requests.Session()
-discord_bot.headers.update({
-    'Authorization': f'Bot {DISCORD_BOT_TOKEN}'
-})
+discord_bot = DiscordClient(DISCORD_BOT_TOKEN)
+
+try:
+    s3 = boto3.client('s3') if NOTIFICATION_INDEX_BUCKET else None
+except:
+    base_logger.exception('Failed to create AWS S3 client - not persisting the notification index')
+    s3 = None
+notification_index = GuildNotificationIndex(
+    DiscordBotNotification,
+    s3,
+    NOTIFICATION_INDEX_BUCKET,
+    NOTIFICATION_INDEX_KEY,
+)
 
-base_logger.info(f'Caching DiscordBotNotifications')
-t0 = time.perf_counter()
-notification_cache = defaultdict(list)
-q = DiscordBotNotification.scan()
-for dbn in q:
-    notification_cache[dbn.guild_id].append(dbn)
-base_logger.info(f'Done - took {(time.perf_counter() - t0) * 1000:.2f}ms to scan {q.total_count} items')
+# the discord (and dynamodb) requests for a page are made concurrently on this pool
+DISCORD_FANOUT_WORKERS = int(os.environ.get('DISCORD_FANOUT_WORKERS', 8))
+fanout_pool = ThreadPoolExecutor(max_workers=DISCORD_FANOUT_WORKERS, thread_name_prefix='discord_fanout')
 
 request: Request = request
 
+
+class Fanout:
+    """
+    Makes the requests for a page concurrently on `fanout_pool`. Identical requests (e.g. the info for a guild with two
+    integrations in it) are only made once.
+    """
+
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+        self._futures: Dict[Tuple, Future] = {}
+
+    def submit(self, fn: Callable, *args) -> Future:
+        key = (fn, ) + args
+        if key not in self._futures:
+            self._futures[key] = fanout_pool.submit(fn, *args)
+        return self._futures[key]
+
+    def finish(self) -> None:
+        latency = time.perf_counter() - self.started
+        base_logger.info(f'{self.page} made {len(self._futures)} requests, took {latency * 1000:.2f}ms')
+        metrics.record(f'discord_bot.{self.page}.latency', value=latency, unit='seconds')
+        metrics.record(f'discord_bot.{self.page}.requests', value=len(self._futures))
+
 @dataclass
 class Checkbox:
     name: str
@@ -131,26 +165,35 @@ def create_notification_pages(
     @blueprint.route('/')
     @require_login
     def root():
+        fanout = Fanout(f'{game_name}.root')
         discord_notifications = []
         n: DiscordBotNotification
         logger.info(f'Fetching existing DiscordBotNotifications')
-        for n in DiscordBotNotification.user_id_index.query(session.user_id, DiscordBotNotification.game == game_name):
+        notifications = list(
+            DiscordBotNotification.user_id_index.query(session.user_id, DiscordBotNotification.game == game_name)
+        )
+        # start fetching everything needed for every notification before looking at any of them
+        for n in notifications:
+            fanout.submit(_refresh_notification, n)
+            fanout.submit(_get_channel_info, n.channel_id)
+            fanout.submit(_get_guild_info, n.guild_id)
+            if n.announce_message_id:
+                fanout.submit(check_message_exists, n.channel_id, n.announce_message_id)
+
+        for n in notifications:
             # update cache
-            try:
-                n.refresh()
-            except DiscordBotNotification.DoesNotExist:
+            if not fanout.submit(_refresh_notification, n).result():
                 logger.warning(f'Found matching {n} in cache, but it has been deleted, not included')
+                notification_index.remove(n.guild_id, n.key)
                 continue
             logger.info(f'    {n}')
-            for o in list(notification_cache[n.guild_id]):
-                if n.key == o.key:
-                    notification_cache[n.guild_id].remove(o)
-            notification_cache[n.guild_id].append(n)
+            notification_index.add(n)
 
-            channel_info, guild_info = _get_channel_and_guild_info(n.channel_id)
+            channel_info = fanout.submit(_get_channel_info, n.channel_id).result()
+            guild_info = fanout.submit(_get_guild_info, n.guild_id).result() if channel_info else None
             if not channel_info or not guild_info:
                 logger.warning(f'Could not get channel info for {n} - ignoring')
-            elif n.announce_message_id and not check_message_exists(n.channel_id, n.announce_message_id):
+            elif n.announce_message_id and not fanout.submit(check_message_exists, n.channel_id, n.announce_message_id).result():
                 logger.warning(f'Could not get announce message for {n} - ignoring')
             else:
                 update_notification(n, guild_info, channel_info)
@@ -164,6 +207,7 @@ def create_notification_pages(
                         key=n.key,
                     )
                 })
+        fanout.finish()
 
         twitch_notification_data = None
         twitch_channel = None
@@ -172,7 +216,7 @@ def create_notification_pages(
             try:
                 twitch_notification = TwitchBotNotification.user_id_index.get(session.user_id, TwitchBotNotification.game == game_name)
             except TwitchBotNotification.DoesNotExist:
-                session.user.refresh()
+                refresh_user(session.user)
                 if session.user.twitch_user and 'login' in session.user.twitch_user:
                     # Notification not exists and user has twitch channel
                     twitch_channel = session.user.twitch_user['login']
@@ -459,7 +503,7 @@ def create_notification_pages(
             parent_key=parent_key,
         )
         logger.info(f'Created {notification}')
-        notification_cache[notification.guild_id].append(notification)
+        notification_index.add(notification)
         notification.save()
 
         metrics.event(
@@ -511,6 +555,7 @@ def create_notification_pages(
             notification = DiscordBotNotification.get(args['key'])
             logger.info(f'Deleting {notification}')
             notification.delete()
+            notification_index.remove(notification.guild_id, notification.key)
 
             try:
                 logger.info(f'Updating announce message')
@@ -614,73 +659,87 @@ def create_notification_pages(
         guilds = r.json()
         logger.info(f'User is in {len(guilds)} guilds')
 
-        allowed_servers = []
-        for membership in guilds:
-            existing_notification: DiscordBotNotification
-            for existing_notification in notification_cache[membership['id']]:
-                if existing_notification.game != game_name:
-                    # for wrong game
-                    continue
-
-                try:
-                    existing_notification.refresh()
-                except DiscordBotNotification.DoesNotExist:
-                    logger.warning(
-                        f'Found matching integration in cache, but it has been deleted, not included '
-                        f'- {existing_notification}'
-                    )
-                    continue
-                if not existing_notification.autoapprove_children:
-                    logger.warning(
-                        f'Found matching integration, but autoapprove_children is False, not including '
-                        f'- {existing_notification}'
-                    )
-                    continue
-                if not check_message_exists(existing_notification.channel_id, existing_notification.announce_message_id):
-                    logger.warning(
-                        f'Found matching integration, but announce message could not be retrieved, not including '
-                        f'- {existing_notification}'
-                    )
-                    continue
+        fanout = Fanout(f'{game_name}.add_to_existing')
+        candidates = [
+            (membership, key)
+            for membership in guilds
+            for key in notification_index.get(membership['id'], game_name)
+        ]
+        for _, key in candidates:
+            fanout.submit(_get_notification, key)
+        # start fetching everything needed for every integration that could be added to before looking at any of them
+        for membership, key in candidates:
+            existing_notification = fanout.submit(_get_notification, key).result()
+            if existing_notification and existing_notification.autoapprove_children:
+                fanout.submit(
+                    check_message_exists, existing_notification.channel_id, existing_notification.announce_message_id
+                )
+                fanout.submit(_get_channel_info, existing_notification.channel_id)
+                fanout.submit(_get_guild_info, existing_notification.guild_id)
+                fanout.submit(_get_guild_member, existing_notification.guild_id, discord_user['id'])
 
-                logger.info(
-                    f'Found mutual channel {existing_notification.guild_name} > '
-                    f'#{existing_notification.channel_name} ({existing_notification.channel_id})'
+        allowed_servers = []
+        for membership, key in candidates:
+            existing_notification = fanout.submit(_get_notification, key).result()
+            if not existing_notification:
+                logger.warning(f'Found matching integration in index, but it has been deleted, not included - {key}')
+                notification_index.remove(membership['id'], key)
+                continue
+            if not existing_notification.autoapprove_children:
+                logger.warning(
+                    f'Found matching integration, but autoapprove_children is False, not including '
+                    f'- {existing_notification}'
                 )
-                print('Guild membership:')
-                print(membership)
+                continue
+            if not fanout.submit(
+                check_message_exists, existing_notification.channel_id, existing_notification.announce_message_id
+            ).result():
+                logger.warning(
+                    f'Found matching integration, but announce message could not be retrieved, not including '
+                    f'- {existing_notification}'
+                )
+                continue
 
-                channel_info, guild_info = _get_channel_and_guild_info(existing_notification.channel_id)
-                if not channel_info or not guild_info:
-                    continue
+            logger.info(
+                f'Found mutual channel {existing_notification.guild_name} > '
+                f'#{existing_notification.channel_name} ({existing_notification.channel_id})'
+            )
+            print('Guild membership:')
+            print(membership)
 
-                assert guild_info['id'] == existing_notification.guild_id
+            channel_info = fanout.submit(_get_channel_info, existing_notification.channel_id).result()
+            guild_info = fanout.submit(_get_guild_info, existing_notification.guild_id).result() if channel_info else None
+            if not channel_info or not guild_info:
+                continue
 
-                update_notification(existing_notification, guild_info, channel_info)
+            assert guild_info['id'] == existing_notification.guild_id
 
-                guild_member = _get_guild_member(existing_notification.guild_id, discord_user['id'])
-                if not guild_member:
-                    continue
+            update_notification(existing_notification, guild_info, channel_info)
 
-                # guild-level permissions is already computed by User.list_guilds, so we just need to compute channel overrides
+            guild_member = fanout.submit(_get_guild_member, existing_notification.guild_id, discord_user['id']).result()
+            if not guild_member:
+                continue
 
-                permissions = compute_permissions(membership['permissions'], guild_member, channel_info)
-                if guild_info['owner_id'] == guild_member['user']['id']:
-                    logger.info('User is owner - vibe check passed')
-                elif not permissions & SEND_MESSAGES:
-                    logger.info(f'User does not have SEND_MESSAGES permissions (permissions={permissions:x})')
-                    continue
+            # guild-level permissions is already computed by User.list_guilds, so we just need to compute channel overrides
 
-                logger.info(f'User has SEND_MESSAGES permission (permissions={permissions:x})')
-                allowed_servers.append({
-                    'name': f'{existing_notification.guild_name} #{existing_notification.channel_name}',
-                    'args': _make_signed_payload(
-                        action='add_to_existing_channel',
-                        channel_id=existing_notification.channel_id,
-                        discord_user_id=discord_user['id'],
-                        parent_key=existing_notification.key,
-                    ),
-                })
+            permissions = compute_permissions(membership['permissions'], guild_member, channel_info)
+            if guild_info['owner_id'] == guild_member['user']['id']:
+                logger.info('User is owner - vibe check passed')
+            elif not permissions & SEND_MESSAGES:
+                logger.info(f'User does not have SEND_MESSAGES permissions (permissions={permissions:x})')
+                continue
+
+            logger.info(f'User has SEND_MESSAGES permission (permissions={permissions:x})')
+            allowed_servers.append({
+                'name': f'{existing_notification.guild_name} #{existing_notification.channel_name}',
+                'args': _make_signed_payload(
+                    action='add_to_existing_channel',
+                    channel_id=existing_notification.channel_id,
+                    discord_user_id=discord_user['id'],
+                    parent_key=existing_notification.key,
+                ),
+            })
+        fanout.finish()
 
         return render_template(
             'notifications/channel_add.html',
@@ -714,6 +773,21 @@ def create_notification_pages(
             return redirect(url_for(blueprint.name + '.root'))
 
 
+def _refresh_notification(notification: DiscordBotNotification) -> bool:
+    try:
+        notification.refresh()
+        return True
+    except DiscordBotNotification.DoesNotExist:
+        return False
+
+
+def _get_notification(key: str) -> Optional[DiscordBotNotification]:
+    try:
+        return DiscordBotNotification.get(key)
+    except DiscordBotNotification.DoesNotExist:
+        return None
+
+
 def update_notification(existing_notification: DiscordBotNotification, guild_info: Dict, channel_info: Dict) -> None:
     if guild_info['name'] != existing_notification.guild_name or channel_info['name'] != existing_notification.channel_name:
         base_logger.info(f'Updating {existing_notification} guild_name={guild_info["name"]}, channel_name={channel_info["name"]}')
@@ -760,27 +834,40 @@ def check_message_exists(channel_id: str, message_id: Optional[str]) -> bool:
 
 
 def _get_channel_and_guild_info(channel_id: str) -> Tuple[Optional[Dict], Optional[Dict]]:
+    channel_info = _get_channel_info(channel_id)
+    if not channel_info:
+        return None, None
+    guild_info = _get_guild_info(channel_info['guild_id'])
+    if not guild_info:
+        return None, None
+    return channel_info, guild_info
+
+
+def _get_channel_info(channel_id: str) -> Optional[Dict]:
     base_logger.info(f'Getting channel info for {channel_id}')
     channel_info_r = discord_bot.get(
         CHANNEL_INFO % (channel_id,)
     )
     if channel_info_r.status_code in [404, 403]:
         base_logger.warning(f'Got {channel_info_r.status_code} getting channel info')
-        return None, None
+        return None
     channel_info_r.raise_for_status()
     channel_info = channel_info_r.json()
     print('Channel info: ')
     print(channel_info)
     base_logger.info(f'Got channel info for #{channel_info["name"]} ({channel_id})')
+    return channel_info
+
 
-    base_logger.info(f'Getting guild info for {channel_info["guild_id"]}')
+def _get_guild_info(guild_id: str) -> Optional[Dict]:
+    base_logger.info(f'Getting guild info for {guild_id}')
     guild_info_r = discord_bot.get(
-        GUILD_INFO % (channel_info['guild_id'],)
+        GUILD_INFO % (guild_id,)
     )
-    guild_info_r.raise_for_status()
-    if channel_info_r.status_code in [404, 403]:
+    if guild_info_r.status_code in [404, 403]:
         base_logger.warning(f'Got {guild_info_r.status_code} getting guild info')
-        return None, None
+        return None
+    guild_info_r.raise_for_status()
     guild_info = guild_info_r.json()
     print('Guild info: ')
     print_guild_info = dict(guild_info)
@@ -788,7 +875,7 @@ def _get_channel_and_guild_info(channel_id: str) -> Tuple[Optional[Dict], Option
     print_guild_info['roles'] = [(r['id'], r['name'], r['permissions']) for r in print_guild_info['roles']]
     print(print_guild_info)
     base_logger.info(f'Got guild info for guild {guild_info["name"]} ({guild_info["id"]})')
-    return channel_info, guild_info
+    return guild_info
 
 
 def _get_guild_member(guild_id: str, user_id: str) -> Optional[Dict]:
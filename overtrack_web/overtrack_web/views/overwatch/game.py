@@ -1,6 +1,4 @@
 import collections
-import hashlib
-import json
 import logging
 import os
 import string
@@ -11,8 +9,8 @@ from urllib.parse import urlparse
 
 import boto3
 import requests
-from dataclasses import asdict, fields, is_dataclass
-from flask import Blueprint, Request, render_template, request, url_for, render_template_string, Response
+from dataclasses import asdict, dataclass, fields, is_dataclass
+from flask import Blueprint, Markup, Request, render_template, request, url_for, render_template_string, Response
 from itertools import chain
 from werkzeug.utils import redirect
 
@@ -26,12 +24,21 @@ from overtrack_models.orm.overwatch_game_summary import OverwatchGameSummary
 from overtrack_web.data import overwatch_data
 from overtrack_web.data.overwatch_data import hero_colors
 from overtrack_web.lib.authentication import check_authentication, require_login
+from overtrack_web.lib.card_images import CARD_IMAGE_BUCKET, CARD_IMAGE_DISK_PATH, CARD_IMAGE_PREFIX, CardImageStore, \
+    get_card_png, render_overwatch_card
 from overtrack_web.lib.decorators import restrict_origin
+from overtrack_web.lib import decoders, reference_data
+from overtrack_web.lib.game_cache import GameCache, game_cache
+from overtrack_web.lib.http_cache import cache_control, cached_response, make_etag, not_modified
+from overtrack_web.lib.game_storage import get_game_etag, invalidate_game, load_game_data, make_s3_client, store_game_data
+from overtrack_web.lib.lazy_dataclass import LazyDataclass, dump_dataclass, load_lazy_streaming
 from overtrack_web.lib.opengraph import Meta
 from overtrack_web.lib.overwatch_legacy import get_legacy_paths
+from overtrack_web.lib.page_cache import CachedPage, PageCache, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_MAX_ITEMS, app_version
 from overtrack_web.lib.session import session
 from overtrack_web.views.overwatch import OLDEST_SUPPORTED_GAME_VERSION, sr_change
 from overtrack_web.views.overwatch.games_list import map_thumbnail_style
+from overtrack_web.views.overwatch.hero_stats import aggregates as hero_stats_aggregates
 
 GAMES_BUCKET = 'overtrack-overwatch-games'
 COLOURS = {
@@ -41,18 +48,20 @@ COLOURS = {
 }
 LEGACY_URL = 'https://old.overtrack.gg'
 
+# the page shows the logged in user and (for the owner) edit controls, so only the browser may cache it, and must check
+# for edits every time
+GAME_PAGE_CACHE_CONTROL = cache_control(no_cache=True)
+GAME_CARD_CACHE_CONTROL = cache_control(public=True, max_age=5 * 60, stale_while_revalidate=24 * 60 * 60)
+# card images requested with the _cachebust of the game's current version never change
+GAME_CARD_PNG_IMMUTABLE_CACHE_CONTROL = cache_control(public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+
 
 request: Request = request
 
 logger = logging.getLogger(__name__)
 
-try:
-    s3 = boto3.client('s3')
-    """ :type s3: mypy_boto3.s3.Client """
-    s3.list_objects_v2(Bucket=GAMES_BUCKET)
-except:
-    logger.exception('Failed to create AWS S3 client - using HTTP for downloading games')
-    s3 = None
+s3 = make_s3_client()
+""" :type s3: mypy_boto3.s3.Client """
 try:
     logs = boto3.client('logs')
     """ :type s3: boto3_type_annotations.s3.Client """
@@ -60,11 +69,19 @@ except:
     logger.exception('Failed to create AWS logs client - running without admin logs')
     logs = None
 
-try:
-    legacy_scripts, legacy_stylesheet = get_legacy_paths(LEGACY_URL)
-except:
-    logger.exception('Failed to get legacy script paths')
-    legacy_scripts, legacy_stylesheet = {}, None
+legacy_paths = reference_data.register(
+    'overwatch_legacy_paths',
+    lambda: get_legacy_paths(LEGACY_URL, timeout=reference_data.REFERENCE_DATA_TIMEOUT),
+    lambda: ({}, None),
+    tuple,
+)
+
+# compile the game decoders once per process - fields the decoders can't load fall back to referenced_typedload
+decoders.precompile(OverwatchGame)
+load_section = decoders.with_fallback(referenced_typedload.load)
+
+card_images = CardImageStore(s3, CARD_IMAGE_BUCKET, CARD_IMAGE_PREFIX, CARD_IMAGE_DISK_PATH)
+page_cache = PageCache('overwatch_game_page_cache', PAGE_CACHE_MAX_ITEMS, PAGE_CACHE_MAX_BYTES)
 
 game_blueprint = Blueprint('overwatch.game', __name__)
 
@@ -78,6 +95,21 @@ def game(key: str):
     except OverwatchGameSummary.DoesNotExist:
         return 'Game does not exist', 404
 
+    legacy = not summary.game_version or summary.game_version < OLDEST_SUPPORTED_GAME_VERSION or 'legacy' in request.args
+    if not legacy:
+        # checked before any conditional response, so that a 304 is never sent for a game the viewer can't see
+        if not summary.viewable and not(check_authentication() is None and session.superuser):
+            return 'Please subscribe to view game details', 403
+
+        if summary.game_type == 'custom' and (check_authentication() is not None or (not session.superuser and session.user_id != summary.user_id)):
+            return 'Custom games are restricted to being viewed by their owner', 403
+
+    viewer = session.user_id if check_authentication() is None else None
+    etag = game_page_etag(get_game_version(summary), viewer)
+    rsp = not_modified(etag, GAME_PAGE_CACHE_CONTROL)
+    if rsp:
+        return rsp
+
     if summary.player_name and summary.result != 'UNKNOWN':
         title = f'{summary.player_name}\'s {summary.result} on {summary.map}'
     elif summary.player_name:
@@ -85,23 +117,43 @@ def game(key: str):
     else:
         title = f'{key.split("/", 1)[0]}\'s game on {summary.map}'
 
-    if not summary.game_version or summary.game_version < OLDEST_SUPPORTED_GAME_VERSION or 'legacy' in request.args:
-        return render_template(
-            'overwatch/game/legacy_game.html',
-            title=title,
-            legacy_base=LEGACY_URL,
-            legacy_scripts=legacy_scripts,
-            legacy_stylesheet=legacy_stylesheet,
+    if legacy:
+        legacy_scripts, legacy_stylesheet = legacy_paths.get()
+        return cached_response(
+            render_template(
+                'overwatch/game/legacy_game.html',
+                title=title,
+                legacy_base=LEGACY_URL,
+                legacy_scripts=legacy_scripts,
+                legacy_stylesheet=legacy_stylesheet,
+            ),
+            etag,
+            GAME_PAGE_CACHE_CONTROL
         )
 
-    if not summary.viewable and not(check_authentication() is None and session.superuser):
-        return 'Please subscribe to view game details', 403
-
-    if summary.game_type == 'custom' and (check_authentication() is not None or (not session.superuser and session.user_id != summary.user_id)):
-        return 'Custom games are restricted to being viewed by their owner', 403
+    show_edit = check_authentication() is None and (summary.user_id == session.user_id or session.superuser)
+    # the public view (no dev info or edit controls) is the same for everyone, so can be served from the page cache
+    cache_page = not show_edit and not (check_authentication() is None and session.user.superuser)
+    page_version = None
+    if cache_page:
+        blob_etag = get_game_etag(s3, GAMES_BUCKET, summary.key + '.json', cache=game_cache)
+        if blob_etag:
+            page_version = f'{blob_etag}/{app_version()}'
+            page = page_cache.get(key, page_version)
+            if page:
+                return cached_response(
+                    render_template(
+                        'overwatch/game/game.html',
+                        content=Markup(page.content),
+                        summary=summary,
+                        title=page.context['title'],
+                        meta=game_meta(summary, page.context['title'], page.context['colour']),
+                    ),
+                    etag,
+                    GAME_PAGE_CACHE_CONTROL
+                )
 
     game, metadata = load_game(summary)
-    game.timestamp = summary.time
 
     if game.teams.owner and game.result != 'UNKNOWN':
         title = f'{game.teams.owner.name}\'s {game.result} on {game.map.name}'
@@ -110,7 +162,7 @@ def game(key: str):
 
     dev_info = get_dev_info(summary, game, metadata)
 
-    imagehash = hashlib.md5(str((game.result, game.start_sr, game.end_sr)).encode()).hexdigest()
+    stat_ranges = StatRanges(game, PLAYER_STAT_FIELDS)
 
     try:
         tfs = game.teamfights
@@ -129,20 +181,18 @@ def game(key: str):
     except AttributeError:
         stat_totals = {}
 
-    return render_template(
-        'overwatch/game/game.html',
-
+    # only what doesn't depend on the request is cached - the meta has absolute URLs for the host the page was requested on
+    page_context = dict(
         title=title,
-        meta=Meta(
-            title=title,
-            image_url=url_for('overwatch.game.game_card_png', key=key, _external=True) + f'?_cachebust={imagehash}',
-            twitter_image_url=url_for('overwatch.game.game_card_png', key=key, _external=True) + f'?height=190&_cachebust={imagehash}',
-            summary_large_image=True,
-            colour=COLOURS.get(game.result, 'gray')
-        ),
+        colour=COLOURS.get(game.result, 'gray'),
+    )
+
+    content = render_template(
+        'overwatch/game/game_content.html',
 
         # show_stats=show_stats,
         stat_totals=stat_totals,
+        stat_ranges=stat_ranges,
         # get_top_heroes=get_top_heroes,
         # get_hero_color=get_hero_color,
         # get_hero_image=get_hero_image,
@@ -151,12 +201,31 @@ def game(key: str):
         summary=summary,
         game=game,
 
-        show_edit=check_authentication() is None and (summary.user_id == session.user_id or session.superuser),
+        show_edit=show_edit,
 
         dev_info=dev_info,
 
         OLDEST_SUPPORTED_GAME_VERSION=OLDEST_SUPPORTED_GAME_VERSION,
     )
+    if page_version:
+        page_cache.put(CachedPage(
+            key=key,
+            version=page_version,
+            content=content,
+            context=page_context,
+        ))
+
+    return cached_response(
+        render_template(
+            'overwatch/game/game.html',
+            content=Markup(content),
+            summary=summary,
+            title=title,
+            meta=game_meta(summary, title, page_context['colour']),
+        ),
+        etag,
+        GAME_PAGE_CACHE_CONTROL
+    )
 
 
 @game_blueprint.route('<path:key>/card')
@@ -166,7 +235,12 @@ def game_card(key: str):
     except OverwatchGameSummary.DoesNotExist:
         return 'Game does not exist', 404
 
-    return render_template_string(
+    etag = game_card_etag(get_game_version(game))
+    rsp = not_modified(etag, GAME_CARD_CACHE_CONTROL)
+    if rsp:
+        return rsp
+
+    return cached_response(render_template_string(
         '''
             <!DOCTYPE html>
             <html lang="en">
@@ -193,11 +267,38 @@ def game_card(key: str):
         OLDEST_SUPPORTED_GAME_VERSION=OLDEST_SUPPORTED_GAME_VERSION,
 
         map_thumbnail_style=map_thumbnail_style,
-    )
+    ), etag, GAME_CARD_CACHE_CONTROL)
 
 
 @game_blueprint.route('/<path:key>/card.png')
 def game_card_png(key: str):
+    width = max(1, min(int(request.args.get("width", 356)), 512))
+    height = max(1, min(int(request.args.get("height", 80)), 512))
+    try:
+        summary = OverwatchGameSummary.get(key)
+    except OverwatchGameSummary.DoesNotExist:
+        return 'Game does not exist', 404
+    card_version = get_game_version(summary)
+    # only a _cachebust for the current version of the game (as linked from its page) makes the card immutable - any
+    # other value is rendered as normal, and never stored or cached under that value
+    if request.args.get('_cachebust') == card_version:
+        cachebust = card_version
+        card_cache_control = GAME_CARD_PNG_IMMUTABLE_CACHE_CONTROL
+    else:
+        cachebust = ''
+        card_cache_control = GAME_CARD_CACHE_CONTROL
+    etag = make_etag(key, card_version, width, height, app_version())
+    rsp = not_modified(etag, card_cache_control)
+    if rsp:
+        return rsp
+
+    def render():
+        return render_overwatch_card(summary, sr_change(summary))
+
+    png = get_card_png(card_images, 'overwatch', key, card_version, (width, height), render)
+    if png:
+        return cached_response(Response(png, mimetype='image/png'), etag, card_cache_control)
+
     if 'RENDERTRON_URL' not in os.environ:
         return 'Rendertron url not set on server', 500
 
@@ -205,9 +306,9 @@ def game_card_png(key: str):
         os.environ['RENDERTRON_URL'],
         'screenshot/',
         url_for('overwatch.game.game_card', key=key, _external=True),
-        f'?width={min(int(request.args.get("width", 356)), 512)}',
-        f'&height={min(int(request.args.get("height", 80)), 512)}',
-        f'&_cachebust={request.args.get("_cachebust", "")}'
+        f'?width={width}',
+        f'&height={height}',
+        f'&_cachebust={cachebust}'
     ))
     try:
         r = requests.get(
@@ -223,9 +324,17 @@ def game_card_png(key: str):
         logger.exception('Rendertron encountered an error fetching screenshot')
         return f'Rendertron encountered an error fetching screenshot: got status {r.status_code}', 500
 
-    return Response(
-        r.content,
-        headers=dict(r.headers)
+    # stored like a locally rendered card, so Rendertron is only asked for each size of each version of the card once
+    if r.headers.get('Content-Type', '').startswith('image/png'):
+        card_images.put('overwatch', key, card_version, r.content, (width, height))
+
+    return cached_response(
+        Response(
+            r.content,
+            headers=dict(r.headers)
+        ),
+        etag,
+        card_cache_control
     )
 
 
@@ -249,9 +358,13 @@ def edit_game():
     if 'delete' in request.form:
         logger.warning(f'Deleting {summary.key!r}')
         summary.delete()
+        page_cache.invalidate(summary.key)
+        hero_stats_aggregates.invalidate(summary.user_id, summary.season)
         return redirect(url_for('overwatch.games_list.games_list'), code=303)
 
     summary.edited = True
+    # the hero stats are split by game type and count wins/losses, so are out of date if either changes
+    previous_hero_stats_fields = summary.result, summary.game_type
 
     summary.start_sr = int(request.form['start-sr']) if request.form['start-sr'] else None
     summary.end_sr = int(request.form['end-sr']) if request.form['end-sr'] else None
@@ -285,7 +398,8 @@ def edit_game():
     logger.info(f'Saving game: {summary}')
     summary.save()
 
-    game, metadata = load_game(summary)
+    # load a private copy, so that if storing the edited game fails the cached game is left as it was
+    game, metadata = load_game(summary, cache=None)
     game.start_sr = summary.start_sr
     game.end_sr = summary.end_sr
     game.result = summary.result
@@ -298,14 +412,17 @@ def edit_game():
         game.competitive = False
 
     metadata['edited'] = 'True'
-    s3.put_object(
-        Bucket=GAMES_BUCKET,
-        Key=game.key + '.json',
-        Body=json.dumps(referenced_typedload.dump(game), indent=1).encode(),
-        ACL='public-read',
-        ContentType='application/json',
-        Metadata=metadata
+    store_game_data(
+        s3,
+        GAMES_BUCKET,
+        game.key + '.json',
+        dump_dataclass(game, referenced_typedload.dump),
+        metadata,
     )
+    invalidate_game(game_cache, GAMES_BUCKET, game.key + '.json')
+    page_cache.invalidate(summary.key)
+    if (summary.result, summary.game_type) != previous_hero_stats_fields:
+        hero_stats_aggregates.invalidate(summary.user_id, summary.season)
 
     if request.form['source'] == 'games_list':
         return redirect(url_for('overwatch.games_list.games_list'), code=303)
@@ -361,8 +478,77 @@ def context_processor():
 
 # ----- Template Variables: Player Stats -----
 
+# the stats shown in overwatch/game/player_stats/player_stats_row.html
+PLAYER_STAT_FIELDS = [
+    'eliminations.during_fights',
+    'deaths.during_fights',
+    'killfeed_assists.during_fights',
+    'elimination_assists.during_fights',
+    'first_kills',
+    'first_deaths',
+    'ults.during_fights',
+    'times_staggered',
+    'fight_starts_missed',
+    'eliminations.outside_fights',
+    'deaths.outside_fights',
+    'killfeed_assists.outside_fights',
+    'ults.outside_fights',
+    'first_kill_fights_won',
+]
+
+
+@dataclass
+class StatRange:
+    values: List[float]
+    min: float
+    max: float
+
+
+class StatRanges:
+    """
+    The values, min and max of each stat across the players (or teams) of a game, used by process_stat to decide how to
+    display a stat relative to the rest of the game.
+
+    Built once per game instead of walking every player for each stat that is displayed.
+    """
+
+    def __init__(self, game: OverwatchGame, fields: Iterable[str] = ()):
+        self.game = game
+        self._ranges: Dict[Tuple[str, bool], Optional[StatRange]] = {}
+        for field in fields:
+            for category in ['player', 'team']:
+                try:
+                    self.get(field, category)
+                except (AttributeError, IndexError):
+                    # game is missing players/teamfights - leave the error to be raised where the stat is used
+                    pass
+
+    def get(self, field: str, category: str) -> Optional[StatRange]:
+        key = field, category == 'player'
+        if key not in self._ranges:
+            values = [
+                x for x in (build_attr(x, field) for x in self._all_stats(category == 'player'))
+                if x is not None
+            ]
+            self._ranges[key] = StatRange(values, min(values), max(values)) if values else None
+        return self._ranges[key]
+
+    def _all_stats(self, players: bool) -> List:
+        if players:
+            return [x.stats for x in self.game.teams.blue + self.game.teams.red]
+        else:
+            return [self.game.teamfights.team_stats[0], self.game.teamfights.team_stats[1]]
+
+
+def build_attr(stats, field: str):
+    try:
+        return reduce(getattr, field.split('.'), stats)
+    except AttributeError:
+        return None
+
+
 def process_stat(
-    game: OverwatchGame,
+    stat_ranges: StatRanges,
     stats: PlayerStats,
     stat_totals: Dict[str, int],
     field: str,
@@ -371,27 +557,6 @@ def process_stat(
     view: str,
     percent: bool = False,
 ) -> Tuple[str, str]:
-    def build_attr(stats, field):
-        parts = field.split('.')
-        try:
-            return reduce(getattr, parts, stats)
-        except AttributeError:
-            return None
-
-    def for_attr(field: str) -> Iterable[int]:
-        if category == 'player':
-            blue = game.teams.blue
-            red = game.teams.red
-            all_stats = [x.stats for x in blue + red]
-        else:
-            blue = game.teamfights.team_stats[0]
-            red = game.teamfights.team_stats[1]
-            all_stats = [blue, red]
-        return [
-            x for x in (build_attr(x, field) for x in all_stats)
-            if x is not None
-        ]
-
     stat = build_attr(stats, field)
     if stat is None:
         return 'stat-below-threshold', ''
@@ -421,12 +586,11 @@ def process_stat(
     except ZeroDivisionError:
         return 'stat-below-threshold', ''
 
-    values = for_attr(field)
-    if not values:
-        values = [stat]
-
-    min_val = min(values)
-    max_val = max(values)
+    stat_range = stat_ranges.get(field, category)
+    if stat_range:
+        min_val, max_val = stat_range.min, stat_range.max
+    else:
+        min_val = max_val = stat
     if min_val == 0:
         threshold = max_val - min_val > max_val / 2 > 1
     else:
@@ -579,23 +743,58 @@ def hero_name(h: str):
 
 # ----- Utility Functions -----
 
-def load_game(summary: OverwatchGameSummary) -> Tuple[OverwatchGame, Dict]:
-    try:
-        game_object = s3.get_object(
-            Bucket=GAMES_BUCKET,
-            Key=summary.key + '.json'
-        )
-        game_data = json.loads(game_object['Body'].read())
-        metadata = game_object['Metadata']
-    except:
-        if s3:
-            logger.exception('Failed to fetch game data from S3 - trying HTTP')
-        r = requests.get(f'https://overtrack-overwatch-games.s3.amazonaws.com/{summary.key}.json')
-        r.raise_for_status()
-        game_data = r.json()
-        metadata = {}
+def load_game(summary: OverwatchGameSummary, cache: Optional[GameCache] = game_cache) -> Tuple[OverwatchGame, Dict]:
+    """
+    Load a game as a LazyDataclass - the game is kept as the JSON text of each top level field, and only loaded when it
+    is first used. Simple fields (key, result, SR...) are loaded on their own, so routes that only need those (e.g.
+    editing the game) don't pay for loading all of it, but the sections that can share objects are loaded together.
+
+    Games loaded through `cache` are shared with other requests and must not be modified - use cache=None to load a
+    private copy.
+    """
+    def with_timestamp(game: OverwatchGame) -> OverwatchGame:
+        game.timestamp = summary.time
+        return game
+
+    return load_game_data(
+        s3,
+        GAMES_BUCKET,
+        summary.key + '.json',
+        lambda game_data: with_timestamp(LazyDataclass(OverwatchGame, game_data, load_section)),
+        cache=cache,
+        stream_decode=lambda body: with_timestamp(load_lazy_streaming(body, OverwatchGame, load_section)),
+    )
+
+def game_meta(summary: OverwatchGameSummary, title: str, colour: str) -> Meta:
+    imagehash = get_game_version(summary)
+    image_url = url_for('overwatch.game.game_card_png', key=summary.key, _external=True)
+    return Meta(
+        title=title,
+        image_url=image_url + f'?_cachebust={imagehash}',
+        twitter_image_url=image_url + f'?height=190&_cachebust={imagehash}',
+        summary_large_image=True,
+        colour=colour,
+    )
+
+def get_game_version(summary: OverwatchGameSummary) -> str:
+    """
+    Version of the parts of a game that can change (by editing it), used to build the ETags of its page and card.
+    """
+    return make_etag(
+        summary.key,
+        summary.result,
+        summary.start_sr,
+        summary.end_sr,
+        summary.game_type,
+        summary.rank,
+        summary.edited,
+    )
+
+def game_page_etag(game_version: str, viewer: Optional[int]) -> str:
+    return make_etag(game_version, viewer, app_version())
 
-    return referenced_typedload.load(game_data, OverwatchGame), metadata
+def game_card_etag(game_version: str) -> str:
+    return make_etag(game_version, 'card', app_version())
 
 def get_dev_info(summary, game, metatada):
     if check_authentication() is not None or not session.user.superuser:
@@ -653,7 +852,7 @@ def get_dev_info(summary, game, metatada):
     extras = {
         'metadata': metatada.items(),
     }
-    for f in fields(game):
+    for f in fields(OverwatchGame):
         if f.name == 'images':
             game_dict['images'] = ''
             for image in game.images:
@@ -21,7 +21,7 @@ from overtrack_web.data.overwatch_data import Season
 from overtrack_web.lib import b64_decode, b64_encode, FlaskResponse, check_superuser, parse_args, hopeful_int
 from overtrack_web.lib.authentication import check_authentication, require_login
 from overtrack_web.lib.decorators import restrict_origin
-from overtrack_web.lib.session import session
+from overtrack_web.lib.session import refresh_user, save_user, session
 from overtrack_web.views.overwatch import sr_change
 
 PAGINATION_PAGE_MINIMUM_SIZE = 40
@@ -235,9 +235,9 @@ def share_links() -> FlaskResponse:
             include_quickplay=request.form.get('include_quickplay', 'off') == 'on'
         )
         logger.info(f'Created {new_settings}')
-        session.user.refresh()
+        refresh_user(session.user, max_age=0)
         session.user.overwatch_games_public = new_settings
-        session.user.save()
+        save_user(session.user)
 
     if session.user.overwatch_games_public and session.user.overwatch_games_public.accounts:
         account_names = list(session.user.overwatch_games_public.accounts)
@@ -362,7 +362,7 @@ def resolve_share_key(sharekey: str) -> Tuple[Optional[User], Optional[Overwatch
 
 
 def render_games_list(user: User, share_settings: Optional[OverwatchShareSettings] = None, **next_args: str) -> FlaskResponse:
-    user.refresh()
+    refresh_user(user)
 
     if not user.overwatch_games:
         logger.info(f'User {user.username} has no games')
@@ -465,7 +465,7 @@ def get_sessions(
         season = overwatch_data.seasons[user.overwatch_last_season]
         logger.info(f'Using season={season.index} from user.overwatch_last_season')
     else:
-        season = overwatch_data.current_season
+        season = overwatch_data.get_current_season()
         logger.info(f'Using season={season.index} from current_season')
 
     # Use include_quickplay from {share settings, specified season, cookie} in that order, defaulting to True if not set in any
@@ -575,9 +575,10 @@ def get_all_account_names(user: User, minimum_games=5, _cache={}) -> List[str]:
         return []
 
     # if the first game is the same as the last time we checked, then no new accounts could have been added
-    if _cache.get(user.user_id, (None, None))[0] == latest_game.key:
+    cache_key = user.user_id, minimum_games
+    if _cache.get(cache_key, (None, None))[0] == latest_game.key:
         logger.info(f'Got accounts from cache where user={user.user_id}, latest_game={latest_game.key!r}')
-        return _cache[user.user_id][1]
+        return _cache[cache_key][1]
 
     # Automatically include the latest game for new users
     account_names_with_minimum_games = [latest_game.player_name]
@@ -617,6 +618,6 @@ def get_all_account_names(user: User, minimum_games=5, _cache={}) -> List[str]:
         logger.error(f'Stopping account name search early - limit reached')
 
     logger.info(f'Caching account names for  user={user.user_id}, latest_game={latest_game.key!r}')
-    _cache[user.user_id] = (latest_game.key, account_names_with_minimum_games)
+    _cache[cache_key] = (latest_game.key, account_names_with_minimum_games)
 
     return account_names_with_minimum_games
@@ -1,23 +1,50 @@
+import json
 import logging
-from collections import Counter, defaultdict
-from pprint import pprint
-from typing import Optional, Dict, List, Tuple
+import os
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Dict, List, Tuple
+from urllib.parse import quote
 
+import boto3
 import time
-from dataclasses import dataclass
-from flask import Blueprint, render_template, request
+from dataclasses import asdict, dataclass
+from flask import Blueprint, make_response, render_template, request
 
 from overtrack_models.orm.overwatch_game_summary import OverwatchGameSummary
 from overtrack_models.orm.overwatch_hero_stats import OverwatchHeroStats
 from overtrack_models.orm.user import User
 from overtrack_web.data import overwatch_data
 from overtrack_web.data.overwatch_data import hero_colors
+from overtrack_web.lib import metrics
 from overtrack_web.lib.authentication import require_login
 from overtrack_web.lib.context_processors import s2ts
 from overtrack_web.lib.session import session
+from overtrack_web.views.overwatch.games_list import get_all_account_names
+
+# S3 location of the materialised hero stats - if no bucket is set every page view folds all of the season's stats
+HERO_STATS_AGGREGATE_BUCKET = os.environ.get('HERO_STATS_AGGREGATE_BUCKET', '')
+HERO_STATS_AGGREGATE_PREFIX = os.environ.get('HERO_STATS_AGGREGATE_PREFIX', 'hero_stats/')
+# games more recent than this are folded on every view instead of being materialised, since they may still be arriving
+# (games are ingested some time after they are played, and folded by when they were played)
+HERO_STATS_SETTLE_TIME = float(os.environ.get('HERO_STATS_SETTLE_TIME', 24 * 60 * 60))
+# aggregates are rebuilt from all of the season's games once they are this old, to pick up games ingested after they
+# had settled
+HERO_STATS_REBUILD_AGE = float(os.environ.get('HERO_STATS_REBUILD_AGE', 7 * 24 * 60 * 60))
+# aggregates stored with a different version are rebuilt
+# 2: hero specific stats are summed over the union of keys
+# 3: accounts are no longer collected
+# 4: when the aggregate was built is stored
+HERO_STATS_AGGREGATE_VERSION = 4
+
+MODES = ['all', 'competitive', 'quickplay', 'custom']
 
 logger = logging.getLogger(__name__)
 
+# the hero stats and games queries (and the account names) for a page are run concurrently on this pool
+HERO_STATS_WORKERS = int(os.environ.get('HERO_STATS_WORKERS', 8))
+hero_stats_pool = ThreadPoolExecutor(max_workers=HERO_STATS_WORKERS, thread_name_prefix='hero_stats')
+
 hero_stats_blueprint = Blueprint('overwatch.hero_stats', __name__)
 
 
@@ -177,7 +204,7 @@ class OverwatchCollectedHeroStats:
             if self.hero_specific_stats and other.hero_specific_stats:
                 hero_specific_stats = {
                     k: self.hero_specific_stats.get(k, 0) + other.hero_specific_stats.get(k, 0)
-                    for k in self.hero_specific_stats
+                    for k in [*self.hero_specific_stats, *(k for k in other.hero_specific_stats if k not in self.hero_specific_stats)]
                 }
             else:
                 hero_specific_stats = self.hero_specific_stats or other.hero_specific_stats
@@ -204,6 +231,16 @@ class OverwatchCollectedHeroStats:
             hero_specific_stats=hero_specific_stats,
         )
 
+    def merge(self, other: 'OverwatchCollectedHeroStats') -> 'OverwatchCollectedHeroStats':
+        """
+        Combine with the stats collected from other games, including the base stats (which __add__ leaves out).
+        """
+        merged = self + other
+        merged.games = self.games + other.games
+        merged.wins = self.wins + other.wins
+        merged.time_selected = self.time_selected + other.time_selected
+        return merged
+
     def add_base_stats(self, game: OverwatchGameSummary, role: bool = False, hero: str = None):
         if role:
             duration = game.duration
@@ -216,25 +253,245 @@ class OverwatchCollectedHeroStats:
         self.time_selected += duration
 
 
-def render_results(user: User):
-    if user.overwatch_last_season is None:
-        return render_template('client.html', no_games_alert=True)
+class HeroStatsAccumulator:
+    """
+    Sums hero stats rows and games into columns - an array per stat, indexed by hero - instead of folding each row into a
+    new OverwatchCollectedHeroStats, and builds the OverwatchCollectedHeroStats for each hero once at the end.
+
+    Hero specific stats are summed over every key seen for the hero.
+    """
+
+    def __init__(self, include_hero_stats: bool, endgame_only: bool):
+        self.include_hero_stats = include_hero_stats
+        self.endgame_only = endgame_only
+
+        # hero -> row
+        self.rows: Dict[str, int] = {}
+
+        self.games = array('d')
+        self.wins = array('d')
+        self.time_selected = array('d')
+
+        self.time_active = array('d')
+        self.games_with_stats = array('d')
+        self.wins_with_stats = array('d')
+        self.eliminations = array('d')
+        self.objective_kills = array('d')
+        self.objective_time = array('d')
+        self.hero_damage_done = array('d')
+        self.healing_done = array('d')
+        self.deaths = array('d')
+        self.final_blows = array('d')
+
+        self._columns = [
+            self.games, self.wins, self.time_selected,
+            self.time_active, self.games_with_stats, self.wins_with_stats, self.eliminations, self.objective_kills,
+            self.objective_time, self.hero_damage_done, self.healing_done, self.deaths, self.final_blows,
+        ]
 
-    has_season = 'season' in request.args
-    has_account = 'account' in request.args
-    has_mode = 'mode' in request.args
-    has_complete_only = 'complete_only' in request.args
+        # for each row, hero specific stat -> index in specific_values
+        self.specific_keys: List[Dict[str, int]] = []
+        self.specific_values = array('d')
+
+    def row(self, hero: str) -> int:
+        row = self.rows.get(hero)
+        if row is None:
+            row = self.rows[hero] = len(self.rows)
+            for column in self._columns:
+                column.append(0)
+            self.specific_keys.append({})
+        return row
+
+    def update(self, other: 'HeroStatsAccumulator') -> None:
+        """
+        Add everything summed by `other`.
+        """
+        for name, other_row in other.rows.items():
+            row = self.row(name)
+            for column, other_column in zip(self._columns, other._columns):
+                column[row] += other_column[other_row]
+            if self.include_hero_stats:
+                keys = self.specific_keys[row]
+                for k, other_i in other.specific_keys[other_row].items():
+                    i = keys.get(k)
+                    if i is None:
+                        i = keys[k] = len(self.specific_values)
+                        self.specific_values.append(0)
+                    self.specific_values[i] += other.specific_values[other_i]
+
+    def add_stat(self, stat: OverwatchHeroStats) -> None:
+        if self.endgame_only:
+            assert stat.from_endgame
+        row = self.row(stat.hero)
+
+        self.time_active[row] += stat.time_played
+        self.games_with_stats[row] += 1
+        self.wins_with_stats[row] += stat.game_result in ['WIN', 'VICTORY']
+        self.eliminations[row] += stat.eliminations
+        self.objective_kills[row] += stat.objective_kills
+        self.objective_time[row] += stat.objective_time
+        self.hero_damage_done[row] += stat.hero_damage_done
+        self.healing_done[row] += stat.healing_done
+        self.deaths[row] += stat.deaths
+        self.final_blows[row] += stat.final_blows or 0
+
+        if self.include_hero_stats and stat.hero_specific_stats:
+            keys = self.specific_keys[row]
+            values = self.specific_values
+            for k, v in stat.hero_specific_stats.items():
+                i = keys.get(k)
+                if i is None:
+                    i = keys[k] = len(values)
+                    values.append(0)
+                values[i] += v
+
+    def add_game(self, name: str, game: OverwatchGameSummary, share: float = 1) -> None:
+        """
+        Add the base stats of `game` to `name` (a role, or a hero played for `share` of the game).
+        """
+        row = self.row(name)
+        self.games[row] += share
+        self.wins[row] += (game.result in ['WIN', 'VICTORY']) * share
+        self.time_selected[row] += game.duration * share
+
+    def results(self) -> Dict[str, OverwatchCollectedHeroStats]:
+        results = {}
+        for name, row in self.rows.items():
+            specific_keys = self.specific_keys[row]
+            results[name] = OverwatchCollectedHeroStats(
+                include_hero_stats=self.include_hero_stats,
+                endgame_only=self.endgame_only,
+
+                name=name,
+
+                games=self.games[row],
+                wins=self.wins[row],
+                time_selected=self.time_selected[row],
+
+                games_with_stats=int(self.games_with_stats[row]),
+                wins_with_stats=int(self.wins_with_stats[row]),
+                time_active=self.time_active[row],
+                eliminations=self.eliminations[row],
+                objective_kills=self.objective_kills[row],
+                objective_time=self.objective_time[row],
+                hero_damage_done=self.hero_damage_done[row],
+                healing_done=self.healing_done[row],
+                deaths=self.deaths[row],
+                final_blows=self.final_blows[row],
+
+                hero_specific_stats={
+                    k: self.specific_values[i] for k, i in specific_keys.items()
+                } if specific_keys else None,
+            )
+        return results
 
-    season_id = int(request.args.get('season', user.overwatch_last_season))
-    account = request.args.get('account', None)
-    mode = request.args.get('mode', 'competitive')
-    complete_only = request.args.get('complete_only', 'true') == 'true'
+
+@dataclass
+class CollectedStats:
+    """
+    The hero and role stats of a user's games in a season, folded from the games (and their hero stats) up to `until`.
+    `built` is when the fold of the oldest games it includes was done.
+    """
+    until: float
+    built: float
+    hero_stats: Dict[str, OverwatchCollectedHeroStats]
+    role_stats: Dict[str, OverwatchCollectedHeroStats]
+
+    def merge(self, other: 'CollectedStats') -> 'CollectedStats':
+        def merge_stats(a: Dict[str, OverwatchCollectedHeroStats], b: Dict[str, OverwatchCollectedHeroStats]):
+            return {
+                name: a[name].merge(b[name]) if name in a and name in b else a.get(name) or b[name]
+                for name in [*a, *[n for n in b if n not in a]]
+            }
+
+        return CollectedStats(
+            until=max(self.until, other.until),
+            built=min(self.built, other.built),
+            hero_stats=merge_stats(self.hero_stats, other.hero_stats),
+            role_stats=merge_stats(self.role_stats, other.role_stats),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': HERO_STATS_AGGREGATE_VERSION,
+            'until': self.until,
+            'built': self.built,
+            'hero_stats': {name: asdict(stat) for name, stat in self.hero_stats.items()},
+            'role_stats': {name: asdict(stat) for name, stat in self.role_stats.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CollectedStats':
+        return cls(
+            until=data['until'],
+            built=data['built'],
+            hero_stats={name: OverwatchCollectedHeroStats(**stat) for name, stat in data['hero_stats'].items()},
+            role_stats={name: OverwatchCollectedHeroStats(**stat) for name, stat in data['role_stats'].items()},
+        )
+
+
+def _add_time(timings: Optional[Dict[str, float]], name: str, seconds: float) -> None:
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + seconds
+
+
+def _fold_hero_stats(query, since: Optional[float], complete_only: bool) -> Tuple[HeroStatsAccumulator, float, float]:
+    t0 = time.perf_counter()
+    stats = list(query)
+    query_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hero_stats = HeroStatsAccumulator(include_hero_stats=True, endgame_only=complete_only)
+    for stat in stats:
+        # between() includes `since`, which was already included in the stats this is being merged into
+        if since is not None and stat.timestamp <= since:
+            continue
+        hero_stats.add_stat(stat)
+    return hero_stats, query_time, time.perf_counter() - t0
+
+
+def _fold_games(query, since: Optional[float], complete_only: bool) -> Tuple[Tuple[HeroStatsAccumulator, HeroStatsAccumulator], float, float]:
+    t0 = time.perf_counter()
+    games = list(query)
+    query_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    role_stats = HeroStatsAccumulator(include_hero_stats=False, endgame_only=complete_only)
+    hero_stats = HeroStatsAccumulator(include_hero_stats=True, endgame_only=complete_only)
+    for g in games:
+        if since is not None and g.time <= since:
+            continue
+        role_stats.add_game(g.role, g)
+        heroes_played = dict(g.heroes_played)
+        for h, f in g.heroes_played:
+            if f > 0.25:
+                hero_stats.add_game(h, g, share=heroes_played[h])
+    return (role_stats, hero_stats), query_time, time.perf_counter() - t0
+
+
+def collect_stats(
+        user_id: int,
+        season_id: int,
+        mode: str,
+        account: Optional[str],
+        complete_only: bool,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        timings: Optional[Dict[str, float]] = None) -> CollectedStats:
+    """
+    Fold the user's hero stats and games in the season, optionally only those after `since` and up to `until`.
+    The time spent on each query and fold is added to `timings`.
+    """
+    built = time.time()
+    season = overwatch_data.seasons[season_id]
+    start = season.start if since is None else since
+    end = season.end if until is None else until
 
     games_condition = (OverwatchGameSummary.season == season_id) & (OverwatchGameSummary.role.is_in('tank', 'damage', 'support'))
     stats_condition = (OverwatchHeroStats.season == season_id) & (OverwatchHeroStats.hero != 'all heroes')
 
     if account:
-        # Don't filter games_condition, since we need it to know the player names
+        games_condition &= OverwatchGameSummary.player_name == account
         stats_condition &= OverwatchHeroStats.account == account
 
     # Only include custom stats if mode is explicitly custom
@@ -252,46 +509,24 @@ def render_results(user: User):
             games_condition &= OverwatchGameSummary.game_type == 'quickplay'
             stats_condition &= OverwatchHeroStats.competitive == False
         else:
-            return 'Unknown mode', 400
+            raise ValueError(f'Unknown mode {mode!r}')
 
     if complete_only:
         stats_condition &= OverwatchHeroStats.from_endgame == True
 
-    seasons = [
-        s for i, s in overwatch_data.seasons.items() if i in user.overwatch_seasons
-    ]
-    seasons.sort(key=lambda s: s.start, reverse=True)
-
-    hero_stats = defaultdict(lambda: OverwatchCollectedHeroStats(include_hero_stats=True, endgame_only=complete_only))
-
-    logger.info(f'Fetching hero stats for user_id {user.user_id} for season {season_id} with filter {stats_condition}')
-    query = OverwatchHeroStats.user_id_timestamp_index.query(
-        user.user_id,
-        OverwatchHeroStats.timestamp.between(
-            overwatch_data.seasons[season_id].start,
-            overwatch_data.seasons[season_id].end
-        ),
+    logger.info(f'Fetching hero stats for user_id {user_id} for season {season_id} with filter {stats_condition}')
+    stats_query = OverwatchHeroStats.user_id_timestamp_index.query(
+        user_id,
+        OverwatchHeroStats.timestamp.between(start, end),
         stats_condition,
     )
-    t0 = time.perf_counter()
-    for stat in query:
-        hero_stats[stat.hero] += stat
-    logger.info(f'Fetched {query.total_count} items in {(time.perf_counter() - t0) * 1000:.2f}ms')
-    pprint(hero_stats)
-
-    accounts = Counter()  # FIXME: account lists will not be populated when viewing a single account
-    role_stats = defaultdict(lambda: OverwatchCollectedHeroStats(include_hero_stats=False, endgame_only=complete_only))
-
-    logger.info(f'Fetching games for user_id {user.user_id} for season {season_id} with filter {games_condition}')
-    t0 = time.perf_counter()
-    query = OverwatchGameSummary.user_id_time_index.query(
-        user.user_id,
-        OverwatchGameSummary.time.between(
-            overwatch_data.seasons[season_id].start,
-            overwatch_data.seasons[season_id].end
-        ),
+    logger.info(f'Fetching games for user_id {user_id} for season {season_id} with filter {games_condition}')
+    games_query = OverwatchGameSummary.user_id_time_index.query(
+        user_id,
+        OverwatchGameSummary.time.between(start, end),
         games_condition,
         attributes_to_get=[
+            OverwatchGameSummary.time,
             OverwatchGameSummary.role,
             OverwatchGameSummary.result,
             OverwatchGameSummary.duration,
@@ -299,21 +534,200 @@ def render_results(user: User):
             OverwatchGameSummary.player_name,
         ]
     )
-    for g in query:
-        if not account or g.player_name == account:
-            role_stats[g.role].add_base_stats(g, role=True)
-            for h, f in g.heroes_played:
-                if f > 0.25:
-                    hero_stats[h].add_base_stats(g, hero=h)
-        accounts[g.player_name] += 1
-    logger.info(f'Fetched {query.total_count} items in {(time.perf_counter() - t0) * 1000:.2f}ms')
-    pprint(role_stats)
-
-    for name, stat in hero_stats.items():
-        stat.name = name
-
-    for name, stat in role_stats.items():
-        stat.name = name
+
+    # the queries are independent, so wait for both together rather than one after the other
+    stats_future = hero_stats_pool.submit(_fold_hero_stats, stats_query, since, complete_only)
+    games_future = hero_stats_pool.submit(_fold_games, games_query, since, complete_only)
+    hero_stats, stats_query_time, stats_fold_time = stats_future.result()
+    (role_stats, hero_games), games_query_time, games_fold_time = games_future.result()
+    logger.info(
+        f'Fetched {stats_query.total_count} hero stats in {stats_query_time * 1000:.2f}ms '
+        f'(folded in {stats_fold_time * 1000:.2f}ms), '
+        f'{games_query.total_count} games in {games_query_time * 1000:.2f}ms '
+        f'(folded in {games_fold_time * 1000:.2f}ms)'
+    )
+    _add_time(timings, 'hero_stats_query', stats_query_time)
+    _add_time(timings, 'hero_stats_fold', stats_fold_time)
+    _add_time(timings, 'games_query', games_query_time)
+    _add_time(timings, 'games_fold', games_fold_time)
+
+    hero_stats.update(hero_games)
+    return CollectedStats(
+        until=end,
+        built=built,
+        hero_stats=hero_stats.results(),
+        role_stats=role_stats.results(),
+    )
+
+
+class HeroStatsAggregates:
+    """
+    Materialised CollectedStats for each user, season, mode, account and complete_only, stored in S3 so that viewing the
+    hero stats only has to fold the games played since the aggregate was last updated.
+
+    Aggregates are brought up to date when they are read: games older than `settle_time` are folded into the stored
+    aggregate, and more recent games are folded on each read without being stored, so that games which are still being
+    processed aren't missed. Games are folded by when they were played, so one ingested after it had settled is only
+    included once the aggregate is rebuilt, which happens when it is older than `rebuild_age`. Editing or deleting a game
+    invalidates the aggregates for its season. scripts/hero_stats_aggregates rebuilds aggregates and checks them against
+    a full fold.
+    """
+
+    def __init__(
+            self,
+            s3=None,
+            bucket: str = '',
+            prefix: str = '',
+            settle_time: float = HERO_STATS_SETTLE_TIME,
+            rebuild_age: float = HERO_STATS_REBUILD_AGE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.settle_time = settle_time
+        self.rebuild_age = rebuild_age
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.s3 and self.bucket)
+
+    def key(self, user_id: int, season_id: int, mode: str, account: Optional[str], complete_only: bool) -> str:
+        account_key = quote(account, safe='') if account else '_all'
+        return f'{self.prefix}{user_id}/{season_id}/{mode}/{account_key}/{"complete" if complete_only else "any"}.json'
+
+    def get(
+            self,
+            user_id: int,
+            season_id: int,
+            mode: str,
+            account: Optional[str],
+            complete_only: bool,
+            timings: Optional[Dict[str, float]] = None) -> CollectedStats:
+        if not self.enabled:
+            return collect_stats(user_id, season_id, mode, account, complete_only, timings=timings)
+
+        settled = self._settled(season_id)
+        t0 = time.perf_counter()
+        stats = self.load(user_id, season_id, mode, account, complete_only)
+        _add_time(timings, 'aggregate_load', time.perf_counter() - t0)
+        if stats is None or time.time() - stats.built > self.rebuild_age:
+            metrics.record('hero_stats.aggregate.miss' if stats is None else 'hero_stats.aggregate.rebuild')
+            stats = collect_stats(user_id, season_id, mode, account, complete_only, until=settled, timings=timings)
+            self._timed_save(user_id, season_id, mode, account, complete_only, stats, timings)
+        elif stats.until < settled:
+            metrics.record('hero_stats.aggregate.update')
+            stats = stats.merge(collect_stats(
+                user_id, season_id, mode, account, complete_only, since=stats.until, until=settled, timings=timings
+            ))
+            self._timed_save(user_id, season_id, mode, account, complete_only, stats, timings)
+        else:
+            metrics.record('hero_stats.aggregate.hit')
+
+        if settled < overwatch_data.seasons[season_id].end:
+            stats = stats.merge(collect_stats(user_id, season_id, mode, account, complete_only, since=settled, timings=timings))
+        return stats
+
+    def rebuild(self, user_id: int, season_id: int, mode: str, account: Optional[str], complete_only: bool) -> CollectedStats:
+        stats = collect_stats(user_id, season_id, mode, account, complete_only, until=self._settled(season_id))
+        self.save(user_id, season_id, mode, account, complete_only, stats)
+        return stats
+
+    def load(self, user_id: int, season_id: int, mode: str, account: Optional[str], complete_only: bool) -> Optional[CollectedStats]:
+        key = self.key(user_id, season_id, mode, account, complete_only)
+        try:
+            data = json.load(self.s3.get_object(Bucket=self.bucket, Key=key)['Body'])
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        except:
+            logger.exception(f'Failed to load hero stats aggregate from s3://{self.bucket}/{key}')
+            return None
+        if data.get('version') != HERO_STATS_AGGREGATE_VERSION:
+            logger.info(f'Hero stats aggregate s3://{self.bucket}/{key} has version {data.get("version")} - rebuilding')
+            return None
+        return CollectedStats.from_dict(data)
+
+    def save(self, user_id: int, season_id: int, mode: str, account: Optional[str], complete_only: bool, stats: CollectedStats) -> None:
+        key = self.key(user_id, season_id, mode, account, complete_only)
+        try:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=json.dumps(stats.to_dict()).encode(),
+                ContentType='application/json',
+            )
+        except:
+            logger.exception(f'Failed to save hero stats aggregate to s3://{self.bucket}/{key}')
+
+    def invalidate(self, user_id: int, season_id: int) -> None:
+        """
+        Delete the user's aggregates for the season (for every mode, account and complete_only), so that they are
+        rebuilt when next read.
+        """
+        if not self.enabled:
+            return
+        prefix = f'{self.prefix}{user_id}/{season_id}/'
+        try:
+            for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+                keys = [{'Key': o['Key']} for o in page.get('Contents', [])]
+                if keys:
+                    self.s3.delete_objects(Bucket=self.bucket, Delete={'Objects': keys, 'Quiet': True})
+        except:
+            logger.exception(f'Failed to invalidate hero stats aggregates under s3://{self.bucket}/{prefix}')
+
+    def _timed_save(self, user_id: int, season_id: int, mode: str, account: Optional[str], complete_only: bool, stats: CollectedStats, timings: Optional[Dict[str, float]]) -> None:
+        t0 = time.perf_counter()
+        self.save(user_id, season_id, mode, account, complete_only, stats)
+        _add_time(timings, 'aggregate_save', time.perf_counter() - t0)
+
+    def _settled(self, season_id: int) -> float:
+        season = overwatch_data.seasons[season_id]
+        return max(season.start, min(season.end, time.time() - self.settle_time))
+
+
+try:
+    s3 = boto3.client('s3') if HERO_STATS_AGGREGATE_BUCKET else None
+except:
+    logger.exception('Failed to create AWS S3 client - not materialising hero stats')
+    s3 = None
+aggregates = HeroStatsAggregates(s3, HERO_STATS_AGGREGATE_BUCKET, HERO_STATS_AGGREGATE_PREFIX)
+
+
+def render_results(user: User):
+    if user.overwatch_last_season is None:
+        return render_template('client.html', no_games_alert=True)
+
+    has_season = 'season' in request.args
+    has_account = 'account' in request.args
+    has_mode = 'mode' in request.args
+    has_complete_only = 'complete_only' in request.args
+
+    season_id = int(request.args.get('season', user.overwatch_last_season))
+    account = request.args.get('account', None)
+    mode = request.args.get('mode', 'competitive')
+    complete_only = request.args.get('complete_only', 'true') == 'true'
+
+    if mode not in MODES:
+        return 'Unknown mode', 400
+
+    seasons = [
+        s for i, s in overwatch_data.seasons.items() if i in user.overwatch_seasons
+    ]
+    seasons.sort(key=lambda s: s.start, reverse=True)
+
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+    # every account with games, as when the accounts were collected from the games (not just those with enough games to
+    # be worth sharing)
+    account_names = hero_stats_pool.submit(get_all_account_names, user, minimum_games=1)
+    stats = aggregates.get(user.user_id, season_id, mode, account, complete_only, timings=timings)
+    timings['collect'] = time.perf_counter() - t0
+    accounts = account_names.result()
+    timings['total'] = time.perf_counter() - t0
+
+    logger.info(f'Collected hero stats: {", ".join(f"{k}={v * 1000:.2f}ms" for k, v in timings.items())}')
+    for name, seconds in timings.items():
+        metrics.record(f'hero_stats.{name}_time', value=seconds, unit='seconds')
+    hero_stats = stats.hero_stats
+    role_stats = stats.role_stats
 
     hero_stats_by_playtime = sorted(
         hero_stats.values(),
@@ -376,9 +790,11 @@ def render_results(user: User):
             f'complete_only={str(new_complete_only).lower()}',
         ] if x)
 
-    accounts_list = ['All Accounts', *accounts.keys()]
+    accounts_list = ['All Accounts', *accounts]
+    if account and account not in accounts:
+        accounts_list.append(account)
 
-    return render_template(
+    response = make_response(render_template(
         'overwatch/hero_stats/hero_stats.html',
         seasons=seasons,
         current_season=overwatch_data.seasons[season_id],
@@ -395,7 +811,9 @@ def render_results(user: User):
         },
         roles=role_stats,
         heroes=hero_stats_by_playtime
-    )
+    ))
+    response.headers['Server-Timing'] = ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items())
+    return response
 
 
 @hero_stats_blueprint.route('/')
@@ -13,7 +13,7 @@ from overtrack_web.lib import metrics
 from overtrack_web.lib.authentication import require_login
 from overtrack_web.lib.decorators import restrict_origin
 from overtrack_web.lib.paypal import PayPal
-from overtrack_web.lib.session import session
+from overtrack_web.lib.session import refresh_user, save_user, session
 from overtrack_models.orm.subscription_details import SubscriptionDetails
 
 # default keys here are test/sandbox keys
@@ -78,7 +78,7 @@ def subscribe():
     status_text = ''
     kwargs = {}
 
-    session.user.refresh()
+    refresh_user(session.user)
     print(session.user)
     print(session.user.subscription_active)
     print(session.user.subscription_type)
@@ -293,7 +293,7 @@ def paypal_approved():
 
     logger.info('Updating User model')
     # TODO: use set actions
-    session.user.refresh()
+    refresh_user(session.user, max_age=0)
     session.user.subscription_active = True
     session.user.subscription_type = 'v2.paypal'
     session.user.paypal_subscr_id = request.form['subscriptionID']
@@ -319,7 +319,7 @@ def paypal_approved():
     except:
         logger.exception('Failed to get PayPal subscription details')
 
-    session.user.save()
+    save_user(session.user)
     make_games_viewable(session.user_id)
 
     metrics.record('subscription.paypal.approved')
@@ -342,7 +342,7 @@ def paypal_approved():
 @require_login
 @restrict_origin(whitelist=['overtrack.gg', 'www.overtrack.gg'])
 def paypal_cancel():
-    session.user.refresh()
+    refresh_user(session.user, max_age=0)
     logger.info(f'Canceling PayPal subscription {session.user.paypal_subscr_id}')
 
     paypal_client.cancel_subscription(session.user.paypal_subscr_id)
@@ -374,7 +374,7 @@ def paypal_cancel():
 @require_login
 @restrict_origin(whitelist=['overtrack.gg', 'www.overtrack.gg'])
 def stripe_cancel():
-    session.user.refresh()
+    refresh_user(session.user, max_age=0)
     logger.info(f'Canceling Stripe subscription {session.user.stripe_subscription_id}')
 
     stripe.Subscription.modify(
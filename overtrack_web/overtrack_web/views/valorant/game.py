@@ -15,6 +15,10 @@ from itertools import takewhile, dropwhile, zip_longest
 from overtrack_models.dataclasses.valorant import ValorantGame, Kill, Round, Ult, Player
 from overtrack_models.orm.valorant_game_summary import ValorantGameSummary
 from overtrack_web.lib.authentication import check_authentication
+from overtrack_web.lib.card_images import CARD_IMAGE_BUCKET, CARD_IMAGE_DISK_PATH, CARD_IMAGE_PREFIX, CardImageStore, \
+    get_card_png, render_valorant_card
+from overtrack_web.lib.game_cache import game_cache
+from overtrack_web.lib.game_storage import load_game_data, make_s3_client
 from overtrack_web.lib.opengraph import Meta
 from overtrack_web.lib.session import session
 from overtrack_web.views.valorant.games_list import OLDEST_SUPPORTED_GAME_VERSION
@@ -27,19 +31,16 @@ COLOURS = {
 }
 
 logger = logging.getLogger(__name__)
-try:
-    s3 = boto3.client('s3')
-    """ :type s3: mypy_boto3.s3.Client """
-    s3.list_objects_v2(Bucket=GAMES_BUCKET)
-except:
-    logger.exception('Failed to create AWS S3 client - using HTTP for downloading games')
-    s3 = None
+s3 = make_s3_client()
+""" :type s3: mypy_boto3.s3.Client """
 try:
     logs = boto3.client('logs')
     """ :type s3: boto3_type_annotations.s3.Client """
 except:
     logger.exception('Failed to create AWS logs client - running without admin logs')
     logs = None
+card_images = CardImageStore(s3, CARD_IMAGE_BUCKET, CARD_IMAGE_PREFIX, CARD_IMAGE_DISK_PATH)
+
 game_blueprint = Blueprint('valorant.game', __name__)
 
 
@@ -70,7 +71,7 @@ def game(key: str):
     else:
         title = f'{result[0].capitalize() + result[1:]} on {game.map}'
 
-    imagehash = hashlib.md5(str((game.won, game.game_mode, game.rounds.final_score, summary.agent)).encode()).hexdigest()
+    imagehash = get_card_version(summary)
 
     def is_first_round(round: Round) -> bool:
         return round.attacking == game.rounds.rounds[0].attacking
@@ -138,6 +139,27 @@ def game_card(key: str):
 
 @game_blueprint.route('/<path:key>/card.png')
 def game_card_png(key: str):
+    width = max(1, min(int(request.args.get("width", 1000)), 2000))
+    height = max(1, min(int(request.args.get("height", 80)), 512))
+    try:
+        summary = ValorantGameSummary.get(key)
+    except ValorantGameSummary.DoesNotExist:
+        return 'Game does not exist', 404
+    # the card is always stored under the summary's version - a _cachebust that doesn't match it is not passed on
+    card_version = get_card_version(summary)
+    cachebust = card_version if request.args.get('_cachebust') == card_version else ''
+
+    png = get_card_png(
+        card_images,
+        'valorant',
+        key,
+        card_version,
+        (width, height),
+        lambda: render_valorant_card(summary)
+    )
+    if png:
+        return Response(png, mimetype='image/png')
+
     if 'RENDERTRON_URL' not in os.environ:
         return 'Rendertron url not set on server', 500
 
@@ -145,9 +167,9 @@ def game_card_png(key: str):
         os.environ['RENDERTRON_URL'],
         'screenshot/',
         url_for('valorant.game.game_card', key=key, _external=True),
-        f'?width={min(int(request.args.get("width", 1000)), 2000)}',
-        f'&height={min(int(request.args.get("height", 80)), 512)}',
-        f'&_cachebust={request.args.get("_cachebust", "")}'
+        f'?width={width}',
+        f'&height={height}',
+        f'&_cachebust={cachebust}'
     ))
     try:
         r = requests.get(
@@ -163,12 +185,20 @@ def game_card_png(key: str):
         logger.exception('Rendertron encountered an error fetching screenshot')
         return f'Rendertron encountered an error fetching screenshot: got status {r.status_code}', 500
 
+    # stored like a locally rendered card, so Rendertron is only asked for each size of each version of the card once
+    if r.headers.get('Content-Type', '').startswith('image/png'):
+        card_images.put('valorant', key, card_version, r.content, (width, height))
+
     return Response(
         r.content,
         headers=dict(r.headers)
     )
 
 
+def get_card_version(summary: ValorantGameSummary) -> str:
+    return hashlib.md5(str((summary.won, summary.scrim, summary.score, summary.rank)).encode()).hexdigest()
+
+
 @game_blueprint.context_processor
 def context_processor() -> Dict[str, Any]:
     return {
@@ -251,22 +281,13 @@ def is_plant(e):
 
 
 def load_game(summary: ValorantGameSummary) -> Tuple[ValorantGame, Dict]:
-    try:
-        game_object = s3.get_object(
-            Bucket=GAMES_BUCKET,
-            Key=summary.key + '.json'
-        )
-        game_data = json.loads(game_object['Body'].read())
-        metadata = game_object['Metadata']
-    except:
-        if s3:
-            logger.exception('Failed to fetch game data from S3 - trying HTTP')
-        r = requests.get(f'https://{GAMES_BUCKET}.s3.amazonaws.com/{summary.key}.json')
-        r.raise_for_status()
-        game_data = r.json()
-        metadata = {}
-
-    return ValorantGame.from_dict(game_data), metadata
+    return load_game_data(
+        s3,
+        GAMES_BUCKET,
+        summary.key + '.json',
+        ValorantGame.from_dict,
+        cache=game_cache,
+    )
 
 
 # ----- Utility Functions -----
@@ -21,7 +21,7 @@ from overtrack_web.lib import b64_decode, b64_encode, FlaskResponse, parse_args
 from overtrack_web.lib.authentication import check_authentication, require_login
 from overtrack_web.lib.decorators import restrict_origin
 from overtrack_web.lib.listed_users import get_listed_users
-from overtrack_web.lib.session import session
+from overtrack_web.lib.session import refresh_user, save_user, session
 
 PAGINATION_PAGE_MINIMUM_SIZE = 40
 PAGINATION_SESSIONS_COUNT_AS = 2
@@ -153,7 +153,7 @@ def share_links() -> FlaskResponse:
     public = request.form.get('public-profile', 'private') == 'public'
 
     user.valorant_games_public = public
-    user.save()
+    save_user(user)
 
     return render_template(
         'valorant/games_list/share_link_toggle.html',
@@ -232,7 +232,7 @@ def check_superuser() -> bool:
 
 
 def render_games_list(user: User, public: bool = False, **next_args: str) -> FlaskResponse:
-    user.refresh()
+    refresh_user(user)
 
     if not user.valorant_games:
         logger.info(f'User {user.username} has no games')
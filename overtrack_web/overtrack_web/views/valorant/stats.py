@@ -10,7 +10,7 @@ from overtrack_web.data import WELCOME_META
 from overtrack_web.lib import FlaskResponse
 from overtrack_web.lib.authentication import check_authentication
 from overtrack_web.lib.queries.valorant import get_winrates, get_average_winrates
-from overtrack_web.lib.session import session
+from overtrack_web.lib.session import refresh_user, session
 from overtrack_web.views.valorant.games_list import resolve_public_user
 
 logger = logging.getLogger(__name__)
@@ -40,7 +40,7 @@ def render_winrates(user: Optional[User], public: bool = False) -> FlaskResponse
     average_winrates = get_average_winrates()
     if user is not None:
         has_user = True
-        user.refresh()
+        refresh_user(user)
 
         target = get_winrates(user.user_id)
 
@@ -0,0 +1,63 @@
+"""
+Minimal stand-in for referenced_typedload, which loads every reference to an object as the same instance: the first
+occurrence of a dataclass instance that is used more than once is dumped with an `_id`, and any later occurrence as
+`{'_ref': id}`.
+"""
+from typing import Any, Dict, Set
+
+import dataclasses
+
+
+def load(data: Any, t: Any) -> Any:
+    """
+    References are resolved within a single call only.
+    """
+    return _load(data, t, {})
+
+
+def _load(data: Any, t: Any, refs: Dict[int, Any]) -> Any:
+    if dataclasses.is_dataclass(t):
+        if '_ref' in data:
+            return refs[data['_ref']]
+        obj = t(**{
+            f.name: _load(data[f.name], f.type, refs)
+            for f in dataclasses.fields(t) if f.name in data
+        })
+        if '_id' in data:
+            refs[data['_id']] = obj
+        return obj
+    if getattr(t, '__origin__', None) is list:
+        return [_load(e, t.__args__[0], refs) for e in data]
+    return data
+
+
+def dump(obj: Any) -> Any:
+    counts: Dict[int, int] = {}
+    _count(obj, counts)
+    return _dump(obj, {i for i, n in counts.items() if n > 1}, {})
+
+
+def _count(obj: Any, counts: Dict[int, int]) -> None:
+    if dataclasses.is_dataclass(obj):
+        counts[id(obj)] = counts.get(id(obj), 0) + 1
+        if counts[id(obj)] == 1:
+            for f in dataclasses.fields(obj):
+                _count(getattr(obj, f.name), counts)
+    elif isinstance(obj, list):
+        for e in obj:
+            _count(e, counts)
+
+
+def _dump(obj: Any, shared: Set[int], ids: Dict[int, int]) -> Any:
+    if dataclasses.is_dataclass(obj):
+        if id(obj) in ids:
+            return {'_ref': ids[id(obj)]}
+        data = {}
+        if id(obj) in shared:
+            ids[id(obj)] = len(ids)
+            data['_id'] = ids[id(obj)]
+        data.update({f.name: _dump(getattr(obj, f.name), shared, ids) for f in dataclasses.fields(obj)})
+        return data
+    if isinstance(obj, list):
+        return [_dump(e, shared, ids) for e in obj]
+    return obj
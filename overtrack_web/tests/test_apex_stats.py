@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from overtrack_web.scripts.benchmark_apex_stats import generate_games, previous_stats, same
+from overtrack_web.views.apex.stats import GameColumns, UserSummaries, summarise_groups
+
+
+@pytest.fixture(scope='module')
+def games():
+    return generate_games(2000, 4, seed=1)
+
+
+def stats(summary):
+    return summary.placements, summary.stats()
+
+
+def test_columns_match_stat_functions(games):
+    columns = GameColumns.from_games(games)
+    assert same(previous_stats(games), stats(columns.summarise()))
+
+    season_games = [g for g in games if g.season == 3 and g.rank is not None]
+    assert same(previous_stats(season_games), stats(columns.summarise(season=3, ranked=True)))
+
+
+def test_groups_match_columns(games):
+    columns = GameColumns.from_games(games)
+    summaries = summarise_groups(games)
+    assert len(summaries) == 8
+    for season in range(1, 5):
+        for ranked in (False, True):
+            assert summaries[UserSummaries.key(season, ranked)] == columns.summarise(season, ranked)
+
+
+def test_total_of_groups_matches_stat_functions(games):
+    summaries = UserSummaries(until=0, built=0, seasons=summarise_groups(games))
+    assert same(previous_stats(games), stats(summaries.total()))
+
+    unranked_games = [g for g in games if g.rank is None]
+    assert same(previous_stats(unranked_games), stats(summaries.total(ranked=False)))
+
+
+def test_merged_summaries_match_all_games(games):
+    first = UserSummaries(until=1, built=1, seasons=summarise_groups(games[:700]))
+    second = UserSummaries(until=2, built=2, seasons=summarise_groups(games[700:]))
+    merged = first.merge(second)
+    assert (merged.until, merged.built) == (2, 1)
+    assert same(previous_stats(games), stats(merged.total()))
+
+
+def test_games_without_a_season_or_placement():
+    games = [
+        SimpleNamespace(season=None, rank=None, placed=None, kills=3, squad_kills=None, duration=None),
+        SimpleNamespace(season=None, rank=None, placed=0, kills=1, squad_kills=6, duration=600),
+    ]
+    summary = summarise_groups(games)[UserSummaries.key(None, False)]
+    assert summary.games == 2
+    assert summary.placed_games == 0
+    assert sum(summary.placements) == 0
+    assert summary.clipped_placements[0] == 2
+    assert summary.contribution_games == 1
+    assert summary.contribution_total == 0.5
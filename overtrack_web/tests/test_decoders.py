@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional
+
+import dataclasses
+import pytest
+
+from overtrack_web.lib import decoders
+from referenced import dump, load
+
+
+@dataclasses.dataclass
+class Player:
+    name: str
+    hero: Optional[str] = None
+
+
+@dataclasses.dataclass
+class Team:
+    players: List[Player]
+
+
+@dataclasses.dataclass
+class Game:
+    key: str
+    players: List[Player]
+    teams: List[Team]
+    result: str = 'UNKNOWN'
+    extra: Dict[str, Any] = dataclasses.field(default_factory=dict)
+
+
+@pytest.fixture(autouse=True)
+def reset_decoders():
+    yield
+    decoders._decoders.clear()
+    decoders._unsupported.clear()
+    decoders._verified.clear()
+
+
+def make_game(shared: bool) -> Game:
+    players = [Player('alice', 'ana'), Player('bob'), Player('carol', 'mercy')]
+    teams = [Team(players[:1]), Team(players[1:])]
+    if not shared:
+        teams = [Team([dataclasses.replace(p) for p in team.players]) for team in teams]
+    return Game('alice/123', players, teams, 'WIN', {'a': [1]})
+
+
+def test_compiled_decoder_matches_fallback():
+    data = dump(make_game(shared=False))
+    decoder = decoders.compile_decoder(Game)
+    assert decoders.compare(load(data, Game), decoder(data)) is None
+    assert decoders.load(data, Game, load) == make_game(shared=False)
+    assert Game in decoders._verified
+
+
+def test_data_with_references_is_always_loaded_by_the_fallback():
+    decoders.load(dump(make_game(shared=False)), Game, load)
+    assert Game in decoders._verified
+
+    # every load of data holding references - not just the first - must keep the sharing
+    for _ in range(3):
+        game = decoders.load(dump(make_game(shared=True)), Game, load)
+        assert game.teams[0].players[0] is game.players[0]
+        assert game.teams[1].players[1] is game.players[2]
+    assert Game not in decoders._unsupported
+
+
+def test_unexpected_keys_are_not_loaded():
+    data = dump(make_game(shared=False))
+    data['players'][0]['_id'] = 0
+    with pytest.raises(decoders.DecoderError):
+        decoders.compile_decoder(Game)(data)
+
+
+def test_decoder_that_crashes_is_not_used_again(monkeypatch):
+    data = dump(make_game(shared=False))
+    decoders.compile_decoder(Game)
+
+    def crash(data):
+        raise RuntimeError('bug')
+    monkeypatch.setitem(decoders._decoders, Game, crash)
+
+    calls = []
+
+    def fallback(data, t):
+        calls.append(t)
+        return load(data, t)
+
+    assert decoders.load(data, Game, fallback) == make_game(shared=False)
+    assert Game in decoders._unsupported
+    assert decoders.load(data, Game, fallback) == make_game(shared=False)
+    assert calls == [Game, Game]
+
+
+def test_decoder_that_differs_is_not_used_again():
+    data = dump(make_game(shared=False))
+
+    def fallback(data, t):
+        game = load(data, t)
+        game.key = 'different'
+        return game
+
+    assert decoders.load(data, Game, fallback).key == 'different'
+    assert Game in decoders._unsupported
+    assert Game not in decoders._verified
+
+
+def test_sharing():
+    shared = make_game(shared=True)
+    unshared = make_game(shared=False)
+    assert decoders.first_difference(shared, unshared) is None
+    assert decoders.compare(shared, unshared) == 'objects are not shared the same way'
@@ -0,0 +1,189 @@
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+from overtrack_web.lib import game_cache
+from overtrack_web.lib.game_cache import CachedGame, DiskGameCache, GameCache
+from overtrack_web.lib.game_storage import get_game_etag, invalidate_game, load_game_data
+
+BUCKET = 'overtrack-games'
+KEY = 'alice/123-2020'
+GAME = {'key': KEY, 'players': ['alice', 'bob'], 'result': 'WIN'}
+
+
+def entry(key: str, size: int = 10, etag: str = 'a') -> CachedGame:
+    return CachedGame(key=key, etag=etag, size=size, game={'key': key}, metadata={})
+
+
+class FakeS3:
+    """
+    Serves a single stored game, answering conditional GETs the way S3 does.
+    """
+
+    def __init__(self, game, encoding: str = ''):
+        self.calls = []
+        self.store(game, 'etag-1', encoding)
+
+    def store(self, game, etag: str, encoding: str = '') -> None:
+        self.data = json.dumps(game).encode()
+        self.body = gzip.compress(self.data) if encoding else self.data
+        self.encoding = encoding
+        self.etag = etag
+        self.last_modified = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    def get_object(self, Bucket: str, Key: str, IfNoneMatch: str = None, IfModifiedSince: datetime = None):
+        self.calls.append(('get', IfNoneMatch))
+        if IfNoneMatch == self.etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+        return {
+            'Body': io.BytesIO(self.body),
+            'ContentEncoding': self.encoding,
+            'ETag': self.etag,
+            'LastModified': self.last_modified,
+            'ContentLength': len(self.body),
+            'Metadata': {'user-id': '1'},
+        }
+
+    def head_object(self, Bucket: str, Key: str):
+        self.calls.append(('head', None))
+        return {'ETag': self.etag}
+
+
+@pytest.fixture
+def decodes():
+    return []
+
+
+@pytest.fixture
+def load(decodes):
+    def load(s3, cache):
+        def decode(data):
+            decodes.append(data)
+            return dict(data)
+        return load_game_data(s3, BUCKET, KEY, decode, cache=cache)
+    return load
+
+
+def test_evicts_least_recently_used():
+    cache = GameCache(max_items=2, max_bytes=1000)
+    cache.put(entry('a'))
+    cache.put(entry('b'))
+    assert cache.get('a')
+    cache.put(entry('c'))
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+
+
+def test_evicts_by_size():
+    cache = GameCache(max_items=10, max_bytes=100)
+    for key in 'abc':
+        cache.put(entry(key, size=40))
+    assert len(cache) == 2
+    assert cache.total_bytes == 80
+    assert cache.get('a') is None
+
+    # replacing an entry must not count its old size
+    cache.put(entry('c', size=60))
+    assert cache.total_bytes == 100
+    assert cache.get('b') and cache.get('c')
+
+
+def test_oversize_entries_are_not_cached():
+    cache = GameCache(max_items=10, max_bytes=100)
+    cache.put(entry('a', size=50))
+    cache.put(entry('b', size=101))
+    assert cache.get('b') is None
+    assert cache.get('a')
+    assert cache.total_bytes == 50
+
+
+def test_etag_and_invalidate():
+    cache = GameCache(max_items=10, max_bytes=100)
+    cache.put(entry('a', etag='1'))
+    assert cache.get('a', etag='1')
+    assert cache.get('a', etag='2') is None
+    assert cache.get('a').etag == '1'
+    cache.invalidate('a')
+    assert cache.get('a') is None
+    assert cache.total_bytes == 0
+
+
+def test_disk_tier(tmp_path):
+    disk = DiskGameCache(str(tmp_path), max_bytes=10 * 1024 * 1024)
+    cache = GameCache(max_items=1, max_bytes=1000, disk=disk)
+    cache.put(entry('a'))
+    cache.put(entry('b'))
+    assert len(cache) == 1
+
+    # evicted from memory, but loaded back from disk
+    a = cache.get('a', etag='a')
+    assert a.game == {'key': 'a'}
+    assert cache.get('a') is a
+    assert GameCache(max_items=1, max_bytes=1000, disk=disk).get('b').game == {'key': 'b'}
+
+    cache.invalidate('a')
+    assert disk.get('a') is None
+    assert cache.get('a') is None
+
+
+def test_disk_tier_evicts_when_full(tmp_path):
+    disk = DiskGameCache(str(tmp_path), max_bytes=1)
+    disk.put(entry('a'))
+    assert disk.get('a') is None
+
+
+def test_load_misses_then_revalidates(load, decodes):
+    s3 = FakeS3(GAME)
+    cache = GameCache(max_items=10, max_bytes=1024 * 1024)
+
+    game, metadata = load(s3, cache)
+    assert game == GAME
+    assert metadata == {'user-id': '1'}
+    cached = cache.get(f'{BUCKET}/{KEY}')
+    assert cached.etag == 'etag-1'
+    assert cached.size == len(s3.data)
+
+    # revalidating is the default, so the second load makes a conditional request which is not modified
+    game_again, _ = load(s3, cache)
+    assert game_again is game
+    assert s3.calls == [('get', None), ('get', 'etag-1')]
+    assert len(decodes) == 1
+    assert (cache.stats.hit, cache.stats.revalidated, cache.stats.miss) == (0, 1, 1)
+
+
+def test_load_changed_game(load, decodes):
+    s3 = FakeS3(GAME)
+    cache = GameCache(max_items=10, max_bytes=1024 * 1024)
+    load(s3, cache)
+
+    s3.store(dict(GAME, result='LOSS'), 'etag-2', 'gzip')
+    game, _ = load(s3, cache)
+    assert game['result'] == 'LOSS'
+    assert len(decodes) == 2
+    cached = cache.get(f'{BUCKET}/{KEY}')
+    assert cached.etag == 'etag-2'
+    # the decompressed size, not the stored size
+    assert cached.size == len(s3.data) != len(s3.body)
+    assert cache.stats.miss == 2
+
+
+def test_recently_validated_game_is_a_hit(load, decodes, monkeypatch):
+    monkeypatch.setattr(game_cache, 'GAME_CACHE_REVALIDATE_AFTER', 60)
+    s3 = FakeS3(GAME)
+    cache = GameCache(max_items=10, max_bytes=1024 * 1024)
+    load(s3, cache)
+    load(s3, cache)
+    assert get_game_etag(s3, BUCKET, KEY, cache) == 'etag-1'
+    assert s3.calls == [('get', None)]
+    assert (cache.stats.hit, cache.stats.revalidated, cache.stats.miss) == (1, 0, 1)
+
+    invalidate_game(cache, BUCKET, KEY)
+    assert get_game_etag(s3, BUCKET, KEY, cache) == 'etag-1'
+    load(s3, cache)
+    assert s3.calls[1:] == [('head', None), ('get', None)]
+    assert len(decodes) == 2
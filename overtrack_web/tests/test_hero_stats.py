@@ -0,0 +1,86 @@
+from dataclasses import asdict
+from types import SimpleNamespace
+
+import pytest
+
+from overtrack_web.scripts.benchmark_hero_stats_fold import accumulator_fold, generate_rows, previous_fold, same
+from overtrack_web.views.overwatch.hero_stats import HeroStatsAccumulator, OverwatchCollectedHeroStats
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return generate_rows(2000, seed=1)
+
+
+def as_dicts(stats):
+    return {name: asdict(stat) for name, stat in stats.items()}
+
+
+def game(result: str, duration: float) -> SimpleNamespace:
+    return SimpleNamespace(result=result, duration=duration, heroes_played=[('ana', 0.75), ('mercy', 0.25)])
+
+
+def test_accumulator_matches_add_fold(rows):
+    assert same(as_dicts(previous_fold(rows)), as_dicts(accumulator_fold(rows)))
+
+
+def test_hero_specific_stats_are_summed_over_all_keys():
+    rows = generate_rows(3, seed=2)
+    for row in rows:
+        row.hero = 'ana'
+    rows[0].hero_specific_stats = {'a': 1}
+    rows[1].hero_specific_stats = {'b': 2}
+    rows[2].hero_specific_stats = {'a': 3, 'c': 4}
+
+    expected = {'a': 4, 'b': 2, 'c': 4}
+    assert previous_fold(rows)['ana'].hero_specific_stats == expected
+    assert accumulator_fold(rows)['ana'].hero_specific_stats == expected
+
+
+def test_without_hero_specific_stats(rows):
+    accumulator = HeroStatsAccumulator(include_hero_stats=False, endgame_only=True)
+    for row in rows:
+        accumulator.add_stat(row)
+    results = accumulator.results()
+    assert all(stat.hero_specific_stats is None for stat in results.values())
+
+    expected = as_dicts(accumulator_fold(rows))
+    for stat in expected.values():
+        stat.update(include_hero_stats=False, hero_specific_stats=None)
+    assert same(expected, as_dicts(results))
+
+
+def test_base_stats_match_add_base_stats():
+    games = [game('WIN', 600), game('LOSS', 300), game('VICTORY', 900)]
+
+    expected = OverwatchCollectedHeroStats(include_hero_stats=True, endgame_only=True, name='ana')
+    accumulator = HeroStatsAccumulator(include_hero_stats=True, endgame_only=True)
+    for g in games:
+        expected.add_base_stats(g, hero='ana')
+        accumulator.add_game('ana', g, share=dict(g.heroes_played)['ana'])
+    assert same(asdict(expected), asdict(accumulator.results()['ana']))
+
+    expected = OverwatchCollectedHeroStats(include_hero_stats=False, endgame_only=True, name='support')
+    accumulator = HeroStatsAccumulator(include_hero_stats=False, endgame_only=True)
+    for g in games:
+        expected.add_base_stats(g, role=True)
+        accumulator.add_game('support', g)
+    assert same(asdict(expected), asdict(accumulator.results()['support']))
+
+
+def test_update_matches_merged_results(rows):
+    first, second = rows[:700], rows[700:]
+    accumulator = HeroStatsAccumulator(include_hero_stats=True, endgame_only=True)
+    other = HeroStatsAccumulator(include_hero_stats=True, endgame_only=True)
+    for row in first:
+        accumulator.add_stat(row)
+    for row in second:
+        other.add_stat(row)
+    for g in [game('WIN', 600), game('LOSS', 300)]:
+        other.add_game('ana', g, share=0.75)
+
+    a, b = accumulator_fold(first), other.results()
+    merged = {name: a[name].merge(b[name]) if name in a and name in b else a.get(name) or b[name] for name in {*a, *b}}
+    accumulator.update(other)
+    assert same(as_dicts(merged), as_dicts(accumulator.results()))
+    assert accumulator.results()['ana'].games == 1.5
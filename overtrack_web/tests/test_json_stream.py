@@ -0,0 +1,98 @@
+import io
+import json
+from typing import Dict, List, Optional
+
+import dataclasses
+import pytest
+
+from overtrack_web.lib.json_stream import iter_object_members, load_dataclass_streaming
+
+DOCUMENT = {
+    'key': 'alice/123-2020',
+    'count': 12345,
+    'ratio': -1.5e-3,
+    'flags': [True, False, None],
+    'nested': {'a': [1, 2, {'b': 'c'}], 'braces': '{not, an: object}', 'quote': 'say "hi"\\'},
+    'unicode': 'Lúcio ☃ 🎮',
+    'empty': {},
+    'last': 7,
+}
+
+
+def stream(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode())
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 64 * 1024])
+def test_members(indent: Optional[int], chunk_size: int):
+    text = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False)
+    assert list(iter_object_members(stream(text), chunk_size)) == list(DOCUMENT.items())
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 64 * 1024])
+def test_raw_members(chunk_size: int):
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    members = list(iter_object_members(stream(text), chunk_size, raw=True))
+    assert [k for k, _ in members] == list(DOCUMENT)
+    assert {k: json.loads(v) for k, v in members} == DOCUMENT
+    assert dict(members)['count'] == '12345'
+
+
+@pytest.mark.parametrize('text', ['{}', ' { } ', '\n{\n}\n'])
+def test_empty_object(text: str):
+    assert list(iter_object_members(stream(text), 1)) == []
+
+
+@pytest.mark.parametrize('text', ['[1, 2]', '"a"', '', '   '])
+def test_not_an_object(text: str):
+    with pytest.raises(ValueError):
+        list(iter_object_members(stream(text)))
+
+
+@pytest.mark.parametrize('text', ['{"a": 1', '{"a": 1,', '{"a": [1, 2', '{"a" 1}', '{"a": 1 "b": 2}', '{1: 2}'])
+def test_malformed(text: str):
+    with pytest.raises(ValueError):
+        list(iter_object_members(stream(text), 1))
+
+
+def test_members_are_yielded_as_they_are_parsed():
+    text = '{"a": 1, "b": [2], "c": 3}'
+    members = iter_object_members(stream(text + ' trailing garbage that is never read'), 1)
+    assert next(members) == ('a', 1)
+    assert next(members) == ('b', [2])
+    assert next(members) == ('c', 3)
+
+
+@dataclasses.dataclass
+class Round:
+    winner: str
+    scores: List[int]
+
+
+@dataclasses.dataclass
+class Match:
+    key: str
+    rounds: List[Round]
+    tags: Dict[str, str] = dataclasses.field(default_factory=dict)
+    map_name: str = dataclasses.field(default='', metadata={'name': 'map'})
+
+
+def test_load_dataclass_streaming():
+    loaded = []
+
+    def load(value, t):
+        loaded.append(t)
+        if t == List[Round]:
+            return [Round(**r) for r in value]
+        return value
+
+    text = json.dumps({
+        'key': 'k',
+        'rounds': [{'winner': 'blue', 'scores': [1, 0]}],
+        'map': 'Ilios',
+        'unknown': {'ignored': True},
+    })
+    match = load_dataclass_streaming(stream(text), Match, load)
+    assert match == Match('k', [Round('blue', [1, 0])], {}, 'Ilios')
+    assert loaded == [str, List[Round], str]
@@ -0,0 +1,100 @@
+import sys
+import types
+
+import pytest
+from flask import Blueprint, Flask, url_for
+
+from overtrack_web.lib.lazy_blueprint import LazyBlueprint, LazyRule, check_lazy_blueprints
+
+MODULE = 'lazy_blueprint_test_views'
+
+RULES = [
+    LazyRule('/', 'index'),
+    LazyRule('/<string:name>', 'page', methods=['GET', 'POST']),
+]
+
+
+@pytest.fixture
+def views():
+    imports = []
+    blueprint = Blueprint('views', __name__)
+
+    @blueprint.route('/')
+    def index():
+        return 'index'
+
+    @blueprint.route('/<string:name>', methods=['GET', 'POST'])
+    def page(name: str):
+        return f'page {name}'
+
+    module = types.ModuleType(MODULE)
+    module.__getattr__ = lambda attr: imports.append(attr) or blueprint
+    sys.modules[MODULE] = module
+    yield imports
+    del sys.modules[MODULE]
+
+
+def make_app(debug: bool = False) -> Flask:
+    app = Flask(__name__)
+    app.debug = debug
+    return app
+
+
+def test_loaded_on_first_request(views):
+    app = make_app()
+    lazy = LazyBlueprint(MODULE, 'blueprint', 'views', RULES)
+    lazy.register(app, url_prefix='/views')
+    with app.test_request_context():
+        assert url_for('views.page', name='a') == '/views/a'
+    assert not lazy.loaded
+
+    client = app.test_client()
+    assert client.get('/views/a').data == b'page a'
+    assert client.post('/views/b').data == b'page b'
+    assert client.get('/views/').data == b'index'
+    assert lazy.loaded
+    assert views == ['blueprint']
+    assert check_lazy_blueprints(app) == []
+
+
+def test_views_are_never_missing_while_loading(views):
+    app = make_app()
+    lazy = LazyBlueprint(MODULE, 'blueprint', 'views', RULES)
+    lazy.register(app, url_prefix='/views')
+
+    # a request dispatched at any point while the blueprint is being registered must still find a view
+    missing = []
+    add_url_rule = app.add_url_rule
+
+    def checked_add_url_rule(*args, **kwargs):
+        for endpoint in ['views.index', 'views.page']:
+            if endpoint not in app.view_functions:
+                missing.append(endpoint)
+        return add_url_rule(*args, **kwargs)
+    app.add_url_rule = checked_add_url_rule
+
+    assert lazy.load()
+    assert missing == []
+    assert app.view_functions['views.page'](name='c') == 'page c'
+    assert type(app.view_functions) is dict
+
+
+def test_mismatched_rules_fail_in_debug(views):
+    rules = [LazyRule('/', 'index'), LazyRule('/<string:name>', 'page')]
+    with pytest.raises(RuntimeError, match='views'):
+        LazyBlueprint(MODULE, 'blueprint', 'views', rules).register(make_app(debug=True), url_prefix='/views')
+
+
+def test_mismatched_rules_are_reported(views):
+    app = make_app()
+    LazyBlueprint(MODULE, 'blueprint', 'views', RULES[:1]).register(app, url_prefix='/views')
+    problems = check_lazy_blueprints(app)
+    assert len(problems) == 1
+    assert 'does not declare' in problems[0] and 'views.page' in problems[0]
+
+
+def test_failed_import_is_not_found():
+    app = make_app()
+    LazyBlueprint('lazy_blueprint_missing_module', 'blueprint', 'missing', RULES).register(app, url_prefix='/missing')
+    assert app.test_client().get('/missing/a').status_code == 404
+    assert check_lazy_blueprints(app) == ['missing: failed to load']
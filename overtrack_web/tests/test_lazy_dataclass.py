@@ -0,0 +1,106 @@
+import pickle
+import threading
+from typing import List, Optional
+
+import dataclasses
+
+from overtrack_web.lib.lazy_dataclass import LazyDataclass, dump_dataclass, materialise
+from referenced import dump, load
+
+
+@dataclasses.dataclass
+class Player:
+    name: str
+    hero: Optional[str] = None
+
+
+@dataclasses.dataclass
+class Team:
+    players: List[Player]
+
+
+@dataclasses.dataclass
+class Game:
+    key: str
+    result: str
+    players: List[Player]
+    teams: List[Team]
+
+    @property
+    def player_names(self) -> List[str]:
+        return [p.name for p in self.players]
+
+
+def make_game() -> Game:
+    players = [Player('alice', 'ana'), Player('bob'), Player('carol'), Player('dave')]
+    return Game('alice/123', 'WIN', players, [Team(players[:2]), Team(players[2:])])
+
+
+def check_shared(game: Game) -> None:
+    assert game.teams[0].players[0] is game.players[0]
+    assert game.teams[1].players[1] is game.players[3]
+
+
+def test_immutable_fields_load_on_their_own():
+    lazy = LazyDataclass(Game, dump(make_game()), load)
+    assert lazy.key == 'alice/123'
+    assert lazy.result == 'WIN'
+    assert lazy.lazy_loaded_fields == ['key', 'result']
+    assert lazy._lazy_instance is None
+
+
+def test_fields_sharing_objects_load_together():
+    lazy = LazyDataclass(Game, dump(make_game()), load)
+    assert lazy.teams[0].players[0].name == 'alice'
+    check_shared(lazy)
+    check_shared(materialise(lazy))
+    assert lazy.player_names == ['alice', 'bob', 'carol', 'dave']
+
+
+def test_dump_round_trip_keeps_sharing():
+    lazy = LazyDataclass(Game, dump(make_game()), load)
+    lazy.result = 'LOSS'
+    assert lazy._lazy_instance is None
+    game = load(dump_dataclass(lazy, dump), Game)
+    assert game.result == 'LOSS'
+    check_shared(game)
+
+    lazy = LazyDataclass(Game, dump(make_game()), load)
+    lazy.players[1].hero = 'mercy'
+    game = load(dump_dataclass(lazy, dump), Game)
+    assert game.teams[0].players[1].hero == 'mercy'
+    check_shared(game)
+
+
+def test_assigning_a_shared_field_keeps_sharing():
+    lazy = LazyDataclass(Game, dump(make_game()), load)
+    lazy.players = lazy.players[::-1]
+    game = load(dump_dataclass(lazy, dump), Game)
+    assert game.players[0].name == 'dave'
+    assert game.teams[1].players[1] is game.players[0]
+
+
+def test_pickle_keeps_unloaded_fields_raw():
+    lazy = LazyDataclass(Game, dump(make_game()), load)
+    assert lazy.key == 'alice/123'
+    copy = pickle.loads(pickle.dumps(lazy))
+    assert copy.lazy_loaded_fields == ['key']
+    check_shared(copy)
+
+
+def test_concurrent_loads_share_one_instance():
+    lazy = LazyDataclass(Game, dump(make_game()), load)
+    seen = []
+    barrier = threading.Barrier(8)
+
+    def use():
+        barrier.wait()
+        seen.append(lazy.players)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(players is seen[0] for players in seen)
+    check_shared(lazy)